@@ -3,80 +3,70 @@
 Base Agent Class - Foundation for all specialized agents
 """
 
-import google.generativeai as genai
 import os
+import sys
 from dotenv import load_dotenv
 
+# Agents are run from this folder; make backend/ importable for shared utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.llm_provider import get_provider
+from utils.model_presets import ModelHandle
+from utils.cancellation import Cancelled
+
 load_dotenv()
 
 class BaseAgent:
     """Base class for all AI agents"""
     
     def __init__(self, name: str):
-        """Initialize base agent with Gemini model"""
+        """Initialize base agent with an LLM provider (Gemini unless LLM_PROVIDER says otherwise)"""
         self.name = name
         self.model = None
-        
-        # Configure Gemini API
-        GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-        if not GEMINI_API_KEY:
-            print(f"❌ {name}: GEMINI_API_KEY not found")
-            return
+        self._handles = {}  # preset mode -> ModelHandle on self.model
         
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            # Find working model
-            available_models = []
-            try:
-                for m in genai.list_models():
-                    if 'generateContent' in m.supported_generation_methods:
-                        model_name = m.name.replace('models/', '')
-                        available_models.append(model_name)
-            except:
-                pass
-            
-            # Try models in order
-            model_names = available_models if available_models else [
-                'gemini-1.5-flash',
-                'gemini-1.5-pro', 
-                'gemini-pro'
-            ]
-            
-            for model_name in model_names:
-                try:
-                    test_model = genai.GenerativeModel(model_name)
-                    # Test it works
-                    test_response = test_model.generate_content("Say OK")
-                    if test_response and test_response.text:
-                        self.model = test_model
-                        print(f"✅ {name} initialized with {model_name}")
-                        break
-                except Exception as e:
-                    continue
-            
-            if not self.model:
+            provider = get_provider(
+                model_candidates=[
+                    'gemini-1.5-flash',
+                    'gemini-1.5-pro', 
+                    'gemini-pro'
+                ],
+                discover=True,
+                label=name
+            )
+            if provider.is_ready():
+                self.model = provider
+                print(f"✅ {name} initialized with {provider.name} ({provider.model_name})")
+            else:
                 print(f"❌ {name}: Could not initialize any model")
                 
         except Exception as e:
             print(f"❌ {name} initialization error: {e}")
     
-    def generate_content(self, prompt: str) -> str:
+    def generate_content(self, prompt: str, preset: str = None) -> str:
         """
-        Generate content using Gemini
+        Generate content using the configured LLM provider
         Safe wrapper with error handling
+        preset: a mode from utils/model_presets.py (system instruction + output cap)
         """
         if not self.model:
             raise Exception(f"{self.name}: Model not initialized")
         
         try:
-            response = self.model.generate_content(prompt)
+            model = self.model
+            if preset:
+                model = self._handles.get(preset)
+                if model is None:
+                    model = self._handles[preset] = ModelHandle(self.model, preset)
+            response = model.generate_content(prompt)
             
             if response and hasattr(response, 'text') and response.text:
                 return response.text
             else:
                 raise Exception("Empty response from API")
                 
+        except Cancelled:
+            raise
         except Exception as e:
             raise Exception(f"{self.name} generation error: {str(e)}")
     
@@ -5,6 +5,7 @@ Routes user queries to the appropriate specialized agents
 """
 
 from base_agent import BaseAgent
+from utils.tracing import span
 from typing import Dict, List, Optional
 import time
 import re
@@ -36,26 +37,11 @@ class AgentOrchestrator(BaseAgent):
             # Fallback: simple keyword-based classification
             return self._fallback_intent_classification(query)
         
-        prompt = f"""Analyze this user query and classify its intent:
-
-USER QUERY: "{query}"
-
-Classify into ONE of these intents:
-1. VIDEO_SEARCH - User wants video explanations
-2. QUESTION_ANSWER - User wants text explanation
-3. QUIZ_GENERATE - User wants practice questions
-4. CONCEPT_EXPLAIN - User wants simple explanation
-
-Respond in this format:
-PRIMARY_INTENT: [intent]
-CONFIDENCE: [0-100]
-
-Keywords:
-- "video", "watch", "show me" → VIDEO_SEARCH
-- "test me", "quiz", "practice" → QUIZ_GENERATE"""
+        # Intent list and answer format live in the 'intent' preset
+        prompt = f'USER QUERY: "{query}"'
 
         try:
-            response_text = self.generate_content(prompt)
+            response_text = self.generate_content(prompt, preset='intent')
             
             # Parse response
             primary_match = re.search(r'PRIMARY_INTENT:\s*(\w+)', response_text)
@@ -129,7 +115,8 @@ Keywords:
         print(f"\n🎯 Orchestrator processing: {query}")
         
         # Step 1: Classify intent
-        intent_data = self.classify_intent(query)
+        with span("intent"):
+            intent_data = self.classify_intent(query)
         print(f"📊 Intent: {intent_data['primary_intent']} (confidence: {intent_data['confidence']}%)")
         print(f"🔍 Reasoning: {intent_data['reasoning']}")
         
@@ -156,7 +143,8 @@ Keywords:
         if intent_data['primary_intent'] in ['QUESTION_ANSWER', 'CONCEPT_EXPLAIN', 'CODE_HELP']:
             print("🤖 Calling Q&A Agent...")
             try:
-                text_response = self.qa_agent.answer_question(query, context)
+                with span("qa_agent"):
+                    text_response = self.qa_agent.answer_question(query, context)
                 response['text_answer'] = text_response
                 response['metadata']['agents_used'].append('QA_Agent')
             except Exception as e:
@@ -170,7 +158,8 @@ Keywords:
         if self.should_include_videos(query, intent_data):
             print("🎥 Calling YouTube Agent...")
             try:
-                video_results = self.youtube_agent.process_doubt(query, max_videos=3)
+                with span("youtube_agent"):
+                    video_results = self.youtube_agent.process_doubt(query, max_videos=3)
                 if video_results['success']:
                     response['videos'] = video_results
                     response['metadata']['agents_used'].append('YouTube_Agent')
@@ -181,7 +170,8 @@ Keywords:
         if intent_data['primary_intent'] == 'QUIZ_GENERATE':
             print("📝 Calling Quiz Agent...")
             try:
-                quiz_response = self.quiz_agent.generate_quiz(query, difficulty='Medium', num_questions=5)
+                with span("quiz_agent"):
+                    quiz_response = self.quiz_agent.generate_quiz(query, difficulty='Medium', num_questions=5)
                 response['quiz'] = quiz_response
                 response['metadata']['agents_used'].append('Quiz_Agent')
             except Exception as e:
@@ -0,0 +1,89 @@
+# backend/agents/voice_agent.py
+"""
+Voice Agent - turns a stream of audio frames into a question with its context ready
+
+Frames go through an incremental recognizer. As soon as the partial
+transcript has a few words, retrieval for it runs in the background and keeps
+following the newest partial, so by the time the student stops speaking the
+syllabus context for the final question has usually already been fetched.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+# Agents are run from this folder; make backend/ importable for shared utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.speech_to_text import Recognizer
+
+
+def query_key(text: str) -> FrozenSet[str]:
+    """Retrieval only depends on the set of lower-cased words, so equal keys give equal context"""
+    return frozenset(text.lower().split())
+
+
+class VoiceSession:
+    def __init__(self, recognizer: Recognizer, retrieve: Callable[[str], List[str]],
+                 prefetch_min_words: int = 3):
+        self.recognizer = recognizer
+        self.retrieve = retrieve
+        self.prefetch_min_words = prefetch_min_words
+        self._stream = recognizer.start_stream()
+        self._partial = ""
+        self._prefetched: Dict[FrozenSet[str], List[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = time.perf_counter()
+        self.stats = {'frames': 0, 'partials': 0, 'prefetches': 0}
+
+    async def _prefetch_latest(self):
+        """Keep retrieval caught up with the newest partial transcript, one search at a time"""
+        while True:
+            text = self._partial
+            key = query_key(text)
+            if key in self._prefetched:
+                return
+            self.stats['prefetches'] += 1
+            self._prefetched[key] = await asyncio.to_thread(self.retrieve, text)
+
+    def _maybe_prefetch(self):
+        if len(self._partial.split()) < self.prefetch_min_words:
+            return  # too little to retrieve anything meaningful yet
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._prefetch_latest())
+
+    async def feed(self, frame: bytes) -> Optional[Dict]:
+        """Recognize one frame; returns a partial-transcript event when the text changed"""
+        self.stats['frames'] += 1
+        partial = await asyncio.to_thread(self._stream.accept, frame)
+        if partial is None:
+            return None
+        self._partial = partial
+        self.stats['partials'] += 1
+        self._maybe_prefetch()
+        return {'type': 'partial', 'text': partial}
+
+    async def finish(self) -> Dict:
+        """
+        Final transcript plus retrieval context. `prefetch_hit` says whether the
+        context came from a retrieval started on a partial transcript.
+        """
+        text = await asyncio.to_thread(self._stream.finish)
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                print(f"⚠️ Voice prefetch failed: {e}")
+        key = query_key(text)
+        hit = key in self._prefetched
+        t0 = time.perf_counter()
+        context = self._prefetched[key] if hit else (await asyncio.to_thread(self.retrieve, text) if text else [])
+        return {
+            'text': text,
+            'context': context,
+            'prefetch_hit': hit,
+            'retrieval_ms': round((time.perf_counter() - t0) * 1000, 2),
+            'utterance_ms': round((time.perf_counter() - self.started_at) * 1000, 2),
+            **self.stats,
+        }
@@ -4,42 +4,41 @@ YouTube Agent - Finds relevant videos and exact timestamps for doubts
 This is the MOST IMPORTANT feature for your multi-agent system
 """
 
-import google.generativeai as genai
-from youtube_search import YoutubeSearch
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
 import re
 from typing import List, Dict, Optional
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.llm_provider import get_provider
+from utils.search_cache import cached_youtube_search
+from utils.transcript_index import get_transcript_index, rank_texts
+from utils.tracing import span
+from utils.model_presets import ModelHandle
+from utils.cancellation import Cancelled, checkpoint
+
 load_dotenv()
 
+# Chunks per video sent to Gemini after local ranking (0 = analyze every chunk)
+PREFILTER_TOP_N = int(os.getenv("YOUTUBE_PREFILTER_TOP_N", "6"))
+
 class YouTubeAgent:
     def __init__(self):
-        """Initialize YouTube Agent with Gemini"""
-        GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-        genai.configure(api_key=GEMINI_API_KEY)
-        
-        # Find available model
-        available_models = []
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                available_models.append(m.name.replace('models/', ''))
-        
-        model_name = available_models[0] if available_models else 'gemini-1.5-flash'
-        self.model = genai.GenerativeModel(model_name)
-        print(f"✅ YouTube Agent initialized with {model_name}")
+        """Initialize YouTube Agent with the configured LLM provider"""
+        self.model = get_provider(model_candidates=['gemini-1.5-flash'], discover=True, label="YouTube Agent")
+        self.scorer = ModelHandle(self.model, 'segment_score')  # answer format + output cap
+        print(f"✅ YouTube Agent initialized with {self.model.name} ({self.model.model_name})")
     
     def search_educational_videos(self, query: str, max_results: int = 5) -> List[Dict]:
         """
         Search for educational videos on YouTube
         Prioritizes: tutorials, explanations, lectures
         """
-        # Enhance query for educational content
-        enhanced_query = f"{query} tutorial explanation"
-        
         try:
-            results = YoutubeSearch(enhanced_query, max_results=max_results).to_dict()
+            # Shared normalized-query cache; adds " tutorial explanation" for educational content
+            results = cached_youtube_search(query, max_results)
             
             videos = []
             for result in results:
@@ -67,6 +66,8 @@ class YouTubeAgent:
         """
         try:
             transcript = YouTubeTranscriptApi.get_transcript(video_id)
+            # Make it searchable for future doubts (shared with main.py's agent)
+            get_transcript_index().add_video(video_id, transcript)
             return transcript
         except TranscriptsDisabled:
             print(f"⚠️ Transcripts disabled for video {video_id}")
@@ -117,23 +118,13 @@ class YouTubeAgent:
         Use Gemini to analyze if a video chunk explains the doubt
         Returns: relevance score, confidence, summary
         """
-        prompt = f"""Analyze if this video transcript segment explains the following concept/doubt:
-
-DOUBT: {doubt_query}
+        prompt = f"""DOUBT: {doubt_query}
 
 VIDEO SEGMENT:
-{chunk_text}
-
-Analyze and respond in this EXACT format:
-RELEVANT: [YES/NO]
-SCORE: [0-100]
-EXPLANATION: [One sentence explaining why it's relevant or not]
-KEY_POINTS: [List 2-3 key points covered in this segment]
-
-Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
+{chunk_text}"""
 
         try:
-            response = self.model.generate_content(prompt)
+            response = self.scorer.generate_content(prompt)
             analysis_text = response.text
             
             # Parse response
@@ -158,6 +149,8 @@ Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
                 'key_points': key_points
             }
         
+        except Cancelled:
+            raise
         except Exception as e:
             print(f"❌ Analysis error: {e}")
             return {
@@ -167,17 +160,25 @@ Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
                 'key_points': ''
             }
     
-    def find_relevant_timestamps(self, video_id: str, doubt_query: str, top_k: int = 3) -> List[Dict]:
+    def find_relevant_timestamps(self, video_id: str, doubt_query: str, top_k: int = 3,
+                                 prefilter_top_n: Optional[int] = None, stats: Optional[Dict] = None) -> List[Dict]:
         """
         THE MAGIC FUNCTION!
         Finds exact timestamps in a video that explain the doubt
         
+        Chunks are first ranked locally (BM25) against the doubt and only the
+        top prefilter_top_n (default YOUTUBE_PREFILTER_TOP_N, 0 = off) go to
+        Gemini. With no lexical match at all it falls back to the full scan.
+        If `stats` is given it is filled with chunks / llm_calls / llm_calls_saved.
+        
         Returns top_k most relevant segments with timestamps
         """
         print(f"🔍 Analyzing video {video_id} for: {doubt_query}")
         
         # Get transcript
-        transcript = self.get_video_transcript(video_id)
+        checkpoint("transcript_fetch")
+        with span("transcript"):
+            transcript = self.get_video_transcript(video_id)
         if not transcript:
             return []
         
@@ -185,13 +186,32 @@ Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
         chunks = self.chunk_transcript(transcript, chunk_size=60)
         print(f"📊 Created {len(chunks)} chunks to analyze")
         
-        # Analyze each chunk
+        # Cheap local pre-filter: skip intros, sponsor reads and other off-topic chunks
+        top_n = PREFILTER_TOP_N if prefilter_top_n is None else prefilter_top_n
+        candidates = list(range(len(chunks)))
+        if top_n and len(chunks) > top_n:
+            with span("prefilter"):
+                ranked = rank_texts(doubt_query, [c['text'] for c in chunks])
+            if ranked:
+                candidates = sorted(i for i, _ in ranked[:top_n])
+                print(f"⚡ Pre-filter kept {len(candidates)}/{len(chunks)} chunks")
+            else:
+                print("⚠️ Pre-filter found no lexical match, falling back to full scan")
+        if stats is not None:
+            stats['chunks'] = len(chunks)
+            stats['llm_calls'] = len(candidates)
+            stats['llm_calls_saved'] = len(chunks) - len(candidates)
+        
+        # Analyze each candidate chunk
         relevant_segments = []
         
-        for i, chunk in enumerate(chunks):
-            print(f"🔎 Analyzing chunk {i+1}/{len(chunks)}...")
+        for n, i in enumerate(candidates):
+            checkpoint("youtube_chunk_llm", skipped=len(candidates) - n)  # student left: skip the rest
+            chunk = chunks[i]
+            print(f"🔎 Analyzing chunk {i+1}/{len(chunks)} ({n+1}/{len(candidates)})...")
             
-            analysis = self.analyze_chunk_relevance(chunk['text'], doubt_query)
+            with span("chunk_llm"):
+                analysis = self.analyze_chunk_relevance(chunk['text'], doubt_query)
             
             if analysis['relevant'] and analysis['score'] >= 60:  # Threshold: 60%
                 segment = {
@@ -232,7 +252,9 @@ Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
         print(f"\n🎥 Processing doubt: {doubt_query}")
         
         # Step 1: Search for videos
-        videos = self.search_educational_videos(doubt_query, max_results=max_videos)
+        checkpoint("video_search")
+        with span("video_search"):
+            videos = self.search_educational_videos(doubt_query, max_results=max_videos)
         
         if not videos:
             return {
@@ -245,15 +267,25 @@ Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
         
         # Step 2: Analyze each video for relevant timestamps
         results = []
+        llm_calls = 0
+        llm_calls_saved = 0
         
-        for video in videos:
+        for n, video in enumerate(videos):
+            checkpoint("youtube_video", skipped=len(videos) - n)
             print(f"\n🎬 Analyzing: {video['title']}")
             
-            timestamps = self.find_relevant_timestamps(
-                video['video_id'],
-                doubt_query,
-                top_k=3
-            )
+            scan = {}
+            with span("timestamps", video_id=video['video_id']):
+                timestamps = self.find_relevant_timestamps(
+                    video['video_id'],
+                    doubt_query,
+                    top_k=3,
+                    stats=scan
+                )
+            video['llm_calls_saved'] = scan.get('llm_calls_saved', 0)
+            llm_calls += scan.get('llm_calls', 0)
+            llm_calls_saved += scan.get('llm_calls_saved', 0)
+            get_transcript_index().set_meta(video['video_id'], video)
             
             if timestamps:
                 video['relevant_timestamps'] = timestamps
@@ -273,7 +305,9 @@ Be strict - only mark as relevant if it DIRECTLY addresses the doubt."""
             'doubt': doubt_query,
             'videos': results,
             'total_videos': len(results),
-            'total_timestamps': sum(len(v.get('relevant_timestamps', [])) for v in results)
+            'total_timestamps': sum(len(v.get('relevant_timestamps', [])) for v in results),
+            'llm_calls': llm_calls,
+            'llm_calls_saved': llm_calls_saved
         }
     
     def generate_summary(self, doubt_query: str, results: Dict) -> str:
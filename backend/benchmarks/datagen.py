@@ -0,0 +1,134 @@
+# backend/benchmarks/datagen.py
+"""
+Synthetic inputs for the benchmarks (documents, PDFs, DOCX files, transcripts).
+Everything is seeded so runs on different commits see identical data.
+"""
+
+import random
+from io import BytesIO
+from typing import Dict, Iterator, List
+
+VOCAB = (
+    "the a of to and in is for that with as on by this be are from it an "
+    "model data learning neural network gradient descent loss function layer "
+    "weight bias training test validation feature vector matrix tensor "
+    "probability distribution regression classification cluster kmeans tree "
+    "forest boosting overfitting regularization dropout activation relu sigmoid "
+    "softmax backpropagation optimizer adam momentum epoch batch embedding "
+    "attention transformer convolution pooling recurrent sequence token "
+    "precision recall accuracy entropy variance bias tradeoff dataset pipeline"
+).split()
+
+
+def make_text(n_words: int, seed: int = 42) -> str:
+    """Paragraphs of sentence-like text, roughly n_words long"""
+    rng = random.Random(seed)
+    paragraphs = []
+    written = 0
+    while written < n_words:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            length = rng.randint(6, 22)
+            words = [rng.choice(VOCAB) for _ in range(length)]
+            sentences.append(" ".join(words).capitalize() + ".")
+            written += length
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def iter_text_pages(total_chars: int, page_words: int = 500, seed: int = 42) -> Iterator[str]:
+    """Lazily generate ~total_chars of text one page at a time (never held in memory at once)"""
+    page_no = 0
+    produced = 0
+    while produced < total_chars:
+        page = make_text(page_words, seed=seed * 1_000_003 + page_no) + "\n\n"
+        produced += len(page)
+        page_no += 1
+        yield page
+
+
+def make_queries(n: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        "what is " + " ".join(rng.choice(VOCAB[18:]) for _ in range(rng.randint(2, 5)))
+        for _ in range(n)
+    ]
+
+
+def _pdf_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(n_pages: int, words_per_page: int = 400, seed: int = 42) -> bytes:
+    """Minimal multi-page PDF with a Helvetica text layer (no external deps)"""
+    rng = random.Random(seed)
+    objects = []  # body of each object, numbered from 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # placeholder, filled once pages exist
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for _ in range(n_pages):
+        words = [rng.choice(VOCAB) for _ in range(words_per_page)]
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td\n"
+        stream += "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in lines)
+        stream += "\nET"
+        data = stream.encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % i + body + b"\nendobj\n")
+    xref_at = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for off in offsets:
+        out.write(b"%010d 00000 n \n" % off)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objects) + 1, catalog_id, xref_at))
+    return out.getvalue()
+
+
+def make_docx(n_paragraphs: int, seed: int = 42) -> bytes:
+    import docx
+
+    rng = random.Random(seed)
+    document = docx.Document()
+    for _ in range(n_paragraphs):
+        document.add_paragraph(" ".join(rng.choice(VOCAB) for _ in range(rng.randint(20, 80))))
+    buf = BytesIO()
+    document.save(buf)
+    return buf.getvalue()
+
+
+def make_transcript(minutes: int, seed: int = 42) -> List[Dict]:
+    """YouTube-transcript-api shaped entries: {text, start, duration}"""
+    rng = random.Random(seed)
+    entries = []
+    t = 0.0
+    while t < minutes * 60:
+        duration = round(rng.uniform(1.5, 5.0), 2)
+        entries.append({
+            'text': " ".join(rng.choice(VOCAB) for _ in range(rng.randint(4, 12))),
+            'start': round(t, 2),
+            'duration': duration,
+        })
+        t += duration
+    return entries
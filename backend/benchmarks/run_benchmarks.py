@@ -0,0 +1,591 @@
+# backend/benchmarks/run_benchmarks.py
+"""
+Benchmark suite for the backend hot paths.
+
+Runs micro-benchmarks (chunking, retrieval, PDF/DOCX extraction, transcript
+segmentation) and end-to-end load tests of /api/chat and /api/generate-quiz
+against a deterministic fake Gemini, and writes the results as JSON.
+
+Usage (from backend/):
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --output new.json --compare bench.json
+    python benchmarks/run_benchmarks.py --only chat --latency-ms 200 --concurrency 32
+    python benchmarks/run_benchmarks.py --provider replay --recordings recordings/llm.jsonl
+
+With --compare, the run exits with status 1 if any benchmark's p95 regressed
+by more than --threshold (default 15%) against the baseline file.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import datagen  # noqa: E402
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+# -------------------------
+# Measurement helpers
+# -------------------------
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies_ms: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    return {
+        'n': len(values),
+        'mean_ms': round(statistics.fmean(values), 4) if values else 0.0,
+        'min_ms': round(values[0], 4) if values else 0.0,
+        'p50_ms': round(percentile(values, 50), 4),
+        'p95_ms': round(percentile(values, 95), 4),
+        'p99_ms': round(percentile(values, 99), 4),
+        'max_ms': round(values[-1], 4) if values else 0.0,
+    }
+
+
+def time_calls(fn: Callable, repeat: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    return summarize(latencies)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the backend's per-request print() noise while measuring"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def load_main(args):
+    """Import main.py with an offline LLM provider (fake, or replay of a recording)"""
+    os.environ["LLM_PROVIDER"] = args.provider
+    os.environ["LLM_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["LLM_FAKE_JITTER_MS"] = str(args.jitter_ms)
+    if args.recordings:
+        os.environ["LLM_RECORD_PATH"] = args.recordings
+    # Keep benchmark transcripts out of the real on-disk index
+    os.environ["TRANSCRIPT_INDEX_PATH"] = os.path.join(tempfile.mkdtemp(prefix="ta-bench-"), "transcripts.json")
+    os.environ["CORPUS_DIR"] = tempfile.mkdtemp(prefix="ta-bench-corpus-")
+    with quiet():
+        import main
+    return main
+
+
+# -------------------------
+# Micro-benchmarks
+# -------------------------
+@benchmark("chunk_text")
+def bench_chunk_text(main, args):
+    results = {}
+    for n_words in (10_000, 100_000):
+        text = datagen.make_text(n_words)
+        results[f"{n_words}_words"] = time_calls(lambda: main.chunk_text(text), repeat=args.repeat)
+    return results
+
+
+def legacy_chunk_text(text: str, size: int = 500, overlap: int = 50) -> List[str]:
+    """The original word-list chunk_text, kept as the baseline for the streaming chunker"""
+    words = text.split()
+    if not words:
+        return []
+    chunks = []
+    step = size - overlap
+    for i in range(0, len(words), step):
+        chunk = " ".join(words[i:i + size])
+        if chunk.strip():
+            chunks.append(chunk)
+    return chunks
+
+
+def measure_peak(fn: Callable) -> float:
+    """Peak Python heap allocated while fn() runs, in MB"""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark("chunker_streaming_vs_legacy")
+def bench_chunker(main, args):
+    """Throughput and peak memory of legacy vs streaming chunking on a --chunker-mb input"""
+    from utils.chunker import iter_chunks
+
+    total = int(args.chunker_mb * 2 ** 20)
+    text = "".join(datagen.iter_text_pages(total))
+    mb = len(text) / 2 ** 20
+
+    def consume(it):
+        n = 0
+        for _ in it:
+            n += 1
+        return n
+
+    cases = {
+        'legacy_list': lambda: legacy_chunk_text(text),
+        'streaming_string': lambda: consume(iter_chunks(text)),
+        'streaming_pages': lambda: consume(iter_chunks(text[i:i + 4096] for i in range(0, len(text), 4096))),
+    }
+    results = {'input_mb': round(mb, 2)}
+    for name, fn in cases.items():
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        results[name] = {
+            'seconds': round(elapsed, 3),
+            'throughput_mb_s': round(mb / elapsed, 2) if elapsed else 0.0,
+            'peak_mb': measure_peak(fn),
+        }
+    return results
+
+
+@benchmark("search_chunks")
+def bench_search_chunks(main, args):
+    results = {}
+    queries = datagen.make_queries(32)
+    for n_words in (50_000, 500_000):
+        chunks = main.chunk_text(datagen.make_text(n_words))
+        it = iter(range(10 ** 9))
+        results[f"{len(chunks)}_chunks"] = time_calls(
+            lambda: main.search_chunks(queries[next(it) % len(queries)], chunks, top_k=4),
+            repeat=args.repeat,
+        )
+    return results
+
+
+@benchmark("corpus_search")
+def bench_corpus_search(main, args):
+    """Postings-based search over the shared (mmap'd) corpus, same sizes as search_chunks"""
+    from utils.shared_corpus import SharedCorpus
+
+    results = {}
+    queries = datagen.make_queries(32)
+    for n_words in (50_000, 500_000):
+        corpus = SharedCorpus(tempfile.mkdtemp(prefix="ta-bench-corpus-"))
+        chunked = main.chunk_text_with_offsets(datagen.make_text(n_words))
+        corpus.add_document("bench.txt", "", chunked)
+        it = iter(range(10 ** 9))
+        results[f"{len(chunked)}_chunks"] = time_calls(
+            lambda: corpus.search(queries[next(it) % len(queries)], top_k=4),
+            repeat=args.repeat,
+        )
+    return results
+
+
+@benchmark("corpus_restart")
+def bench_corpus_restart(main, args):
+    """Warm restart: open a persisted corpus and answer the first query, vs re-chunking the text"""
+    from utils.shared_corpus import SharedCorpus
+
+    results = {}
+    query = datagen.make_queries(1)[0]
+    for n_words in (50_000, 500_000):
+        root = tempfile.mkdtemp(prefix="ta-bench-corpus-")
+        text = datagen.make_text(n_words)
+        with quiet():
+            SharedCorpus(root).add_document("bench.txt", text, main.chunk_text_with_offsets(text))
+
+        def reopen():
+            with quiet():
+                SharedCorpus(root).search(query, top_k=4)
+
+        results[f"{n_words}_words"] = {
+            'reopen': time_calls(reopen, repeat=args.repeat),
+            'rechunk': time_calls(lambda: main.chunk_text_with_offsets(text), repeat=max(3, args.repeat // 4)),
+        }
+    return results
+
+
+@benchmark("corpus_dedup")
+def bench_corpus_dedup(main, args):
+    """
+    Overlapping course material (notes, lightly edited slides, a textbook that
+    contains the notes): index size, ingest time and how many distinct passages
+    fill the top-4, with near-duplicate collapsing off and on.
+    """
+    from utils import minhash
+    from utils.shared_corpus import SharedCorpus
+
+    # A distinctive term per paragraph, so each query is about one passage
+    paragraphs = [f"{p} Lemma{n} glossary{n}." for n, p in enumerate(datagen.make_text(20_000, seed=1).split("\n\n"))]
+    notes = "\n\n".join(paragraphs)
+    slides = "\n\n".join(p.replace(" the ", " a ", 1) for p in paragraphs)
+    book = notes + "\n\n" + datagen.make_text(20_000, seed=9)
+    documents = [(name, text, main.chunk_text_with_offsets(text))
+                 for name, text in (("notes.txt", notes), ("slides.txt", slides), ("book.txt", book))]
+    queries = [f"what is lemma{n} glossary{n}" for n in range(0, len(paragraphs), max(1, len(paragraphs) // 32))]
+
+    def distinct_passages(hits):
+        seen = []
+        for h in hits:
+            own = minhash.shingles(h['text'])
+            if all(minhash.jaccard(own, other) < 0.8 for other in seen):
+                seen.append(own)
+        return len(seen)
+
+    results = {}
+    for label, threshold in (("off", 0.0), ("on", 0.8)):
+        corpus = SharedCorpus(tempfile.mkdtemp(prefix="ta-bench-corpus-"), dedup_threshold=threshold)
+        t0 = time.perf_counter()
+        corpus.add_documents(documents)
+        ingest_ms = (time.perf_counter() - t0) * 1000.0
+        stats = corpus.get_stats()
+        it = iter(range(10 ** 9))
+        results[label] = {
+            'ingest_ms': round(ingest_ms, 2),
+            'mapped_bytes': stats['mapped_bytes'],
+            'duplicate_chunks': stats['dedup']['duplicate_chunks'],
+            'index_bytes_saved': stats['dedup']['index_bytes_saved'],
+            'distinct_passages_top4': round(statistics.fmean(
+                distinct_passages(corpus.search_hits(q, top_k=4)) for q in queries), 2),
+            'search': time_calls(lambda: corpus.search(queries[next(it) % len(queries)], top_k=4),
+                                 repeat=args.repeat),
+        }
+    return results
+
+
+@benchmark("corpus_scoped")
+def bench_corpus_scoped(main, args):
+    """A library of many courses: search the whole corpus vs one course's partition vs one file"""
+    from utils.shared_corpus import SharedCorpus
+
+    results = {}
+    queries = datagen.make_queries(32)
+    for n_courses in (10, 50):
+        corpus = SharedCorpus(tempfile.mkdtemp(prefix="ta-bench-corpus-"))
+        entries = []
+        for course in range(n_courses):
+            docs = []
+            for unit in range(4):
+                text = datagen.make_text(2_000, seed=course * 10 + unit)
+                docs.append((f"course{course}-unit{unit}.txt", text, main.chunk_text_with_offsets(text)))
+            entries += corpus.add_documents(docs, course=f"course{course}")
+        scopes = {'all': None, 'course': {'course': "course0"}, 'file': {'doc_ids': [entries[0]['doc_id']]}}
+        cases = {}
+        for label, scope in scopes.items():
+            it = iter(range(10 ** 9))
+            cases[label] = time_calls(
+                lambda: corpus.search(queries[next(it) % len(queries)], top_k=4, scope=scope),
+                repeat=args.repeat,
+            )
+        results[f"{n_courses}_courses"] = cases
+    return results
+
+
+@benchmark("extract_pdf")
+def bench_extract_pdf(main, args):
+    results = {}
+    for pages in (10, 100):
+        pdf = datagen.make_pdf(pages)
+        results[f"{pages}_pages"] = time_calls(lambda: main.extract_pdf(pdf), repeat=max(3, args.repeat // 4))
+    return results
+
+
+@benchmark("extract_docx")
+def bench_extract_docx(main, args):
+    results = {}
+    for paragraphs in (100, 1000):
+        blob = datagen.make_docx(paragraphs)
+        results[f"{paragraphs}_paragraphs"] = time_calls(lambda: main.extract_docx(blob), repeat=max(3, args.repeat // 4))
+    return results
+
+
+@benchmark("find_timestamps")
+def bench_find_timestamps(main, args):
+    """Cold = fetch + segment + index a new video; warm = query an already indexed video"""
+    from utils.transcript_index import get_transcript_index
+
+    results = {}
+    agent = main.YouTubeAgent()
+    doubt = "explain gradient descent loss function"
+    for minutes in (15, 120):
+        transcript = datagen.make_transcript(minutes)
+        agent.get_transcript = lambda video_id, t=transcript: t
+        ids = iter(range(10 ** 9))
+        results[f"{minutes}_min_cold"] = time_calls(
+            lambda: agent.find_timestamps(f"bench-{minutes}-{next(ids)}", doubt),
+            repeat=max(3, args.repeat // 4), warmup=0,
+        )
+        results[f"{minutes}_min_warm"] = time_calls(
+            lambda: agent.find_timestamps(f"bench-{minutes}-0", doubt),
+            repeat=args.repeat,
+        )
+    stats = get_transcript_index().get_stats()
+    results['all_videos_search'] = time_calls(
+        lambda: get_transcript_index().search(doubt, top_k=10), repeat=args.repeat
+    )
+    results['all_videos_search']['indexed_segments'] = stats['segments']
+    return results
+
+
+@benchmark("chunk_transcript")
+def bench_chunk_transcript(main, args):
+    sys.path.insert(0, os.path.join(BACKEND_DIR, "agents"))
+    try:
+        with quiet():
+            import youtube_agent
+    except Exception as e:
+        return {'skipped': f"agents/youtube_agent.py not importable: {type(e).__name__}: {e}"}
+    # Skip __init__: it talks to the Gemini API; chunk_transcript is pure Python
+    agent = youtube_agent.YouTubeAgent.__new__(youtube_agent.YouTubeAgent)
+    results = {}
+    for minutes in (15, 120):
+        transcript = datagen.make_transcript(minutes)
+        results[f"{minutes}_min"] = time_calls(lambda: agent.chunk_transcript(transcript), repeat=args.repeat)
+    return results
+
+
+# -------------------------
+# End-to-end load tests
+# -------------------------
+async def run_load(app, path: str, payloads: List[dict], concurrency: int) -> Dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(payload):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post(path, json=payload)
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                if r.status_code != 200:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(p) for p in payloads))
+        wall = time.perf_counter() - t0
+
+    result = summarize(latencies)
+    result.update({
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_s': round(wall, 4),
+        'throughput_rps': round(len(payloads) / wall, 2) if wall else 0.0,
+    })
+    return result
+
+
+async def upload_fixture(app, n_words: int):
+    import httpx
+
+    text = datagen.make_text(n_words).encode("utf-8")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.delete("/api/clear-documents")
+        r = await client.post("/api/upload-syllabus", files={'file': ("bench.txt", text, "text/plain")})
+        r.raise_for_status()
+
+
+def preset_tokens(handle, before: Dict) -> Dict:
+    """
+    Estimated tokens per call for one model preset during a load test: the
+    per-request payload actually sent vs. the same instructions pasted inline
+    (how prompts were built before presets), plus the output.
+    """
+    after = handle.get_stats()
+    calls = after['calls'] - before['calls']
+    delta = {k: after[k] - before[k] for k in ('payload_tokens', 'instruction_tokens', 'output_tokens')}
+    if not calls:
+        return {'calls': 0}
+    return {
+        'calls': calls,
+        'payload_tokens_per_call': round(delta['payload_tokens'] / calls, 1),
+        'inline_tokens_per_call': round((delta['payload_tokens'] + delta['instruction_tokens']) / calls, 1),
+        'output_tokens_per_call': round(delta['output_tokens'] / calls, 1),
+        'max_output_tokens': after['max_output_tokens'],
+    }
+
+
+@benchmark("api_chat")
+def bench_api_chat(main, args):
+    queries = datagen.make_queries(args.requests)
+    payloads = [{'message': q, 'chat_history': []} for q in queries]
+    before = main.mode_models['normal'].get_stats()
+    hits_before = main.semantic_cache.stats['hits'] if main.semantic_cache else 0
+    with quiet():
+        asyncio.run(upload_fixture(main.app, 50_000))
+        result = asyncio.run(run_load(main.app, "/api/chat", payloads, args.concurrency))
+    result['llm_tokens'] = preset_tokens(main.mode_models['normal'], before)
+    result['semantic_cache_hits'] = (main.semantic_cache.stats['hits'] - hits_before) if main.semantic_cache else 0
+    return result
+
+
+@benchmark("api_generate_quiz")
+def bench_api_generate_quiz(main, args):
+    topics = datagen.make_queries(args.requests, seed=11)
+    payloads = [{'topic': t, 'difficulty': "Medium", 'num_questions': 5} for t in topics]
+    before = main.mode_models['quiz'].get_stats()
+    with quiet():
+        asyncio.run(upload_fixture(main.app, 50_000))
+        result = asyncio.run(run_load(main.app, "/api/generate-quiz", payloads, args.concurrency))
+    result['llm_tokens'] = preset_tokens(main.mode_models['quiz'], before)
+    return result
+
+
+@benchmark("api_upload_batch")
+def bench_api_upload_batch(main, args):
+    """12 syllabus files: one /api/upload-batch call vs 12 sequential /api/upload-syllabus calls"""
+    import httpx
+
+    files = [(f"unit{i}.txt", datagen.make_text(40_000, seed=i).encode("utf-8")) for i in range(12)]
+    mb = sum(len(b) for _, b in files) / (1024 * 1024)
+
+    async def upload(batch: bool) -> float:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                     timeout=300) as client:
+            await client.delete("/api/clear-documents")
+            t0 = time.perf_counter()
+            if batch:
+                r = await client.post("/api/upload-batch", files=[('files', (n, b, "text/plain")) for n, b in files])
+                r.raise_for_status()
+            else:
+                for n, b in files:
+                    (await client.post("/api/upload-syllabus", files={'file': (n, b, "text/plain")})).raise_for_status()
+            return time.perf_counter() - t0
+
+    results = {'files': len(files), 'mb': round(mb, 2), 'workers': main.UPLOAD_WORKERS}
+    with quiet():
+        asyncio.run(upload(True))  # start the worker processes outside the measurement
+        for name, batch in (("sequential", False), ("batch", True)):
+            elapsed = asyncio.run(upload(batch))
+            results[name] = {'seconds': round(elapsed, 3), 'throughput_mb_s': round(mb / elapsed, 2)}
+    return results
+
+
+# -------------------------
+# Reporting
+# -------------------------
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, Dict]:
+    """{bench: {case: stats}} -> {"bench/case": stats} for every stats dict with a p95"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict) and 'p95_ms' in value:
+            flat[name] = value
+        elif isinstance(value, dict):
+            flat.update(flatten(value, name))
+    return flat
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> bool:
+    """Print a p50/p95 diff table; return True if any p95 regressed beyond threshold"""
+    new = flatten(current['results'])
+    old = flatten(baseline['results'])
+    regressed = False
+    print(f"\nComparing against {baseline['meta'].get('commit')} (threshold {threshold:.0%})")
+    print(f"{'benchmark':<44}{'p50 old':>10}{'p50 new':>10}{'p95 old':>10}{'p95 new':>10}{'delta':>9}")
+    for name in sorted(set(new) & set(old)):
+        o, n = old[name], new[name]
+        delta = (n['p95_ms'] - o['p95_ms']) / o['p95_ms'] if o['p95_ms'] else 0.0
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{name:<44}{o['p50_ms']:>10.3f}{n['p50_ms']:>10.3f}{o['p95_ms']:>10.3f}{n['p95_ms']:>10.3f}{delta:>+9.1%}{flag}")
+    return regressed
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="AI Teaching Assistant backend benchmarks")
+    parser.add_argument("--output", "-o", help="write JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed p95 regression (fraction)")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per micro-benchmark case")
+    parser.add_argument("--requests", type=int, default=100, help="requests per load test")
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent clients per load test")
+    parser.add_argument("--chunker-mb", type=float, default=8.0, help="input size for the chunker comparison (use 100 for the full run)")
+    parser.add_argument("--provider", choices=["fake", "replay"], default="fake", help="offline LLM provider")
+    parser.add_argument("--recordings", help="LLM_RECORD_PATH for --provider replay")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake Gemini latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra deterministic random latency per call")
+    args = parser.parse_args(argv)
+
+    main = load_main(args)
+
+    selected = [n for n in BENCHMARKS if not args.only or any(o in n for o in args.only)]
+    results = {}
+    for name in selected:
+        print(f"⏱️  {name} ...", flush=True)
+        t0 = time.perf_counter()
+        results[name] = BENCHMARKS[name](main, args)
+        print(f"   done in {time.perf_counter() - t0:.1f}s")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"📄 Results written to {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -10,19 +10,46 @@
 #
 # NOTE: This is intended to be a drop-in replacement for your earlier app that used
 # genai.GenerativeModel from google.generativeai. Make sure GEMINI_API_KEY is set in .env.
+# LLM calls go through utils/llm_provider.py (LLM_PROVIDER=gemini|record|replay|fake).
 # Run with: uvicorn main:app --reload
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
-import PyPDF2
-import docx
 from io import BytesIO
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import time
+import json
+import asyncio
+import functools
+
+from utils.llm_provider import get_provider
+from utils.model_router import find_router
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.chunker import iter_chunks
+from utils.simplify_cache import SimplifyCache
+from utils.search_cache import cached_youtube_search, youtube_search_cache
+from utils.transcript_index import get_transcript_index
+from utils.shared_corpus import get_shared_corpus
+from utils.speech_to_text import get_recognizer
+from utils.summarizer import Summarizer, SUMMARY_STYLES
+from utils.conversation import ConversationMemory, compress_prompt
+from utils.model_presets import build_handles, quiz_max_tokens
+from utils.semantic_cache import SemanticCache, is_follow_up
+from utils.quiz_stream import QuizStreamParser, parse_quiz, validate_question
+from utils.outline import build_outline, compact_context, wants_raw
+from utils.extract import extract_pdf, extract_docx, extract_document, is_supported
+from utils.tracing import Tracer, span, current_trace
+from utils.profiler import SamplingProfiler
+from utils.cancellation import Cancelled, CancelToken, checkpoint, run_cancellable, metrics as cancel_metrics
+from agents.voice_agent import VoiceSession
 
 # YouTube imports (optional)
 try:
@@ -40,6 +67,75 @@ load_dotenv()
 # FastAPI app
 app = FastAPI(title="AI Teaching Assistant - Full Version (Gemini)")
 
+# -------------------------
+# Admission control for LLM-bound endpoints
+# -------------------------
+# Interactive chat is served first; quiz and YouTube work (dozens of Gemini
+# calls per doubt) get their own capped lanes and bounded queues. Registered
+# before CORS so that 429 responses still carry the CORS headers.
+admission = AdmissionController(
+    capacity=int(os.getenv("ADMISSION_CAPACITY", "16")),
+    classes={
+        'interactive': {'priority': 0, 'max_queue': int(os.getenv("ADMISSION_CHAT_QUEUE", "100")), 'max_wait_s': 30},
+        'quiz': {'priority': 1, 'max_queue': int(os.getenv("ADMISSION_QUIZ_QUEUE", "30")), 'max_concurrent': 6, 'max_wait_s': 60},
+        'youtube': {'priority': 2, 'max_queue': int(os.getenv("ADMISSION_YOUTUBE_QUEUE", "10")), 'max_concurrent': 3, 'max_wait_s': 90},
+        'speculative': {'priority': 3, 'max_queue': 5, 'max_concurrent': 2, 'max_wait_s': 20},
+        'background': {'priority': 4, 'max_queue': 50, 'max_concurrent': 1, 'max_wait_s': 60},
+        # Upload outlines: one slot per batch of chunks, so a big document can't starve the lane
+        'outline': {'priority': 5, 'max_queue': int(os.getenv("OUTLINE_QUEUE", "20")),
+                    'max_concurrent': int(os.getenv("OUTLINE_CONCURRENCY", "2")), 'max_wait_s': 120},
+    },
+)
+ADMISSION_ROUTES = {
+    "/api/chat": 'interactive',
+    "/api/generate-quiz": 'quiz',
+    "/api/summarize": 'quiz',
+    "/api/search-videos": 'youtube',
+    "/api/youtube-doubt": 'youtube',
+}
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    class_name = ADMISSION_ROUTES.get(request.url.path) if request.method == "POST" else None
+    if class_name is None:
+        return await call_next(request)
+    try:
+        t0 = time.perf_counter()
+        async with admission.slot(class_name):
+            trace = current_trace()
+            if trace:
+                trace.add("admission", t0, time.perf_counter(), 0, {'class': class_name})
+            return await call_next(request)
+    except AdmissionRejected as e:
+        return busy_response(e)
+
+def busy_response(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={'detail': f"Server busy ({e.reason}), please retry shortly.", 'retry_after': e.retry_after},
+        headers={'Retry-After': str(e.retry_after)},
+    )
+
+# -------------------------
+# Request tracing (registered after admission so queueing time is included)
+# -------------------------
+tracer = Tracer(keep=int(os.getenv("TRACE_KEEP", "100")))
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    started = tracer.start(f"{request.method} {request.url.path}")
+    try:
+        response = await call_next(request)
+    except Exception:
+        tracer.finish(started, status=500)
+        raise
+    trace = tracer.finish(started, status=response.status_code)
+    response.headers['Server-Timing'] = trace.server_timing()
+    response.headers['X-Trace-Id'] = trace.id
+    return response
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -47,18 +143,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "Server-Timing", "X-Trace-Id"],
 )
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY not found in .env")
-
-genai.configure(api_key=GEMINI_API_KEY)
+# Configure the LLM provider (Gemini by default; see utils/llm_provider.py for
+# record / replay / fake modes used for offline profiling and load tests)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+if LLM_PROVIDER in ("gemini", "record") and not os.getenv("GEMINI_API_KEY"):
+    raise ValueError("❌ GEMINI_API_KEY not found in .env (or set LLM_PROVIDER=replay/fake to run offline)")
 
 # Try to initialize a working Gemini model (try multiple fallbacks)
-print("🔄 Initializing Gemini model...")
-model = None
+print(f"🔄 Initializing LLM provider: {LLM_PROVIDER}...")
 MODEL_CANDIDATES = [
     'gemini-2.5-flash',
     'gemini-2.5-pro',
@@ -66,26 +161,24 @@ MODEL_CANDIDATES = [
     'gemini-flash-latest',
     'gemini-pro-latest',
 ]
-for mn in MODEL_CANDIDATES:
-    try:
-        candidate = genai.GenerativeModel(mn)
-        test = candidate.generate_content("Say OK")
-        if test and getattr(test, "text", None):
-            model = candidate
-            print(f"  ✅ Using model: {mn}")
-            break
-    except Exception as e:
-        print(f"  ❌ {mn} init failed: {type(e).__name__}: {e}")
-if model is None:
+# Every candidate that answers stays in use: calls are routed by per-mode latency/errors
+model = get_provider(MODEL_CANDIDATES, route=True)
+if not model.is_ready():
     raise RuntimeError("❌ No Gemini model could be initialized. Check API key and network.")
+model_router = find_router(model)
+
+print("✅ LLM ready!")
 
-print("✅ Gemini ready!")
+# Per-mode handles on the same provider: system instruction + temperature + output cap
+mode_models = build_handles(model)
 
 # -------------------------
 # In-memory persistent storage
 # -------------------------
 # Note: For production use a database (SQLite, Postgres, Firebase, etc.). In memory is fine for demo.
-uploaded_documents: List[Dict[str, Any]] = []  # each: {filename, text, chunks, uploaded_at}
+# Uploaded documents live in the shared corpus (mmap'd segments in CORPUS_DIR) so that
+# every `uvicorn --workers N` process sees the same uploads and retrieval index.
+corpus = get_shared_corpus()
 chat_histories: List[Dict[str, Any]] = []     # store chronological chat entries: {id, user_message, assistant_response, timestamp, mode, sources}
 quizzes_store: List[Dict[str, Any]] = []      # store generated quizzes
 # Optionally, you can map by user/session id if you have authentication.
@@ -93,16 +186,33 @@ quizzes_store: List[Dict[str, Any]] = []      # store generated quizzes
 # -------------------------
 # Pydantic models (API)
 # -------------------------
+class RetrievalScope(BaseModel):
+    course: Optional[str] = None
+    unit: Optional[str] = None
+    doc_ids: Optional[List[str]] = None  # individual files
+
 class ChatRequest(BaseModel):
     message: str
-    chat_history: Optional[List[dict]] = []  # frontend may send previous exchange for context
+    chat_history: Optional[List[dict]] = []  # legacy: previous exchange for context (prefer session_id)
+    session_id: Optional[str] = None  # server-side conversation memory; returned by every chat response
     simplify_mode: Optional[bool] = False
     mode: Optional[str] = "normal"  # normal | simplified | deepdive (optional)
+    scope: Optional[RetrievalScope] = None  # only retrieve from these documents (default: all)
 
 class QuizRequest(BaseModel):
     topic: str
     difficulty: str
     num_questions: int = 5
+    scope: Optional[RetrievalScope] = None
+
+class CollectionUpdate(BaseModel):
+    course: Optional[str] = None
+    unit: Optional[str] = None
+
+class SummarizeRequest(BaseModel):
+    text: Optional[str] = None
+    doc_id: Optional[str] = None  # summarize an uploaded document instead of `text`
+    summary_type: str = "detailed"  # detailed | brief | bullet
 
 class VideoSearchRequest(BaseModel):
     query: str
@@ -115,31 +225,16 @@ class YouTubeDoubtRequest(BaseModel):
 # -------------------------
 # Utilities (file extraction, chunking, search)
 # -------------------------
-def extract_pdf(content: bytes) -> str:
-    reader = PyPDF2.PdfReader(BytesIO(content))
-    pages_text = []
-    for p in reader.pages:
-        text = p.extract_text() or ""
-        pages_text.append(text)
-    return "\n".join(pages_text)
+# Extraction (extract_document, extract_pdf / extract_docx) lives in utils/extract.py
+# so uploads can run it in worker processes.
 
-def extract_docx(content: bytes) -> str:
-    doc = docx.Document(BytesIO(content))
-    paras = [p.text for p in doc.paragraphs if p.text.strip()]
-    return "\n".join(paras)
+def chunk_text_with_offsets(text, size: int = 500, overlap: int = 50) -> List[Dict[str, Any]]:
+    """Sentence-aware chunks with their character offsets; `text` may be a string or an iterator of pages"""
+    return list(iter_chunks(text, size=size, overlap=overlap))
 
 def chunk_text(text: str, size: int = 500, overlap: int = 50) -> List[str]:
-    """Simple word-based chunking"""
-    words = text.split()
-    if not words:
-        return []
-    chunks = []
-    step = size - overlap
-    for i in range(0, len(words), step):
-        chunk = " ".join(words[i:i + size])
-        if chunk.strip():
-            chunks.append(chunk)
-    return chunks
+    """Sentence-aware chunking (~size words, ~overlap words shared between neighbours)"""
+    return [c['text'] for c in iter_chunks(text, size=size, overlap=overlap)]
 
 def search_chunks(query: str, chunks: List[str], top_k: int = 3) -> List[str]:
     """Very simple overlap-based scoring for demo. Replace with vector DB for production."""
@@ -165,12 +260,17 @@ def format_time(seconds: float) -> str:
 # -------------------------
 # YouTube Agent
 # -------------------------
+# Doubts are matched against the local transcript index first; with
+# TRANSCRIPT_LOCAL_FIRST on, enough local hits skip the live YouTube search.
+LOCAL_FIRST = os.getenv("TRANSCRIPT_LOCAL_FIRST", "1").lower() in ("1", "true", "yes", "on")
+LOCAL_MIN_COVERAGE = float(os.getenv("TRANSCRIPT_LOCAL_MIN_COVERAGE", "0.6"))
+
 class YouTubeAgent:
     def search_videos(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
         if not YOUTUBE_AVAILABLE:
             return []
         try:
-            results = YoutubeSearch(f"{query} tutorial explanation", max_results=max_results).to_dict()
+            results = cached_youtube_search(query, max_results)
             videos = []
             for r in results:
                 vid = {
@@ -197,54 +297,73 @@ class YouTubeAgent:
             return None
 
     def find_timestamps(self, video_id: str, doubt: str, top_k: int = 3):
-        transcript = self.get_transcript(video_id)
-        if not transcript:
-            return []
-        # Build 60-second segments
-        segments = []
-        cur = {'text': '', 'start': 0, 'end': 0}
-        for entry in transcript:
-            start = entry.get('start', 0)
-            text = entry.get('text', '')
-            if start - cur['start'] >= 60 and cur['text']:
-                segments.append(cur)
-                cur = {'text': '', 'start': start, 'end': start}
-            cur['text'] += " " + text
-            cur['end'] = start + entry.get('duration', 3)
-        if cur['text']:
-            segments.append(cur)
-        # Score segments
-        doubt_words = set(doubt.lower().split())
-        scored = []
-        for seg in segments:
-            seg_words = set(seg['text'].lower().split())
-            overlap = len(seg_words & doubt_words)
-            if overlap > 0:
-                score = int((overlap / (len(doubt_words) if doubt_words else 1)) * 100)
-                scored.append({
-                    'start_time': seg['start'],
-                    'timestamp_formatted': format_time(seg['start']),
-                    'url_with_timestamp': f"https://www.youtube.com/watch?v={video_id}&t={int(seg['start'])}s",
-                    'text_preview': seg['text'][:160] + '...',
-                    'relevance_score': score
-                })
-        scored.sort(key=lambda x: x['relevance_score'], reverse=True)
-        return scored[:top_k]
+        # Segments + postings live in the persistent transcript index; a video is
+        # only fetched and segmented the first time we see it.
+        index = get_transcript_index()
+        if not index.has_video(video_id):
+            transcript = self.get_transcript(video_id)
+            if not transcript:
+                return []
+            index.add_video(video_id, transcript)
+        hits = index.search(doubt, top_k=top_k, video_ids=[video_id])
+        return [self._timestamp_entry(video_id, h) for h in hits]
+
+    def _timestamp_entry(self, video_id: str, hit: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'start_time': hit['start'],
+            'timestamp_formatted': format_time(hit['start']),
+            'url_with_timestamp': f"https://www.youtube.com/watch?v={video_id}&t={int(hit['start'])}s",
+            'text_preview': hit['text'][:160] + '...',
+            'relevance_score': int(hit['coverage'] * 100)
+        }
+
+    def local_matches(self, doubt: str, max_videos: int = 2) -> List[Dict[str, Any]]:
+        """Videos from the transcript index with segments matching the doubt, best first"""
+        hits = get_transcript_index().search(doubt, top_k=max_videos * 10, min_coverage=LOCAL_MIN_COVERAGE)
+        by_video: Dict[str, Dict[str, Any]] = {}
+        for h in hits:
+            vid = h['video_id']
+            if vid not in by_video:
+                if len(by_video) >= max_videos:
+                    continue
+                meta = get_transcript_index().video_meta(vid)
+                by_video[vid] = dict(meta, video_id=vid, relevant_timestamps=[], has_timestamps=True)
+            if len(by_video[vid]['relevant_timestamps']) < 3:
+                by_video[vid]['relevant_timestamps'].append(self._timestamp_entry(vid, h))
+        return list(by_video.values())
 
     def process_doubt(self, doubt: str, max_videos: int = 2):
+        # Known lecture videos first: enough strong local hits means no YouTube round trip at all
+        local = self.local_matches(doubt, max_videos)
+        if LOCAL_FIRST and len(local) >= max_videos:
+            return {
+                'success': True,
+                'doubt': doubt,
+                'source': 'local_index',
+                'videos': local,
+                'total_videos': len(local),
+                'total_timestamps': sum(len(v['relevant_timestamps']) for v in local)
+            }
         videos = self.search_videos(doubt, max_videos)
         if not videos:
+            if local:
+                return {'success': True, 'doubt': doubt, 'source': 'local_index', 'videos': local,
+                        'total_videos': len(local),
+                        'total_timestamps': sum(len(v['relevant_timestamps']) for v in local)}
             return {'success': False, 'message': 'No videos found', 'videos': []}
         results = []
         for v in videos:
             timestamps = self.find_timestamps(v['video_id'], doubt, top_k=3)
+            get_transcript_index().set_meta(v['video_id'], v)
             v['relevant_timestamps'] = timestamps
             v['has_timestamps'] = len(timestamps) > 0
             results.append(v)
         return {
             'success': True,
             'doubt': doubt,
+            'source': 'youtube_search',
             'videos': results,
+            'local_matches': local,
             'total_videos': len(results),
             'total_timestamps': sum(len(v['relevant_timestamps']) for v in results)
         }
@@ -266,6 +385,73 @@ def save_chat_entry(user_message: str, assistant_response: str, mode: str, sourc
     chat_histories.append(entry)
     return entry
 
+# -------------------------
+# Helper: simplified rewrites of a previous answer
+# -------------------------
+# With SPECULATIVE_SIMPLIFY=1 every normal answer gets a low-priority background
+# rewrite, cached by the hash of the answer, so a follow-up "simplify" is instant.
+SPECULATIVE_SIMPLIFY = os.getenv("SPECULATIVE_SIMPLIFY", "0").lower() in ("1", "true", "yes", "on")
+simplify_cache = SimplifyCache(max_entries=int(os.getenv("SIMPLIFY_CACHE_SIZE", "256")))
+
+async def rewrite_simplified(previous_reply: str) -> Optional[str]:
+    resp = await run_in_threadpool(mode_models['rewrite'].generate_content, previous_reply)
+    if resp and getattr(resp, "text", None) and not getattr(resp, "degraded", False):
+        return resp.text
+    return None
+
+async def speculative_rewrite(previous_reply: str) -> Optional[str]:
+    """Background rewrite; yields to real traffic via the lowest admission class"""
+    try:
+        async with admission.slot('speculative'):
+            return await rewrite_simplified(previous_reply)
+    except AdmissionRejected:
+        simplify_cache.stats['speculative_skipped'] += 1
+        return None
+
+# -------------------------
+# Conversation memory (last turns verbatim + rolling summary, fixed prompt budget)
+# -------------------------
+MEMORY_SUMMARY_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", "300"))
+
+async def compress_conversation(summary: str, turns: List[dict]) -> Optional[str]:
+    """Fold evicted turns into the session summary; runs behind real traffic"""
+    try:
+        async with admission.slot('background'):
+            gen = await run_in_threadpool(model.generate_content,
+                                          compress_prompt(summary, turns, max_words=MEMORY_SUMMARY_TOKENS * 3 // 4))
+    except AdmissionRejected:
+        return None
+    if getattr(gen, "degraded", False) or not getattr(gen, "text", None):
+        return None
+    return gen.text
+
+# -------------------------
+# Semantic answer cache (near-duplicate questions, scoped by corpus generation + mode)
+# -------------------------
+semantic_cache = SemanticCache(
+    capacity=int(os.getenv("SEMANTIC_CACHE_SIZE", "2048")),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88")),
+    ttl_s=float(os.getenv("SEMANTIC_CACHE_TTL_S", str(24 * 3600))),
+) if os.getenv("SEMANTIC_CACHE", "on").lower() not in ("off", "0", "false") else None
+semantic_cache_generation = {'value': None}
+
+def answer_cache_scope(simplify_mode: bool, mode: Optional[str], retrieval: Optional[Dict] = None):
+    """(corpus generation, mode, retrieval scope); answers from older generations are dropped once the corpus moves on"""
+    generation = corpus.generation
+    if semantic_cache and semantic_cache_generation['value'] != generation:
+        semantic_cache.retain(lambda scope: scope[0] == generation)
+        semantic_cache_generation['value'] = generation
+    return (generation, "simplified" if simplify_mode else (mode or "normal"),
+            json.dumps(retrieval, sort_keys=True) if retrieval else None)
+
+conversation_memory = ConversationMemory(
+    compress_conversation,
+    keep_turns=int(os.getenv("CHAT_MEMORY_TURNS", "4")),
+    token_budget=int(os.getenv("CHAT_MEMORY_TOKENS", "1200")),
+    summary_tokens=MEMORY_SUMMARY_TOKENS,
+    max_sessions=int(os.getenv("CHAT_MEMORY_SESSIONS", "1000")),
+)
+
 # -------------------------
 # Endpoints
 # -------------------------
@@ -280,7 +466,7 @@ async def root():
             "quiz": True,
             "youtube_agent": YOUTUBE_AVAILABLE
         },
-        "documents_uploaded": len(uploaded_documents),
+        "documents_uploaded": len(corpus),
         "chat_history_entries": len(chat_histories)
     }
 
@@ -289,53 +475,266 @@ async def health():
     return {
         "status": "healthy",
         "model_candidate": MODEL_CANDIDATES[0] if MODEL_CANDIDATES else "unknown",
-        "documents": len(uploaded_documents),
+        "llm_provider": model.name,
+        "model_in_use": model.model_name,
+        "model_routes": model_router.get_stats()['routes'] if model_router else None,
+        "documents": len(corpus),
         "chat_history": len(chat_histories)
     }
 
 @app.post("/api/upload-syllabus")
-async def upload_syllabus(file: UploadFile = File(...)):
+async def upload_syllabus(file: UploadFile = File(...), course: Optional[str] = Form(None), unit: Optional[str] = Form(None)):
     try:
         filename = file.filename
-        content = await file.read()
-        text = ""
-        if filename.lower().endswith(".pdf"):
-            text = extract_pdf(content)
-        elif filename.lower().endswith(".docx"):
-            text = extract_docx(content)
-        elif filename.lower().endswith(".txt"):
-            text = content.decode('utf-8')
-        else:
+        if not is_supported(filename):
             raise HTTPException(400, detail="Unsupported file type. Use PDF, DOCX, or TXT.")
+        content = await file.read()
+        # Extraction and chunking are CPU-bound: run them in the upload worker pool, pages streamed into the chunker
+        result = await asyncio.get_running_loop().run_in_executor(get_extract_pool(), extract_document, filename, content)
+        if 'error' in result:
+            raise HTTPException(400, detail=result['error'])
 
-        if len(text.strip()) < 50:
-            raise HTTPException(400, detail="Uploaded file appears too short or empty.")
-
-        chunks = chunk_text(text)
-        doc_obj = {
-            'filename': filename,
-            'text': text,
-            'chunks': chunks,
-            'uploaded_at': time.time()
-        }
-        uploaded_documents.append(doc_obj)
+        text, chunked = result['text'], result['chunks']
+        doc_obj = await run_in_threadpool(corpus.add_document, filename, text, chunked, course=course, unit=unit)
+        if OUTLINE_ON_UPLOAD:
+            schedule_outline(doc_obj, [c['text'] for c in chunked])
 
         return {
             'status': 'success',
             'filename': filename,
-            'chunks_created': len(chunks)
+            'doc_id': doc_obj['doc_id'],
+            'chunks_created': len(chunked),
+            'outline': 'pending' if OUTLINE_ON_UPLOAD else 'disabled'
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
+# -------------------------
+# Batch upload (many files and/or .zip archives, extracted in a process pool)
+# -------------------------
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+BATCH_MAX_FILE_MB = float(os.getenv("BATCH_MAX_FILE_MB", "50"))
+BATCH_MAX_TOTAL_MB = float(os.getenv("BATCH_MAX_TOTAL_MB", "500"))  # after unzipping
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "0")) or min(8, os.cpu_count() or 1)
+_extract_pool: Optional[ProcessPoolExecutor] = None
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        _extract_pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS)
+    return _extract_pool
+
+def read_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, limit: float) -> Optional[bytes]:
+    """Decompress one member, stopping as soon as more than `limit` bytes came out (headers can lie)"""
+    out = bytearray()
+    with zf.open(info) as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                return bytes(out)
+            out += block
+            if len(out) > limit:
+                return None
+
+def expand_upload(filename: str, content: bytes, report: List[Dict], budget: Dict[str, float]) -> List[tuple]:
+    """
+    Supported (name, bytes) pairs of a plain file or of the members of a zip;
+    skips go to `report`. `budget` ({files, bytes} left for the whole request)
+    is charged as members are decompressed; running out raises 413 right away.
+    """
+    max_bytes = BATCH_MAX_FILE_MB * 1024 * 1024
+    too_big = {'status': 'skipped', 'error': f"Larger than {BATCH_MAX_FILE_MB:g} MB"}
+    files = []
+
+    def take(label: str, data: bytes):
+        budget['files'] -= 1
+        budget['bytes'] -= len(data)
+        files.append((label, data))
+
+    def check_files_left():
+        if budget['files'] < 1:
+            raise HTTPException(413, detail=f"Too many files in one batch (max {BATCH_MAX_FILES})")
+
+    def over_total() -> HTTPException:
+        return HTTPException(413, detail=f"Batch expands to more than {BATCH_MAX_TOTAL_MB:g} MB")
+
+    if not filename.lower().endswith(".zip"):
+        if not is_supported(filename):
+            report.append({'filename': filename, 'status': 'skipped', 'error': "Unsupported file type. Use PDF, DOCX, or TXT."})
+        elif len(content) > max_bytes:
+            report.append({'filename': filename, **too_big})
+        else:
+            check_files_left()
+            if len(content) > budget['bytes']:
+                raise over_total()
+            take(filename, content)
+        return files
+    try:
+        with zipfile.ZipFile(BytesIO(content)) as zf:
+            members = zf.infolist()
+            if len(members) > 10 * BATCH_MAX_FILES:
+                raise HTTPException(413, detail=f"{filename} has {len(members)} entries")
+            for info in members:
+                name = info.filename
+                base = os.path.basename(name)
+                if info.is_dir() or name.startswith("__MACOSX/") or base.startswith("."):
+                    continue
+                label = f"{filename}/{name}"
+                if not is_supported(base):
+                    report.append({'filename': label, 'status': 'skipped', 'error': "Unsupported file type"})
+                    continue
+                check_files_left()
+                if info.file_size > max_bytes:
+                    report.append({'filename': label, **too_big})
+                    continue
+                # The sizes in the zip headers are only claims: stop at what was actually read
+                data = read_member(zf, info, min(max_bytes, budget['bytes']))
+                if data is not None:
+                    take(label, data)
+                elif budget['bytes'] < max_bytes:  # stopped by the request's total, not the file limit
+                    raise over_total()
+                else:
+                    report.append({'filename': label, **too_big})
+    except zipfile.BadZipFile as e:
+        report.append({'filename': filename, 'status': 'failed', 'error': f"Bad zip file: {e}"})
+    return files
+
+@app.post("/api/upload-batch")
+async def upload_batch(files: List[UploadFile] = File(...), course: Optional[str] = Form(None),
+                       unit: Optional[str] = Form(None)):
+    """
+    Upload many PDF/DOCX/TXT files (or .zip archives of them) at once.
+    Files are extracted and chunked in parallel worker processes; a file that
+    fails does not affect the others, and all successful files are published to
+    the corpus together, in one generation (filed under `course`/`unit` if given).
+    """
+    t0 = time.perf_counter()
+    report: List[Dict] = []
+    pending = []
+    budget = {'files': BATCH_MAX_FILES, 'bytes': BATCH_MAX_TOTAL_MB * 1024 * 1024}
+    for f in files:
+        content = await f.read()
+        # Decompressing is CPU work; keep it off the event loop
+        pending += await run_in_threadpool(expand_upload, f.filename, content, report, budget)
+
+    loop = asyncio.get_running_loop()
+    pool = get_extract_pool()
+
+    async def extract(name: str, data: bytes) -> Dict:
+        try:
+            return await loop.run_in_executor(pool, extract_document, name, data)
+        except Exception as e:  # e.g. a worker process died
+            return {'filename': name, 'error': f"{type(e).__name__}: {e}"}
+
+    extracted = await asyncio.gather(*(extract(name, data) for name, data in pending))
+    extract_s = time.perf_counter() - t0
+
+    ok = [r for r in extracted if 'error' not in r]
+    # Publishing takes the corpus file lock and fsyncs; keep it off the event loop
+    entries = iter(await run_in_threadpool(corpus.add_documents, [(r['filename'], r['text'], r['chunks']) for r in ok],
+                                           course=course, unit=unit))
+    for (name, data), r in zip(pending, extracted):
+        if 'error' in r:
+            report.append({'filename': name, 'status': 'failed', 'bytes': len(data), 'error': r['error']})
+            continue
+        entry = next(entries)
+        report.append({'filename': name, 'status': 'indexed', 'bytes': len(data),
+                       'doc_id': entry['doc_id'], 'chunks_created': len(r['chunks'])})
+        if OUTLINE_ON_UPLOAD:
+            schedule_outline(entry, [c['text'] for c in r['chunks']])
+
+    elapsed = time.perf_counter() - t0
+    total_bytes = sum(len(data) for _, data in pending)
+    indexed = sum(1 for r in report if r['status'] == 'indexed')
+    print(f"📦 Batch upload: {indexed}/{len(report)} files indexed, "
+          f"{total_bytes / 1048576:.1f} MB in {elapsed:.2f}s ({UPLOAD_WORKERS} workers)")
+    return {
+        'status': 'success' if indexed else 'failed',
+        'indexed': indexed,
+        'failed': sum(1 for r in report if r['status'] == 'failed'),
+        'skipped': sum(1 for r in report if r['status'] == 'skipped'),
+        'files': report,
+        'total_bytes': total_bytes,
+        'extract_s': round(extract_s, 3),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_mb_s': round(total_bytes / 1048576 / elapsed, 2) if elapsed else 0.0,
+        'files_per_s': round(len(pending) / elapsed, 2) if elapsed else 0.0,
+        'workers': UPLOAD_WORKERS,
+        'outline': 'pending' if OUTLINE_ON_UPLOAD else 'disabled',
+    }
+
+# -------------------------
+# Per-document delete / replace (only the changed document is touched)
+# -------------------------
+@app.delete("/api/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    cancel_outline(doc_id)
+    entry = await run_in_threadpool(corpus.delete_document, doc_id)  # file lock + fsync'd manifest write
+    if entry is None:
+        raise HTTPException(404, detail="Document not found")
+    return {'deleted': doc_id, 'filename': entry['filename'], 'generation': corpus.generation}
+
+@app.put("/api/documents/{doc_id}")
+async def replace_document(doc_id: str, file: UploadFile = File(...)):
+    if not is_supported(file.filename):
+        raise HTTPException(400, detail="Unsupported file type. Use PDF, DOCX, or TXT.")
+    if corpus.document_chunks(doc_id) is None:
+        raise HTTPException(404, detail="Document not found")
+    content = await file.read()
+    result = await asyncio.get_running_loop().run_in_executor(get_extract_pool(), extract_document, file.filename, content)
+    if 'error' in result:
+        raise HTTPException(400, detail=result['error'])
+
+    entry = await run_in_threadpool(corpus.replace_document, doc_id, file.filename, result['text'], result['chunks'])
+    if entry is None:
+        raise HTTPException(404, detail="Document not found")
+    if OUTLINE_ON_UPLOAD:
+        schedule_outline(entry, [c['text'] for c in result['chunks']])
+    return {
+        'status': 'success',
+        'doc_id': doc_id,
+        'filename': entry['filename'],
+        'chunks_created': entry['chunks'],
+        'generation': corpus.generation,
+        'outline': 'pending' if OUTLINE_ON_UPLOAD else 'disabled'
+    }
+
+def scope_dict(scope: Optional[RetrievalScope]) -> Optional[Dict]:
+    """The request's scope as corpus searches take it; None means the whole corpus"""
+    if scope is None:
+        return None
+    return {k: v for k, v in scope.model_dump().items() if v} or None
+
+def check_scope(scope: Optional[RetrievalScope]):
+    """404 for a scope that matches no uploaded document (a typo would otherwise search nothing)"""
+    selected = scope_dict(scope)
+    if selected and not corpus.documents(selected):
+        raise HTTPException(404, detail=f"No documents in scope {selected}")
+
+@app.patch("/api/documents/{doc_id}")
+async def file_document(doc_id: str, update: CollectionUpdate):
+    """Move a document into a course/unit collection (empty values take it out)"""
+    entry = await run_in_threadpool(corpus.set_collection, doc_id, update.course, update.unit)
+    if entry is None:
+        raise HTTPException(404, detail="Document not found")
+    return {'doc_id': doc_id, 'course': entry.get('course'), 'unit': entry.get('unit'), 'generation': corpus.generation}
+
 # New endpoints to fetch stored stuff
 @app.get("/api/documents")
-async def list_documents():
+async def list_documents(course: Optional[str] = None, unit: Optional[str] = None):
+    docs = corpus.documents(scope_dict(RetrievalScope(course=course, unit=unit)))
     return {
-        'count': len(uploaded_documents),
-        'documents': [{'filename': d['filename'], 'uploaded_at': d['uploaded_at'], 'chunks': len(d['chunks'])} for d in uploaded_documents]
+        'count': len(docs),
+        'documents': docs
     }
 
+@app.get("/api/collections")
+async def list_collections():
+    collections = corpus.collections()
+    return {'count': len(collections), 'collections': collections}
+
 @app.get("/api/chat-history")
 async def get_chat_history(limit: int = 100):
     # Return the last `limit` chat entries (most recent first)
@@ -351,18 +750,45 @@ async def clear_history():
 # -------------------------
 # Chat endpoint - major improvements
 # -------------------------
+def cancelled_response(e: Cancelled) -> JSONResponse:
+    """Nobody is reading this when the client left; a superseded chat request does see it"""
+    print(f"🛑 Request cancelled ({e})")
+    return JSONResponse(status_code=499, content={'detail': f"Request cancelled: {e}", 'cancelled': True})
+
+chat_inflight: Dict[str, CancelToken] = {}  # session_id -> token of the question being answered
+
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
+    """Stops working on the answer if the client disconnects or the same session asks again"""
+    check_scope(request.scope)
+    token = CancelToken()
+    if request.session_id:
+        previous = chat_inflight.get(request.session_id)
+        if previous:
+            previous.cancel("superseded by a newer question")
+        chat_inflight[request.session_id] = token
+    try:
+        return await run_cancellable(http_request, answer_chat(request), token)
+    except Cancelled as e:
+        return cancelled_response(e)
+    finally:
+        if request.session_id and chat_inflight.get(request.session_id) is token:
+            del chat_inflight[request.session_id]
+
+async def answer_chat(request: ChatRequest, context_chunks: Optional[List[str]] = None):
     """
     Chat endpoint:
-    - Uses in-memory uploaded_documents as retrieval source.
+    - Uses the shared corpus of uploaded documents as retrieval source
+      (unless context_chunks were already retrieved, e.g. during a voice question).
     - Has 'simplify' triggers and manual simplify_mode flag.
     - If user message is a 'simplify' trigger, it will attempt to simplify the last assistant response
-      (prefers request.chat_history, falls back to server-side chat_histories).
+      (prefers request.chat_history, falls back to the session's conversation memory).
+    - Follow-ups see the session's recent turns and rolling summary (request.session_id).
     - Always instructs the model to *explain* rather than copy text.
     """
     try:
         user_msg = request.message.strip()
+        session_id = request.session_id or conversation_memory.new_session_id()
         print("💬 Chat request:", user_msg[:120])
 
         # 1) Determine simplify mode (auto trigger or manual)
@@ -371,12 +797,12 @@ async def chat(request: ChatRequest):
         simplify_mode = bool(request.simplify_mode) or auto_trigger or (request.mode == "simplified")
 
         # 2) If user is asking to simplify and chat_history was provided, grab last assistant answer to rewrite
-        #    Priority: request.chat_history (if frontend provided), else server-side chat_histories last entry.
-        if auto_trigger and (request.chat_history and len(request.chat_history) > 0):
+        #    Priority: request.chat_history (if frontend provided), else the session's last answer.
+        if auto_trigger:
             # Expect chat_history to be a list of dicts where assistant messages present
             # Try to find last assistant response in provided chat_history
             last_assistant = None
-            for item in reversed(request.chat_history):
+            for item in reversed(request.chat_history or []):
                 # item could be like {"role": "assistant", "text": "..."} or {"assistant": "..."}
                 if isinstance(item, dict):
                     # common shapes:
@@ -390,192 +816,390 @@ async def chat(request: ChatRequest):
                     if 'response' in item:
                         last_assistant = item['response']
                         break
+            last_assistant = last_assistant or conversation_memory.last_answer(session_id)
             if last_assistant:
-                # Build a rewrite prompt that asks the model to simplify that assistant answer
-                rewrite_prompt = f"""
-You are an AI Teaching Assistant for AI & DS students. The student asked the assistant a question earlier,
-and the assistant's previous reply is below. The student asked: "Please simplify that" or similar.
-
-Rewrite the assistant's previous reply so it is:
-- Simple and easy to understand (like explaining to a beginner or a 10-year-old).
-- Use everyday analogies and short sentences.
-- Keep it concise (3-6 short sentences).
-- Add one quick AI-related example (like a chatbot or recommendation system) to make it concrete.
-- Keep a friendly tone and include an emoji or two if helpful.
-
-Previous assistant reply:
-\"\"\"{last_assistant}\"\"\"
-
-Simplified reply:
-"""
-                resp = model.generate_content(rewrite_prompt)
-                simplified_text = resp.text if resp and getattr(resp, "text", None) else "Sorry, I couldn't simplify that."
+                # Served from the simplify cache when a speculative rewrite already ran
+                with span("simplify"):
+                    simplified_text, source = await simplify_cache.get_or_create(
+                        last_assistant, lambda: rewrite_simplified(last_assistant)
+                    )
+                simplified_text = simplified_text or "Sorry, I couldn't simplify that."
                 # Save to history
                 entry = save_chat_entry(user_message=user_msg, assistant_response=simplified_text, mode="simplified", sources_used=[])
+                conversation_memory.add_turn(session_id, user_msg, simplified_text)
                 return {
                     "response": simplified_text,
                     "mode": "Simplify (rewrite)",
-                    "history_entry": entry
+                    "simplify_source": source,
+                    "history_entry": entry,
+                    "session_id": session_id
+                }
+            # If there is no previous assistant answer to rewrite, fallthrough to general behavior.
+
+        # 3) Build context from the uploaded documents (those in request.scope) using simple retrieval
+        retrieval = scope_dict(request.scope)
+        source_files = [d['filename'] for d in corpus.documents(retrieval)]
+
+        # 3a) Same question asked differently, against the same corpus, scope and mode? Reuse the answer.
+        #     Follow-ups ("why is that?") depend on the conversation, so they always go to the model.
+        cache_scope = answer_cache_scope(simplify_mode, request.mode, retrieval)
+        cacheable = bool(semantic_cache) and not (is_follow_up(user_msg) and conversation_memory.last_answer(session_id))
+        if cacheable:
+            with span("semantic_cache"):
+                cached = semantic_cache.lookup(user_msg, cache_scope)
+            if cached:
+                print(f"♻️ Semantic cache hit ({cached['similarity']:.2f}): {cached['question'][:80]}")
+                assistant_text = cached['answer']
+                history_entry = save_chat_entry(user_message=user_msg, assistant_response=assistant_text, mode=("simplified" if simplify_mode else "normal"), sources_used=cached['sources_used'])
+                conversation_memory.add_turn(session_id, user_msg, assistant_text)
+                video_data = await fetch_chat_videos(user_msg)
+                return {
+                    "response": assistant_text,
+                    "mode": ("Simplified" if simplify_mode else "Normal"),
+                    "sources_used_count": cached['sources_used_count'],
+                    "context_sources": cached['context_sources'],
+                    "references": cached['references'],
+                    "history_entry": history_entry,
+                    "session_id": session_id,
+                    "degraded": False,
+                    "semantic_cache": {'hit': True, 'similarity': cached['similarity'], 'matched_question': cached['question']},
+                    "has_videos": bool(video_data),
+                    "video_data": video_data
                 }
-            # If we couldn't find previous assistant text in provided chat_history, fallthrough to general behavior.
-
-        # 3) Build context from uploaded_documents using simple retrieval
-        all_chunks = []
-        source_files = []
-        for d in uploaded_documents:
-            all_chunks.extend(d.get('chunks', []))
-            source_files.append(d.get('filename'))
 
-        context_chunks = []
-        if all_chunks:
-            context_chunks = search_chunks(user_msg, all_chunks, top_k=4)
+        context_sources = None
+        if context_chunks is None:
+            checkpoint("retrieval")
+            with span("retrieval"):
+                context_chunks, context_sources = retrieve_context(user_msg, request.mode, retrieval)
 
         context_text = "\n\n".join(context_chunks)
         files_context = ""
         if source_files:
             files_context = f"(Referring to: {', '.join(source_files)})" if len(source_files) > 1 else f"(Referring to: {source_files[0]})"
 
-        # 4) Teaching-style prompt construction
-        if simplify_mode:
-            teaching_style = """
-You are in SIMPLIFY MODE. Explain as if speaking to a beginner or a 10-year-old.
-- Use short sentences, everyday analogies, and emojis where appropriate.
-- Avoid jargon. If a technical word is necessary, define it simply.
-- Give one concrete AI or Data Science example (like chatbots or recommender systems).
-- Keep it concise (3-6 short sentences)."""
-        else:
-            teaching_style = """
-You are an AI Teaching Assistant specifically for Artificial Intelligence & Data Science (AI & DS) engineering students.
-Your role: TEACH — not just summarize. Use intuition, examples, short code snippets (if relevant), and analogies.
-- Break complex ideas into simple steps.
-- Explain WHY things work and WHEN to use them.
-- NEVER copy text verbatim from provided syllabus materials — use them only as background reference.
-- Mention which uploaded file(s) you referenced if relevant.
-- Keep answers concise unless the user asks for a deep dive.
-"""
-
-        # Add creative example nudge to ensure variety and branch-specific examples
-        creative_example_injection = "\nAlso include one short, branch-specific example (AI/DS) related to the topic."
-
-        # Compose final prompt for Gemini
-        if context_text:
-            final_prompt = f"""
-{teaching_style}
-
-Reference context (use only to inform your answer; do not copy): {files_context}
-{context_text}
-
-Student question:
-\"\"\"{user_msg}\"\"\"
-
-{creative_example_injection}
-
-Write your answer now in a friendly, teaching style. If the question is ambiguous, explain the core idea and show what a clarifying follow-up question the student could ask.
-"""
-        else:
-            final_prompt = f"""
-{teaching_style}
+        with span("memory"):
+            conversation_text = conversation_memory.render(session_id)
 
-Student question:
-\"\"\"{user_msg}\"\"\"
-
-{creative_example_injection}
-
-Write your answer now in a friendly, teaching style. If the question is ambiguous, explain the core idea and show what a clarifying follow-up question the student could ask.
-"""
+        # 4) Per-request payload only: the teaching style, example nudge and output
+        #    cap live in the mode's preset (utils/model_presets.py)
+        chat_model = mode_models['simplified' if simplify_mode else 'normal']
+        sections = []
+        if context_text:
+            sections.append(f"Reference context {files_context}:\n{context_text}")
+        if conversation_text:
+            sections.append(f"Conversation so far:\n{conversation_text}")
+        sections.append(f'Student question:\n"""{user_msg}"""')
+        final_prompt = "\n\n".join(sections)
 
         # 5) Call Gemini to generate answer
-        gen = model.generate_content(final_prompt)
+        with span("llm", prompt_chars=len(final_prompt)):
+            gen = await run_in_threadpool(chat_model.generate_content, final_prompt)
         assistant_text = gen.text if gen and getattr(gen, "text", None) else "Sorry, I couldn't generate a response."
 
         # 6) Save chat history server-side for persistence
         sources_used = [f for f in (source_files or [])] if context_chunks else []
         history_entry = save_chat_entry(user_message=user_msg, assistant_response=assistant_text, mode=("simplified" if simplify_mode else "normal"), sources_used=sources_used)
+        if not getattr(gen, "degraded", False):
+            conversation_memory.add_turn(session_id, user_msg, assistant_text)
+            if cacheable:
+                semantic_cache.insert(user_msg, assistant_text, cache_scope, meta={
+                    'sources_used': sources_used,
+                    'sources_used_count': len(context_chunks),
+                    'context_sources': context_sources,
+                    'references': files_context if context_text else "",
+                })
+
+        # 6b) Optionally pre-compute the simplified version in case the student asks for it next
+        if SPECULATIVE_SIMPLIFY and not simplify_mode and not getattr(gen, "degraded", False):
+            simplify_cache.speculate(assistant_text, lambda: speculative_rewrite(assistant_text))
 
         # 7) If user wanted videos, optionally fetch them
-        wants_video = any(word in user_msg.lower() for word in ['video', 'watch', 'youtube', 'visual', 'see'])
-        video_data = None
-        if wants_video and youtube_agent:
-            try:
-                video_data = youtube_agent.process_doubt(user_msg, max_videos=2)
-            except Exception as e:
-                video_data = {'success': False, 'message': str(e)}
+        video_data = await fetch_chat_videos(user_msg)
 
         return {
             "response": assistant_text,
             "mode": ("Simplified" if simplify_mode else "Normal"),
             "sources_used_count": len(context_chunks),
+            "context_sources": context_sources,
             "references": files_context if context_text else "",
             "history_entry": history_entry,
+            "session_id": session_id,
+            "degraded": bool(getattr(gen, "degraded", False)),
+            "semantic_cache": {'hit': False} if cacheable else None,
             "has_videos": bool(video_data),
             "video_data": video_data
         }
 
+    except Cancelled:
+        raise
     except Exception as e:
         print("❌ Chat error:", type(e).__name__, e)
         raise HTTPException(500, detail=str(e))
 
+async def fetch_chat_videos(user_msg: str) -> Optional[dict]:
+    """YouTube suggestions when the student asked for a video"""
+    wants_video = any(word in user_msg.lower() for word in ['video', 'watch', 'youtube', 'visual', 'see'])
+    if not (wants_video and youtube_agent):
+        return None
+    try:
+        with span("youtube"):
+            return await run_in_threadpool(youtube_agent.process_doubt, user_msg, max_videos=2)
+    except Cancelled:
+        raise
+    except Exception as e:
+        return {'success': False, 'message': str(e)}
+
+# -------------------------
+# Voice questions (streamed audio -> transcript -> chat)
+# -------------------------
+recognizer = get_recognizer()
+voice_stats = {'sessions': 0, 'utterances': 0, 'prefetch_hits': 0}
+
+def voice_retrieve(text: str, scope: Optional[Dict] = None) -> List[str]:
+    return retrieve_context(text, None, scope)[0]
+
+def voice_scope(params) -> Optional[RetrievalScope]:
+    """Scope from {course, unit, doc_ids} (a list, or comma-separated in a query string); None = all documents"""
+    doc_ids = params.get("doc_ids")
+    if isinstance(doc_ids, str):
+        doc_ids = [d for d in doc_ids.split(",") if d]
+    scope = RetrievalScope(course=params.get("course") or None, unit=params.get("unit") or None,
+                           doc_ids=doc_ids or None)
+    return scope if scope_dict(scope) else None
+
+@app.websocket("/api/voice-stream")
+async def voice_stream(websocket: WebSocket):
+    """
+    Client -> server:
+    - binary frames: audio (16 kHz mono 16-bit PCM for whisper; UTF-8 text for the stub recognizer)
+    - {"type": "end", "session_id": "...", "simplify_mode": false, "mode": "normal"}: question finished
+    - {"type": "scope", "course": ..., "unit": ..., "doc_ids": [...]}: retrieve only from these
+      documents, from the next question on (or the current one if no audio was sent yet);
+      the same fields as query parameters (doc_ids comma-separated) set it for the whole socket
+    Server -> client: {"type": "partial"} while speaking, then {"type": "final"} and
+    {"type": "answer", ...same fields as /api/chat}. The socket stays open for the next question.
+    """
+    await websocket.accept()
+    voice_stats['sessions'] += 1
+    scope: Optional[RetrievalScope] = None
+
+    def set_scope(params) -> Optional[str]:
+        """Switch the socket's scope; the reason it was refused, if it was"""
+        nonlocal scope
+        try:
+            requested = voice_scope(params)
+            check_scope(requested)
+        except ValidationError as e:
+            return f"Invalid scope: {e.errors()[0]['msg']}"
+        except HTTPException as e:
+            return e.detail
+        scope = requested
+        return None
+
+    def new_session() -> VoiceSession:
+        return VoiceSession(recognizer, functools.partial(voice_retrieve, scope=scope_dict(scope)))
+
+    refused = set_scope(websocket.query_params)
+    if refused:
+        await websocket.send_json({'type': 'error', 'detail': refused})
+    session = new_session()
+    try:
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            if msg.get("bytes") is not None:
+                event = await session.feed(msg["bytes"])
+                if event:
+                    await websocket.send_json(event)
+                continue
+
+            try:
+                control = json.loads(msg.get("text") or "{}")
+            except ValueError:
+                await websocket.send_json({'type': 'error', 'detail': 'Control messages must be JSON'})
+                continue
+            if control.get("type") == "scope":
+                refused = set_scope(control)
+                if refused:
+                    await websocket.send_json({'type': 'error', 'detail': refused})
+                elif not session.stats['frames']:
+                    session = new_session()
+                continue
+            if control.get("type") != "end":
+                continue
+
+            result = await session.finish()
+            session = new_session()
+            voice_stats['utterances'] += 1
+            voice_stats['prefetch_hits'] += int(result['prefetch_hit'])
+            await websocket.send_json({'type': 'final', **{k: v for k, v in result.items() if k != 'context'}})
+            if not result['text']:
+                await websocket.send_json({'type': 'error', 'detail': 'No speech recognized'})
+                continue
+
+            request = ChatRequest(
+                message=result['text'],
+                chat_history=control.get("chat_history") or [],
+                session_id=control.get("session_id"),
+                simplify_mode=bool(control.get("simplify_mode")),
+                mode=control.get("mode") or "normal",
+                scope=scope,
+            )
+            started = tracer.start("WS /api/voice-stream")
+            try:
+                async with admission.slot("interactive"):
+                    answer = await answer_chat(request, context_chunks=result['context'])
+                trace = tracer.finish(started, status=200)
+                started = None
+                await websocket.send_json({'type': 'answer', **answer, 'server_timing': trace.server_timing()})
+            except AdmissionRejected as e:
+                await websocket.send_json({'type': 'error', 'detail': 'Server busy, please retry', 'retry_after': e.retry_after})
+            except HTTPException as e:
+                await websocket.send_json({'type': 'error', 'detail': e.detail})
+            finally:
+                if started:
+                    tracer.finish(started, status=500)
+    except WebSocketDisconnect:
+        pass
+
+# -------------------------
+# Summaries (map-reduce over chunks, partial summaries cached per chunk hash)
+# -------------------------
+async def summarize_generate(prompt: str) -> Optional[str]:
+    gen = await run_in_threadpool(model.generate_content, prompt)
+    if getattr(gen, "degraded", False) or not getattr(gen, "text", None):
+        return None  # don't cache fallback text as a summary
+    return gen.text
+
+summarizer = Summarizer(
+    summarize_generate,
+    max_concurrency=int(os.getenv("SUMMARIZE_CONCURRENCY", "4")),
+    fan_in=int(os.getenv("SUMMARIZE_FAN_IN", "5")),
+    cache_size=int(os.getenv("SUMMARY_CACHE_SIZE", "4096")),
+)
+
+@app.post("/api/summarize")
+async def summarize(request: SummarizeRequest):
+    if request.summary_type not in SUMMARY_STYLES:
+        raise HTTPException(400, detail=f"summary_type must be one of: {', '.join(SUMMARY_STYLES)}")
+    if request.doc_id:
+        chunks = corpus.document_chunks(request.doc_id)
+        if chunks is None:
+            raise HTTPException(404, detail="Document not found")
+    elif request.text and request.text.strip():
+        chunks = chunk_text(request.text)
+    else:
+        raise HTTPException(400, detail="Provide text or doc_id to summarize")
+
+    t0 = time.perf_counter()
+    try:
+        result = await summarizer.summarize(chunks, request.summary_type)
+    except ValueError as e:
+        raise HTTPException(502, detail=str(e))
+    print(f"🧾 Summarized {result['chunks']} chunks in {result['rounds']} reduce rounds "
+          f"({result['llm_calls']} Gemini calls, {result['cache_hits']} cached)")
+    return dict(result, summary_type=request.summary_type, elapsed_ms=round((time.perf_counter() - t0) * 1000, 1))
+
+# -------------------------
+# Document outlines (built in the background after upload, used to shrink chat prompts)
+# -------------------------
+# Each retrieved chunk is sent to Gemini as its outline entry (section, key terms,
+# 1-2 sentence summary) when that entry covers the question, and as raw text otherwise.
+# CHAT_CONTEXT=raw always sends raw chunks.
+OUTLINE_ON_UPLOAD = os.getenv("OUTLINE_ON_UPLOAD", "1").lower() in ("1", "true", "yes", "on")
+CHAT_CONTEXT = os.getenv("CHAT_CONTEXT", "outline").lower()
+OUTLINE_BATCH = int(os.getenv("OUTLINE_BATCH", "8"))
+OUTLINE_ATTEMPTS = int(os.getenv("OUTLINE_ATTEMPTS", "5"))
+outline_tasks: Dict[str, asyncio.Task] = {}
+outline_failures: Dict[str, str] = {}  # doc_id -> why its outline could not be built
+
+async def outline_document(doc_id: str, segment: str, chunks: List[str]):
+    try:
+        for attempt in range(1, OUTLINE_ATTEMPTS + 1):
+            try:
+                outline = await build_outline(summarizer, chunks, step=lambda: admission.slot("outline"),
+                                              batch=OUTLINE_BATCH)
+                break
+            except AdmissionRejected as e:
+                if attempt == OUTLINE_ATTEMPTS:
+                    raise
+                # Batches that already ran are in the summarizer cache; the retry only pays for the rest
+                print(f"⏳ Outline for {doc_id} deferred ({e.reason}); retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+        corpus.set_outline(segment, outline)
+        print(f"🗂️ Outline ready for {doc_id}: {len(outline['sections'])} sections, "
+              f"{len(chunks) - outline['missing']}/{len(chunks)} chunks in {outline['built_ms']:.0f} ms")
+    except Exception as e:
+        outline_failures[doc_id] = f"{type(e).__name__}: {e}"
+        print(f"⚠️ Outline for {doc_id} failed ({type(e).__name__}: {e}); chat will use raw chunks")
+    finally:
+        if outline_tasks.get(doc_id) is asyncio.current_task():
+            outline_tasks.pop(doc_id, None)
+
+def schedule_outline(entry: Dict[str, Any], chunks: List[str]):
+    """Outline one version of a document (a corpus entry: doc_id + segment) in the background"""
+    cancel_outline(entry['doc_id'])
+    outline_tasks[entry['doc_id']] = asyncio.get_running_loop().create_task(
+        outline_document(entry['doc_id'], entry['segment'], chunks)
+    )
+
+def cancel_outline(doc_id: str):
+    outline_failures.pop(doc_id, None)
+    task = outline_tasks.pop(doc_id, None)
+    if task is not None:
+        task.cancel()
+
+def retrieve_context(question: str, mode: Optional[str] = None, scope: Optional[Dict] = None):
+    """Top chunks for the question (within `scope`) as prompt context, compacted via outlines where possible"""
+    if not len(corpus):
+        return [], {'compact': 0, 'raw': 0}
+    hits = corpus.search_hits(question, top_k=4, scope=scope)
+    force_raw = CHAT_CONTEXT == "raw" or mode == "deepdive" or wants_raw(question)
+    return compact_context(question, hits, corpus.outline_entry, force_raw=force_raw)
+
+@app.get("/api/documents/{doc_id}/outline")
+async def document_outline(doc_id: str):
+    outline = corpus.get_outline(doc_id)
+    if outline is not None:
+        return {'status': 'ready', 'doc_id': doc_id, **outline}
+    if doc_id in outline_tasks:
+        return {'status': 'pending', 'doc_id': doc_id}
+    if corpus.document_chunks(doc_id) is None:
+        raise HTTPException(404, detail="Document not found")
+    if doc_id in outline_failures:
+        return {'status': 'failed', 'doc_id': doc_id, 'error': outline_failures[doc_id]}
+    return {'status': 'unavailable', 'doc_id': doc_id}
+
 # -------------------------
 # Quiz generation endpoint (keeps previous behavior)
 # -------------------------
+def build_quiz_prompt(request: QuizRequest) -> str:
+    """Retrieve from the syllabus text in request.scope; output format and tone come from the 'quiz' preset"""
+    with span("retrieval"):
+        relevant = corpus.search(request.topic, top_k=5, scope=scope_dict(request.scope))
+    prompt = f'Generate {request.num_questions} multiple-choice questions on the topic "{request.topic}" at {request.difficulty} level.'
+    if relevant:
+        prompt += "\n\nUse this context if relevant:\n" + "\n".join(relevant)
+    return prompt
+
 @app.post("/api/generate-quiz")
 async def generate_quiz(request: QuizRequest):
+    check_scope(request.scope)
     try:
         print(f"📝 Generating quiz on: {request.topic} (level: {request.difficulty})")
 
-        # Combine all syllabus text
-        all_chunks = []
-        for doc in uploaded_documents:
-            all_chunks.extend(doc['chunks'])
-        
-        context = ""
-        if all_chunks:
-            relevant = search_chunks(request.topic, all_chunks, top_k=5)
-            context = "\n".join(relevant)
-
-        prompt = f"""
-You are an AI Teaching Assistant for AI & DS students.
-Generate {request.num_questions} multiple-choice questions on the topic "{request.topic}" at {request.difficulty} level.
-
-Use this context if relevant:
-{context}
-
-Format exactly like this:
-Q1: [Question]
-A) [Option]
-B) [Option]
-C) [Option]
-D) [Option]
-Correct Answer: [A/B/C/D]
-Explanation: [Brief explanation]
-
-Make sure each question has 4 options, one correct answer, and a clear explanation.
-"""
-        response = model.generate_content(prompt)
+        prompt = build_quiz_prompt(request)
+        with span("llm", prompt_chars=len(prompt)):
+            response = await run_in_threadpool(mode_models['quiz'].generate_content, prompt,
+                                               quiz_max_tokens(request.num_questions))
 
         text = response.text if response and response.text else ""
-        questions = []
-        current = {}
 
         # Parse text output safely
-        for line in text.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith("Q") and ":" in line:
-                if current:
-                    questions.append(current)
-                current = {"question": line.split(":", 1)[1].strip(), "options": [], "correct_answer": "", "explanation": ""}
-            elif line.startswith(("A)", "B)", "C)", "D)")):
-                current["options"].append(line)
-            elif line.lower().startswith("correct answer"):
-                ans = line.split(":")[-1].strip()
-                current["correct_answer"] = ans[0] if ans else "A"
-            elif line.lower().startswith("explanation"):
-                current["explanation"] = line.split(":", 1)[-1].strip()
-
-        if current:
-            questions.append(current)
+        with span("parse"):
+            questions = parse_quiz(text)
 
         # ✅ Defensive fallback
         if not questions:
@@ -600,26 +1224,129 @@ Make sure each question has 4 options, one correct answer, and a clear explanati
         print(f"❌ Quiz generation error: {e}")
         raise HTTPException(500, f"Quiz generation failed: {str(e)}")
 
+def ndjson(event: Dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+async def quiz_stream_events(request: QuizRequest, t0: float):
+    """NDJSON lines for one streamed quiz; parse errors end the stream with an error event"""
+    counts = {'total': 0, 'skipped': 0}
+    first_ms = None
+
+    def accept(questions: List[Dict]) -> List[str]:
+        nonlocal first_ms
+        lines = []
+        for q in questions:
+            problem = validate_question(q)
+            if not problem and counts['total'] >= request.num_questions:
+                problem = "more questions than requested"
+            if problem:
+                counts['skipped'] += 1
+                lines.append(ndjson({'type': 'skipped', 'reason': problem}))
+                continue
+            if first_ms is None:
+                first_ms = round((time.perf_counter() - t0) * 1000, 1)
+            lines.append(ndjson({'type': 'question', 'index': counts['total'], 'question': q}))
+            counts['total'] += 1
+        return lines
+
+    stream = None
+    try:
+        print(f"📝 Streaming quiz on: {request.topic} (level: {request.difficulty})")
+        prompt = await run_in_threadpool(build_quiz_prompt, request)
+        yield ndjson({'type': 'meta', 'topic': request.topic, 'difficulty': request.difficulty,
+                      'num_questions': request.num_questions})
+
+        parser = QuizStreamParser()
+        stream = mode_models['quiz'].stream_content(prompt, quiz_max_tokens(request.num_questions))
+        async for piece in iterate_in_threadpool(stream):
+            for line in accept(parser.feed(piece)):
+                yield line
+            if counts['total'] >= request.num_questions:
+                break  # everything asked for is out; don't wait for the model to stop
+        else:
+            for line in accept(parser.finish()):
+                yield line
+
+        done = {'type': 'done', **counts, 'first_question_ms': first_ms,
+                'ms': round((time.perf_counter() - t0) * 1000, 1)}
+        if not counts['total']:
+            done['error'] = "Could not generate quiz properly. Try rephrasing the topic."
+        print(f"✅ Quiz streamed: {counts['total']} questions, first after {first_ms} ms")
+        yield ndjson(done)
+    except Exception as e:
+        print(f"❌ Quiz streaming error: {e}")
+        yield ndjson({'type': 'error', 'detail': f"Quiz generation failed: {str(e)}"})
+    finally:
+        if stream is not None:
+            try:
+                stream.close()
+            except ValueError:
+                pass  # still inside next() in a worker thread (client went away); it ends on its own
+
+@app.post("/api/generate-quiz/stream")
+async def generate_quiz_stream(request: QuizRequest):
+    """
+    Same quiz as /api/generate-quiz, streamed as NDJSON while the model writes it:
+    {"type": "meta"}, then {"type": "question", "index", "question"} for each
+    question as soon as it is complete and valid ({"type": "skipped"} for a
+    malformed one), then {"type": "done"} - or {"type": "error"} at any point.
+    """
+    check_scope(request.scope)
+    # Not in ADMISSION_ROUTES: the middleware would give the slot back as soon as the
+    # headers went out. The slot is taken here (429 + Retry-After like the other LLM
+    # routes) and held until the stream ends.
+    t0 = time.perf_counter()
+    try:
+        await admission.acquire('quiz')
+    except AdmissionRejected as e:
+        return busy_response(e)
+    held_from = time.monotonic()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            admission.release('quiz', time.monotonic() - held_from)
+
+    async def events():
+        try:
+            async for line in quiz_stream_events(request, t0):
+                yield line
+        finally:
+            release()
+
+    # The background task covers a client that left before the body started
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={'Cache-Control': 'no-cache'},
+                             background=BackgroundTask(release))
+
 # -------------------------
 # YouTube specific endpoints (if available)
 # -------------------------
+# process_doubt stops between videos / transcript chunks once the client has gone
 @app.post("/api/search-videos")
-async def search_videos(request: VideoSearchRequest):
+async def search_videos(request: VideoSearchRequest, http_request: Request):
     if not youtube_agent:
         raise HTTPException(503, detail="YouTube agent not available. Install required packages.")
     try:
-        result = youtube_agent.process_doubt(request.query, max_videos=request.max_videos)
+        result = await run_cancellable(http_request, run_in_threadpool(
+            youtube_agent.process_doubt, request.query, max_videos=request.max_videos))
         return result
+    except Cancelled as e:
+        return cancelled_response(e)
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
 @app.post("/api/youtube-doubt")
-async def youtube_doubt(request: YouTubeDoubtRequest):
+async def youtube_doubt(request: YouTubeDoubtRequest, http_request: Request):
     if not youtube_agent:
         raise HTTPException(503, detail="YouTube agent not available.")
     try:
-        res = youtube_agent.process_doubt(request.doubt, max_videos=request.max_videos)
+        res = await run_cancellable(http_request, run_in_threadpool(
+            youtube_agent.process_doubt, request.doubt, max_videos=request.max_videos))
         return res
+    except Cancelled as e:
+        return cancelled_response(e)
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
@@ -628,18 +1355,87 @@ async def youtube_doubt(request: YouTubeDoubtRequest):
 # -------------------------
 @app.delete("/api/clear-documents")
 async def clear_documents():
-    count = len(uploaded_documents)
-    uploaded_documents.clear()
+    for doc_id in list(outline_tasks):
+        cancel_outline(doc_id)
+    outline_failures.clear()
+    count = await run_in_threadpool(corpus.clear)
     return {'cleared_documents': count}
 
 @app.get("/api/debug-state")
-async def debug_state():
+async def debug_state(traces: int = 20, trace_min_ms: float = 0.0):
+    """`traces` newest request traces (optionally only those slower than trace_min_ms)"""
     return {
-        'documents': len(uploaded_documents),
+        'documents': len(corpus),
         'chats': len(chat_histories),
         'quizzes': len(quizzes_store),
+        'llm': model.get_stats() if hasattr(model, "get_stats") else None,
+        'admission': admission.get_stats(),
+        'simplify_cache': simplify_cache.get_stats(),
+        'youtube_search_cache': youtube_search_cache.get_stats(),
+        'transcript_index': get_transcript_index().get_stats(),
+        'corpus': corpus.get_stats(),
+        'voice': dict(voice_stats, recognizer=recognizer.name),
+        'summarizer': summarizer.get_stats(),
+        'conversation_memory': conversation_memory.get_stats(),
+        'semantic_cache': semantic_cache.get_stats() if semantic_cache else None,
+        'model_presets': {mode: h.get_stats() for mode, h in mode_models.items()},
+        'model_router': model_router.get_stats() if model_router else None,
+        'cancellation': dict(cancel_metrics.get_stats(), chats_in_flight=len(chat_inflight)),
+        'outlines_building': len(outline_tasks),
+        'outlines_failed': len(outline_failures),
+        'tracing': tracer.get_stats(),
+        'profiler_running': profiler.running,
+        'traces': tracer.recent(limit=max(0, traces), min_ms=trace_min_ms),
     }
 
+@app.get("/api/admission-stats")
+async def admission_stats():
+    return admission.get_stats()
+
+@app.get("/api/model-stats")
+async def model_stats():
+    """Rolling latency / error rate per candidate model and request class, and where each class is routed"""
+    if not model_router:
+        return {'routing': False, 'model_in_use': model.model_name, 'llm_provider': model.name}
+    return {'routing': True, **model_router.get_stats()}
+
+# -------------------------
+# Admin: on-demand sampling profiler (disabled unless ADMIN_TOKEN is set)
+# -------------------------
+profiler = SamplingProfiler()
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+@app.post("/api/admin/profile")
+async def admin_profile(seconds: float = 10.0, interval_ms: float = 5.0, include_idle: bool = False,
+                        format: str = "collapsed", x_admin_token: Optional[str] = Header(None)):
+    """
+    Sample every thread's stack for `seconds` while traffic keeps flowing.
+    format=collapsed returns flamegraph.pl / speedscope input; format=json adds sample counts.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(403, detail="Profiling is disabled. Set ADMIN_TOKEN to enable it.")
+    if x_admin_token != admin_token:
+        raise HTTPException(401, detail="Invalid or missing X-Admin-Token header")
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(400, detail="interval_ms must be between 1 and 1000")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(400, detail="format must be 'collapsed' or 'json'")
+
+    print(f"🔬 Profiling for {seconds:g}s every {interval_ms:g}ms")
+    try:
+        result = await run_in_threadpool(profiler.profile, seconds, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(409, detail=str(e))
+    print(f"✅ Profile done: {result['samples']} samples, {result['stacks']} distinct stacks")
+    if format == "json":
+        return result
+    return PlainTextResponse(result['collapsed'], headers={
+        'Content-Disposition': f"attachment; filename=profile-{int(result['finished_at'])}.collapsed"
+    })
+
 # -------------------------
 # Run app
 # -------------------------
@@ -648,6 +1444,6 @@ if __name__ == "__main__":
     print("=" * 60)
     print("🎓 AI TEACHING ASSISTANT - Full Version (Gemini + Simplify Mode)")
     print("=" * 60)
-    print(f"Documents: {len(uploaded_documents)} | Chat entries: {len(chat_histories)}")
+    print(f"Documents: {len(corpus)} | Chat entries: {len(chat_histories)}")
     print("Run with: uvicorn main:app --reload")
     uvicorn.run(app, host="0.0.0.0", port=8000)
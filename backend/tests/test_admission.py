@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected
+
+
+def controller(capacity=1, **overrides):
+    classes = {
+        'interactive': {'priority': 0, 'max_queue': 10},
+        'quiz': {'priority': 1, 'max_queue': 10},
+        'background': {'priority': 4, 'max_queue': 2, 'max_concurrent': 1, 'max_wait_s': 0.2},
+    }
+    for name, cfg in overrides.items():
+        classes[name].update(cfg)
+    return AdmissionController(capacity, classes)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_freed_slot_goes_to_the_most_important_waiter():
+    async def scenario():
+        ac = controller()
+        order = []
+        await ac.acquire('quiz')
+
+        async def wait(name):
+            await ac.acquire(name)
+            order.append(name)
+            ac.release(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in ('background', 'quiz', 'interactive')]
+        await settle()
+        assert ac.get_stats()['classes']['interactive']['queue_depth'] == 1
+        ac.release('quiz')
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ['interactive', 'quiz', 'background']
+
+
+def test_no_queue_jumping_past_waiting_higher_priority():
+    async def scenario():
+        ac = controller(capacity=2, interactive={'max_concurrent': 1})
+        await ac.acquire('interactive')
+        waiting = asyncio.create_task(ac.acquire('interactive'))  # blocked by its own cap
+        await settle()
+        # A slot is free, and the waiting interactive request can't use it, so quiz may start
+        await asyncio.wait_for(ac.acquire('quiz'), 0.1)
+        ac.release('interactive')
+        await asyncio.wait_for(waiting, 0.1)
+        return ac.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['running'] == 2
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        ac = controller(capacity=1, background={'max_wait_s': 5})
+        await ac.acquire('background')
+        queued = [asyncio.create_task(ac.acquire('background')) for _ in range(2)]
+        await settle()
+        with pytest.raises(AdmissionRejected) as err:
+            await ac.acquire('background')
+        for t in queued:
+            t.cancel()
+        await asyncio.gather(*queued, return_exceptions=True)
+        return err.value, ac.get_stats()['classes']['background']
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.class_name == 'background' and rejected.reason == "queue full"
+    assert rejected.retry_after >= 1
+    assert stats['rejected'] == 1 and stats['queue_depth'] == 0
+
+
+def test_queue_wait_timeout_is_rejected_and_frees_nothing():
+    async def scenario():
+        ac = controller()
+        await ac.acquire('interactive')
+        with pytest.raises(AdmissionRejected, match="timed out"):
+            await ac.acquire('background')
+        stats = ac.get_stats()
+        ac.release('interactive')
+        return stats, ac.get_stats()
+
+    held, after = asyncio.run(scenario())
+    assert held['running'] == 1 and held['classes']['background']['timed_out'] == 1
+    assert after['running'] == 0
+
+
+def test_slot_context_releases_on_error():
+    async def scenario():
+        ac = controller()
+        with pytest.raises(RuntimeError):
+            async with ac.slot('quiz'):
+                raise RuntimeError("boom")
+        return ac.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['running'] == 0 and stats['classes']['quiz']['admitted'] == 1
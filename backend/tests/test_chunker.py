@@ -0,0 +1,55 @@
+from utils.chunker import iter_chunks, iter_sentences
+
+
+def paragraph(seed, sentences=6):
+    return " ".join(f"Sentence {seed}-{i} talks about topic {seed} in some detail." for i in range(sentences))
+
+
+DOC = "\n\n".join(paragraph(p) for p in range(12))
+
+
+def normalized(text):
+    return " ".join(text.split())
+
+
+def test_offsets_point_at_the_chunk_text():
+    chunks = list(iter_chunks(DOC, size=40, overlap=10))
+    assert len(chunks) > 3
+    for c in chunks:
+        assert normalized(DOC[c['start']:c['end']]) == c['text']
+        assert c['words'] == len(c['text'].split())
+
+
+def test_sizes_and_overlap():
+    chunks = list(iter_chunks(DOC, size=40, overlap=10))
+    for c in chunks[:-1]:
+        assert c['words'] <= 48
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur['start'] <= prev['end']  # consecutive chunks share trailing sentences
+        assert cur['start'] > prev['start']
+    assert chunks[0]['start'] == 0 and chunks[-1]['end'] == len(DOC.rstrip())
+
+
+def test_pages_give_the_same_chunks_as_the_joined_text():
+    pages = [DOC[i:i + 97] for i in range(0, len(DOC), 97)]
+    assert list(iter_chunks(pages, size=40, overlap=10)) == list(iter_chunks(DOC, size=40, overlap=10))
+
+
+def test_small_blocks_give_the_same_chunks():
+    assert list(iter_chunks(DOC, size=40, overlap=10, block_chars=13)) == list(iter_chunks(DOC, size=40, overlap=10))
+
+
+def test_unpunctuated_text_is_split_with_offsets():
+    text = " ".join(f"word{i}" for i in range(1000))
+    chunks = list(iter_chunks(text, size=100, overlap=20))
+    assert all(c['words'] <= 120 for c in chunks)
+    for c in chunks:
+        assert text[c['start']:c['end']] == c['text']
+    assert chunks[-1]['text'].endswith("word999")
+
+
+def test_sentences_carry_paragraph_ends():
+    sentences = list(iter_sentences("One. Two.\n\nThree."))
+    assert [s[2] for s in sentences] == ["One.", "Two.", "Three."]
+    assert [s[4] for s in sentences] == [False, True, True]
+    assert [(s[0], s[1]) for s in sentences] == [(0, 4), (5, 9), (11, 17)]
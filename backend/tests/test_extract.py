@@ -0,0 +1,27 @@
+from benchmarks import datagen
+from utils.chunker import iter_chunks
+from utils.extract import extract_document, extract_pdf, extract_text
+
+
+def test_pdf_pages_stream_into_the_same_chunks_as_the_full_text():
+    pdf = datagen.make_pdf(6, words_per_page=300)
+    result = extract_document("notes.pdf", pdf, size=120, overlap=20)
+    assert 'error' not in result
+    assert result['text'] == extract_pdf(pdf)
+    assert result['chunks'] == list(iter_chunks(result['text'], size=120, overlap=20))
+    for c in result['chunks']:
+        assert " ".join(result['text'][c['start']:c['end']].split()) == c['text']
+
+
+def test_docx_and_txt():
+    docx = extract_document("notes.docx", datagen.make_docx(20))
+    assert docx['chunks'] and docx['text'] == extract_text("notes.docx", datagen.make_docx(20))
+    text = datagen.make_text(800)
+    txt = extract_document("notes.txt", text.encode("utf-8"))
+    assert txt['text'] == text and txt['chunks'] == list(iter_chunks(text))
+
+
+def test_errors_are_returned_not_raised():
+    assert extract_document("tiny.txt", b"too short")['error'].startswith("Uploaded file appears too short")
+    assert 'error' in extract_document("broken.pdf", b"%PDF-1.4 not really")
+    assert 'error' in extract_document("slides.pptx", b"whatever")
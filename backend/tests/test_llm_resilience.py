@@ -0,0 +1,83 @@
+import time
+
+from utils.llm_resilience import CircuitBreaker, coalesce_key
+
+
+def tripped(threshold=2, reset_timeout=0.05):
+    breaker = CircuitBreaker(threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_consecutive_failures():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 1
+    assert not breaker.allow()
+
+
+def test_half_open_lets_exactly_one_trial_through():
+    breaker = tripped()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # everything else waits for the trial's verdict
+
+
+def test_half_open_trial_success_closes():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 2
+    assert not breaker.allow()
+
+
+def test_aborted_trial_reopens_without_counting_a_trip():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_abort()
+    assert breaker.state == "open" and breaker.trips == 1
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()  # the next caller gets a fresh trial
+    assert breaker.state == "half_open"
+
+
+def test_abort_while_closed_changes_nothing():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record_abort()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_coalesce_key_is_exact():
+    assert coalesce_key("Explain PCA", {}) == coalesce_key("Explain PCA", {})
+    assert coalesce_key("Explain PCA", {}) != coalesce_key("explain pca", {})
+    assert coalesce_key("Explain PCA", {}) != coalesce_key("Explain  PCA", {})
+    assert coalesce_key("Explain PCA", {}) != coalesce_key("Explain PCA ", {})
+    assert coalesce_key("def f(x):\n    return x", {}) != coalesce_key("def f(x):\n  return x", {})
+
+
+def test_coalesce_key_includes_kwargs():
+    assert coalesce_key("q", {'a': 1, 'b': 2}) == coalesce_key("q", {'b': 2, 'a': 1})
+    assert coalesce_key("q", {'max_tokens': 100}) != coalesce_key("q", {'max_tokens': 200})
+    assert coalesce_key("q", {'max_tokens': 100}) != coalesce_key("q", {})
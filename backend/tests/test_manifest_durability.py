@@ -0,0 +1,30 @@
+import os
+import stat
+
+from utils import shared_corpus
+from utils.shared_corpus import SharedCorpus
+
+
+def test_manifest_and_directory_are_fsynced_around_the_swap(tmp_path, monkeypatch):
+    corpus = SharedCorpus(str(tmp_path), compact_grace_s=3600)
+    events = []
+    real_fsync, real_replace = os.fsync, os.replace
+
+    def fsync(fd):
+        events.append('fsync dir' if stat.S_ISDIR(os.fstat(fd).st_mode) else 'fsync file')
+        real_fsync(fd)
+
+    def replace(src, dst):
+        events.append(f"replace {os.path.basename(dst)}")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(shared_corpus.os, "fsync", fsync)
+    monkeypatch.setattr(shared_corpus.os, "replace", replace)
+    corpus.delete_document("missing")  # nothing to write
+    assert events == []
+
+    corpus.add_document("a.txt", "Some text. More text.", [{'text': "Some text. More text.", 'start': 0, 'end': 21}])
+    swap = events.index("replace manifest.json")
+    assert events[swap - 1] == 'fsync file'  # the new manifest's contents
+    assert events[swap + 1] == 'fsync dir'   # its directory entry (and the new segment's)
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from utils import model_router
+from utils.llm_provider import FakeProvider
+from utils.model_router import ModelRouter, build_router
+
+
+class Named(FakeProvider):
+    def __init__(self, name, fail=None):
+        super().__init__()
+        self.model_name = name
+        self.fail = fail
+
+    def generate_content(self, prompt, **kwargs):
+        if self.fail:
+            raise self.fail
+        return super().generate_content(prompt, **kwargs)
+
+
+def test_transient_error_fails_over_and_routes_are_reported(monkeypatch):
+    monkeypatch.setattr(model_router.random, "random", lambda: 1.0)  # no exploration
+    router = ModelRouter([Named("a", fail=TimeoutError("deadline")), Named("b")], failure_threshold=1)
+    assert router.generate_content("hello", route="quiz").text
+    stats = router.get_stats()
+    assert stats['failovers'] == 1 and stats['routes'] == {'quiz': "a"}
+    assert not stats['models']['a']['healthy']
+    router.generate_content("hello", route="quiz")
+    assert router.get_stats()['routes'] == {'quiz': "b"}
+
+
+def test_stats_can_be_read_while_calls_record_routes():
+    router = ModelRouter([Named("a"), Named("b")])
+    errors = []
+
+    def call(n):
+        try:
+            for i in range(200):
+                router.generate_content(f"q{n}-{i}", route=f"r{n}-{i % 20}")
+        except Exception as e:  # pragma: no cover - the failure being tested for
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        router.get_stats()
+        router.model_name
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(router.get_stats()['routes']) == 80
+
+
+def test_build_router_probes_in_parallel_and_keeps_the_order(monkeypatch):
+    made = []
+
+    class Probed(Named):
+        def __init__(self, candidates, label="Gemini", probe=True):
+            super().__init__(candidates[0])
+            made.append((candidates[0], probe))
+            if probe:
+                time.sleep(0.2)
+
+        def is_ready(self):
+            return self.model_name != "broken"
+
+    monkeypatch.setattr(model_router, "GeminiProvider", Probed)
+    t0 = time.perf_counter()
+    router = build_router(["m1", "broken", "m2", "m3"])
+    assert time.perf_counter() - t0 < 0.6
+    assert router.order == ["m1", "m2", "m3"]
+
+    made.clear()
+    monkeypatch.setenv("MODEL_ROUTER_PROBE", "off")
+    build_router(["m1", "m2"])
+    assert sorted(made) == [("m1", False), ("m2", False)]
@@ -0,0 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from utils.outline import build_outline, compact_context, parse_outline_entry
+from utils.summarizer import Summarizer
+
+
+async def fake_generate(prompt):
+    chunk = prompt.rsplit("TEXT:", 1)[1].strip()
+    return f"SECTION: {chunk.split()[0]}\nKEY TERMS: {', '.join(chunk.split()[:3])}\nSUMMARY: {chunk}"
+
+
+def test_each_batch_holds_its_own_slot():
+    chunks = [f"topic{i} alpha beta gamma" for i in range(7)]
+    held, active = [], {'now': 0}
+
+    @asynccontextmanager
+    async def step():
+        active['now'] += 1
+        assert active['now'] == 1
+        held.append(0)
+        try:
+            yield
+        finally:
+            active['now'] -= 1
+
+    summarizer = Summarizer(fake_generate, max_concurrency=4)
+    outline = asyncio.run(build_outline(summarizer, chunks, step=step, batch=3))
+    assert len(held) == 3  # 3 + 3 + 1 chunks
+    assert [e['section'] for e in outline['chunks']] == [f"topic{i}" for i in range(7)]
+    assert outline['missing'] == 0
+
+
+def test_parse_outline_entry():
+    entry = parse_outline_entry("SECTION: Loss functions\nKEY TERMS: MSE, cross-entropy\nSUMMARY: Losses measure error.\nThey are minimized.")
+    assert entry == {'section': "Loss functions", 'key_terms': ["MSE", "cross-entropy"],
+                     'summary': "Losses measure error. They are minimized."}
+    assert parse_outline_entry("just some free text")['summary'] == "just some free text"
+
+
+def test_compact_context_uses_entries_that_cover_the_question():
+    hits = [{'doc_id': "d", 'chunk': 0, 'filename': "notes.pdf",
+             'text': "Cross-entropy loss compares predicted probabilities with labels in detail."}]
+    entry = {'section': "Losses", 'key_terms': ["cross-entropy"], 'summary': "Cross-entropy loss compares probabilities."}
+    parts, counts = compact_context("what is cross-entropy loss", hits, lambda d, c: entry)
+    assert counts == {'compact': 1, 'raw': 0} and parts[0].startswith("[notes.pdf › Losses]")
+    parts, counts = compact_context("what is cross-entropy loss", hits, lambda d, c: entry, force_raw=True)
+    assert counts == {'compact': 0, 'raw': 1} and parts == [hits[0]['text']]
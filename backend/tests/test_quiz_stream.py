@@ -0,0 +1,66 @@
+from utils.quiz_stream import QuizStreamParser, parse_quiz, validate_question
+
+QUIZ = """Here is your quiz:
+
+Q1: What does a learning rate control?
+A) The number of layers
+B) The step size of each update
+C) The batch size
+D) The activation function
+Correct Answer: B
+Explanation: It scales the gradient step.
+
+Q2: Which technique reduces overfitting?
+A) Dropout
+B) A larger learning rate
+C) Removing validation data
+D) Training longer
+Correct Answer: a) Dropout
+Explanation: Dropout randomly disables units during training.
+"""
+
+
+def stream(text, piece):
+    parser = QuizStreamParser()
+    out = []
+    for i in range(0, len(text), piece):
+        out.extend(parser.feed(text[i:i + piece]))
+    return out + parser.finish()
+
+
+def test_parse_quiz():
+    questions = parse_quiz(QUIZ)
+    assert [q['question'] for q in questions] == [
+        "What does a learning rate control?", "Which technique reduces overfitting?"]
+    assert [q['correct_answer'] for q in questions] == ["B", "A"]
+    assert questions[0]['options'][1] == "B) The step size of each update"
+    assert questions[1]['explanation'] == "Dropout randomly disables units during training."
+
+
+def test_streamed_pieces_match_parse_quiz():
+    expected = parse_quiz(QUIZ)
+    for piece in (1, 3, 17, 64, len(QUIZ)):
+        assert stream(QUIZ, piece) == expected
+
+
+def test_question_is_emitted_when_its_explanation_ends():
+    parser = QuizStreamParser()
+    first, _ = QUIZ.split("Q2:")
+    assert parser.feed(first[:-5]) == []
+    done = parser.feed(first[-5:])
+    assert [q['question'] for q in done] == ["What does a learning rate control?"]
+
+
+def test_unterminated_question_is_flushed_at_finish():
+    text = "Q1: Partial?\nA) one\nB) two"
+    assert stream(text, 4) == parse_quiz(text) == [
+        {'question': "Partial?", 'options': ["A) one", "B) two"], 'correct_answer': "", 'explanation': ""}]
+
+
+def test_validate_question():
+    good, _ = parse_quiz(QUIZ)
+    assert validate_question(good) is None
+    assert "options" in validate_question(dict(good, options=good['options'][:3]))
+    assert "correct answer" in validate_question(dict(good, correct_answer=""))
+    assert "explanation" in validate_question(dict(good, explanation=""))
+    assert "question" in validate_question(dict(good, question=""))
@@ -0,0 +1,57 @@
+import pytest
+
+from utils.semantic_cache import SemanticCache, embed, intent
+
+SCOPE = (1, "normal")
+
+DIFFERENT_QUESTIONS = [
+    ("What is overfitting?", "Give an example of overfitting"),
+    ("Define gradient descent", "Explain gradient descent with an example"),
+    ("difference between bagging and boosting", "What is bagging and boosting?"),
+    ("Is ReLU better than sigmoid?", "Is sigmoid better than ReLU?"),
+    ("Why is dropout used?", "How is dropout used?"),
+    ("Why does regularization reduce overfitting?", "Why doesn't regularization reduce overfitting?"),
+]
+
+SAME_QUESTIONS = [
+    ("What's backprop?", "Explain backpropagation"),
+    ("What is a convolutional neural network?", "Define CNNs"),
+    ("How does gradient descent work?", "how does gradient descent work"),
+    ("Explain gradient descent in neural networks", "What is gradient descent for neural nets?"),
+]
+
+
+def cache_with(question, answer="cached answer"):
+    cache = SemanticCache(capacity=8, threshold=0.88, dim=1024)
+    cache.insert(question, answer, SCOPE)
+    return cache
+
+
+@pytest.mark.parametrize("cached, asked", DIFFERENT_QUESTIONS + [(b, a) for a, b in DIFFERENT_QUESTIONS])
+def test_different_questions_do_not_share_an_answer(cached, asked):
+    assert cache_with(cached).lookup(asked, SCOPE) is None
+
+
+@pytest.mark.parametrize("cached, asked", SAME_QUESTIONS)
+def test_paraphrases_share_an_answer(cached, asked):
+    hit = cache_with(cached).lookup(asked, SCOPE)
+    assert hit is not None and hit['answer'] == "cached answer" and hit['question'] == cached
+
+
+def test_word_order_changes_the_embedding():
+    a, b = embed("Is ReLU better than sigmoid?"), embed("Is sigmoid better than ReLU?")
+    assert float(a @ b) < 0.88
+
+
+def test_intent():
+    assert intent("What is overfitting?") == intent("Explain overfitting") != intent("overfitting example")
+    assert intent("overfitting") == 0
+    assert intent("Why isn't ReLU saturating?") != intent("Why is ReLU saturating?")
+
+
+def test_scopes_are_separate():
+    cache = cache_with("What is overfitting?")
+    assert cache.lookup("What is overfitting?", (2, "normal")) is None
+    assert cache.lookup("What is overfitting?", SCOPE) is not None
+    assert cache.retain(lambda scope: scope[0] == 2) == 1
+    assert cache.lookup("What is overfitting?", SCOPE) is None
@@ -0,0 +1,114 @@
+import os
+import struct
+
+import pytest
+
+from utils.chunker import iter_chunks
+from utils.shared_corpus import SEGMENT_VERSION, Segment, SharedCorpus, write_segment
+
+TEXT = (
+    "Gradient descent updates the weights against the gradient. "
+    "The learning rate controls the step size.\n\n"
+    "Overfitting happens when a model memorizes the training set. "
+    "Regularization and early stopping reduce it."
+)
+
+
+def chunks_of(text, size=12):
+    return list(iter_chunks(text, size=size, overlap=0))
+
+
+def make_corpus(root, **kwargs):
+    kwargs.setdefault('compact_grace_s', 3600)
+    return SharedCorpus(str(root), **kwargs)
+
+
+def test_segment_round_trip(tmp_path):
+    chunks = chunks_of(TEXT)
+    path = str(tmp_path / "doc.seg")
+    write_segment(path, TEXT, chunks)
+
+    seg = Segment(path)
+    assert seg.text() == TEXT
+    assert seg.chunks() == [c['text'] for c in chunks]
+    assert [seg.chunk_offsets(i) for i in range(seg.n_chunks)] == [(c['start'], c['end']) for c in chunks]
+    hits = seg.postings("overfitting")
+    assert hits and all("overfitting" in seg.chunk(i).lower() for i in hits)
+    assert seg.postings("nonexistent") == ()
+
+
+def test_segment_rejects_other_format_versions(tmp_path):
+    path = str(tmp_path / "doc.seg")
+    write_segment(path, TEXT, chunks_of(TEXT))
+    with open(path, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<I", SEGMENT_VERSION + 1))
+    with pytest.raises(ValueError, match="format"):
+        Segment(path)
+
+
+def test_segment_rejects_foreign_files(tmp_path):
+    path = tmp_path / "junk.seg"
+    path.write_bytes(b"not a segment at all, just some bytes")
+    with pytest.raises(ValueError):
+        Segment(str(path))
+
+
+def test_delete_replace_and_compaction_advance_the_generation(tmp_path):
+    corpus = make_corpus(tmp_path)
+    assert corpus.generation == 0
+
+    a = corpus.add_document("a.txt", TEXT, chunks_of(TEXT))
+    b = corpus.add_document("b.txt", "Bagging averages many models. Boosting fits them in sequence.",
+                            chunks_of("Bagging averages many models. Boosting fits them in sequence."))
+    assert corpus.generation == 2
+    assert [d['doc_id'] for d in corpus.documents()] == [a['doc_id'], b['doc_id']]
+
+    new_text = "Backpropagation applies the chain rule layer by layer."
+    replaced = corpus.replace_document(a['doc_id'], "a2.txt", new_text, chunks_of(new_text))
+    assert replaced['doc_id'] == a['doc_id'] and replaced['segment'] != a['segment']
+    assert corpus.generation == 3
+    # Same position in the corpus, new content
+    assert [d['filename'] for d in corpus.documents()] == ["a2.txt", "b.txt"]
+    assert corpus.search("backpropagation") and not corpus.search("overfitting")
+
+    assert corpus.delete_document(b['doc_id'])['doc_id'] == b['doc_id']
+    assert corpus.generation == 4
+    assert corpus.delete_document(b['doc_id']) is None
+    assert corpus.generation == 4
+    assert [d['doc_id'] for d in corpus.documents()] == [a['doc_id']]
+
+    # The replaced and the deleted segment stay on disk until their grace period is over
+    assert os.path.exists(tmp_path / a['segment']) and os.path.exists(tmp_path / b['segment'])
+    assert corpus.compact()['pending'] == 2
+    result = corpus.compact(grace_s=0)
+    assert result['pending'] == 0 and result['removed'] >= 2
+    assert not os.path.exists(tmp_path / a['segment']) and not os.path.exists(tmp_path / b['segment'])
+    assert os.path.exists(tmp_path / replaced['segment'])
+    # Compaction only drops files: the published generation is unchanged
+    assert corpus.generation == 4
+    assert corpus.search("backpropagation")
+
+
+def test_refresh_picks_up_another_writers_manifest(tmp_path):
+    reader = make_corpus(tmp_path)
+    writer = make_corpus(tmp_path)
+    assert len(reader) == 0
+
+    entry = writer.add_document("notes.txt", TEXT, chunks_of(TEXT))
+    assert reader.generation == 0  # nothing is read until the next access
+    assert [d['doc_id'] for d in reader.documents()] == [entry['doc_id']]
+    assert reader.generation == writer.generation == 1
+    assert reader.search("regularization")
+
+    writer.delete_document(entry['doc_id'])
+    assert len(reader) == 0 and reader.generation == 2
+
+
+def test_unchanged_manifest_is_not_reloaded(tmp_path):
+    corpus = make_corpus(tmp_path)
+    corpus.add_document("notes.txt", TEXT, chunks_of(TEXT))
+    reloads = corpus.stats['reloads']
+    for _ in range(5):
+        corpus.search("gradient")
+    assert corpus.stats['reloads'] == reloads
@@ -0,0 +1,58 @@
+import json
+import multiprocessing
+import os
+
+from utils.transcript_index import TranscriptIndex, build_segments
+
+
+def transcript(topic, minutes=3):
+    return [{'start': s, 'duration': 5, 'text': f"{topic} lecture part {s}"} for s in range(0, minutes * 60, 5)]
+
+
+def test_build_segments_windows():
+    segments = build_segments(transcript("pca"), segment_seconds=60)
+    assert len(segments) == 3
+    assert [s['start'] for s in segments] == [0, 60, 120]
+    assert segments[0]['text'].startswith("pca lecture part 0")
+
+
+def test_save_merges_videos_saved_by_another_worker(tmp_path):
+    path = str(tmp_path / "index.json")
+    a, b = TranscriptIndex(path), TranscriptIndex(path)
+    a.add_video("vidA", transcript("backpropagation"), meta={'title': "Backprop"})
+    b.add_video("vidB", transcript("convolution"), meta={'title': "CNNs"})
+    a.save()
+    b.save()  # must not drop vidA
+
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert set(saved['videos']) == {"vidA", "vidB"}
+    assert b.search("backpropagation")[0]['video_id'] == "vidA"
+    assert b.video_meta("vidA")['title'] == "Backprop"
+    assert b.stats['videos_merged'] == 1
+
+    reloaded = TranscriptIndex(path)
+    assert reloaded.search("convolution")[0]['video_id'] == "vidB"
+    assert reloaded.search("backpropagation")[0]['video_id'] == "vidA"
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def _worker(path, n):
+    index = TranscriptIndex(path)
+    for i in range(3):
+        index.add_video(f"w{n}-{i}", transcript(f"topic{n}x{i}", minutes=1))
+        index.save()
+
+
+def test_concurrent_workers_keep_every_video(tmp_path):
+    path = str(tmp_path / "index.json")
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_worker, args=(path, n)) for n in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+    index = TranscriptIndex(path)
+    assert set(index.videos) == {f"w{n}-{i}" for n in range(4) for i in range(3)}
+    assert index.search("topic2x1")[0]['video_id'] == "w2-1"
@@ -0,0 +1,168 @@
+# backend/utils/admission.py
+"""
+Admission Control - bounded, priority-ordered access to LLM-bound endpoints
+
+A fixed number of requests (capacity) may run at once. Each endpoint belongs
+to a priority class with its own bounded queue and an optional concurrency
+cap, so a burst of expensive YouTube doubts can never take every slot from
+interactive chat. When a slot frees up, the waiting request from the most
+important class goes first. Requests that find their queue full (or wait too
+long) are rejected with AdmissionRejected, which carries a Retry-After hint.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, class_name: str, reason: str, retry_after: int):
+        super().__init__(f"{class_name}: {reason}")
+        self.class_name = class_name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PriorityClass:
+    def __init__(self, name: str, priority: int, max_queue: int,
+                 max_concurrent: Optional[int] = None, max_wait_s: float = 30.0):
+        self.name = name
+        self.priority = priority  # lower = served first
+        self.max_queue = max_queue
+        self.max_concurrent = max_concurrent
+        self.max_wait_s = max_wait_s
+
+        self.running = 0
+        self.waiters = deque()  # asyncio futures, FIFO within the class
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_ms = deque(maxlen=500)
+        self.service_s = 1.0  # EWMA of time spent holding a slot
+
+    def has_room(self) -> bool:
+        return self.max_concurrent is None or self.running < self.max_concurrent
+
+
+def _pct(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, classes: Dict[str, dict]):
+        self.capacity = capacity
+        self.running = 0
+        self.classes: Dict[str, PriorityClass] = {
+            name: PriorityClass(name, **cfg) for name, cfg in classes.items()
+        }
+        self._by_priority = sorted(self.classes.values(), key=lambda c: c.priority)
+
+    def _retry_after(self, pc: PriorityClass) -> int:
+        """Rough time until this class's queue drains, in whole seconds"""
+        lanes = max(1, min(self.capacity, pc.max_concurrent or self.capacity))
+        return max(1, min(120, math.ceil(pc.service_s * (self._queued(pc) + 1) / lanes)))
+
+    def _can_start(self, pc: PriorityClass) -> bool:
+        if self.running >= self.capacity or not pc.has_room():
+            return False
+        # Don't jump ahead of more important requests that are already waiting
+        return not any(
+            self._queued(c) and c.has_room() for c in self._by_priority if c.priority < pc.priority
+        )
+
+    @staticmethod
+    def _queued(pc: PriorityClass) -> int:
+        return sum(1 for f in pc.waiters if not f.done())
+
+    def _dispatch(self):
+        """Hand freed slots to waiters, most important class first"""
+        for pc in self._by_priority:
+            while pc.waiters and self.running < self.capacity and pc.has_room():
+                fut = pc.waiters.popleft()
+                if fut.done():  # cancelled / timed out while queued
+                    continue
+                self.running += 1
+                pc.running += 1
+                fut.set_result(True)
+
+    async def acquire(self, class_name: str) -> float:
+        """Wait for a slot; returns seconds spent queued"""
+        pc = self.classes[class_name]
+        t0 = time.monotonic()
+        if not self._queued(pc) and self._can_start(pc):
+            self.running += 1
+            pc.running += 1
+        else:
+            if self._queued(pc) >= pc.max_queue:
+                pc.rejected += 1
+                raise AdmissionRejected(class_name, "queue full", self._retry_after(pc))
+            fut = asyncio.get_running_loop().create_future()
+            pc.waiters.append(fut)
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), timeout=pc.max_wait_s)
+            except asyncio.TimeoutError:
+                if fut.done():  # slot granted just as we timed out; give it back
+                    self._release(pc)
+                else:
+                    fut.cancel()
+                pc.timed_out += 1
+                raise AdmissionRejected(class_name, "queue wait timed out", self._retry_after(pc))
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release(pc)
+                else:
+                    fut.cancel()
+                raise
+        waited = time.monotonic() - t0
+        pc.admitted += 1
+        pc.wait_ms.append(waited * 1000.0)
+        return waited
+
+    def _release(self, pc: PriorityClass):
+        self.running -= 1
+        pc.running -= 1
+        self._dispatch()
+
+    def release(self, class_name: str, held_s: float = None):
+        pc = self.classes[class_name]
+        if held_s is not None:
+            pc.service_s = 0.8 * pc.service_s + 0.2 * held_s
+        self._release(pc)
+
+    @asynccontextmanager
+    async def slot(self, class_name: str):
+        await self.acquire(class_name)
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(class_name, time.monotonic() - t0)
+
+    def get_stats(self) -> Dict:
+        return {
+            'capacity': self.capacity,
+            'running': self.running,
+            'classes': {
+                pc.name: {
+                    'priority': pc.priority,
+                    'running': pc.running,
+                    'max_concurrent': pc.max_concurrent,
+                    'queue_depth': self._queued(pc),
+                    'max_queue': pc.max_queue,
+                    'admitted': pc.admitted,
+                    'rejected': pc.rejected,
+                    'timed_out': pc.timed_out,
+                    'wait_ms_p50': _pct(pc.wait_ms, 50),
+                    'wait_ms_p95': _pct(pc.wait_ms, 95),
+                    'wait_ms_max': round(max(pc.wait_ms), 2) if pc.wait_ms else 0.0,
+                    'avg_service_s': round(pc.service_s, 3),
+                }
+                for pc in self._by_priority
+            },
+        }
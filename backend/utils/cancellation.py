@@ -0,0 +1,138 @@
+# backend/utils/cancellation.py
+"""
+Request Cancellation - stop work nobody is waiting for anymore
+
+A CancelToken belongs to one request and is found through a ContextVar, like
+the tracing spans, so it reaches the agents running in the threadpool without
+being passed around. run_cancellable() runs an endpoint's work and listens for
+the client's http.disconnect; when the client goes away (or the token is cancelled
+because the same chat session asked again), the token is cancelled and the
+awaiting task is cancelled at once. Worker threads stop at their next
+checkpoint(): before each LLM call or retry, each video, each transcript
+chunk. A Gemini call already on the wire can't be interrupted, but nothing
+after it runs. Checkpoints outside a cancellable request are a no-op.
+"""
+
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class Cancelled(Exception):
+    """Raised at a checkpoint once the request's token is cancelled"""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds; True if cancelled meanwhile"""
+        return self._event.wait(timeout)
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+class CancelMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}  # reason -> cancelled requests
+        self.skipped: Dict[str, int] = {}   # stage -> units of work not done
+
+    def cancelled(self, reason: str):
+        with self._lock:
+            self.requests[reason] = self.requests.get(reason, 0) + 1
+
+    def skip(self, stage: str, n: int = 1):
+        with self._lock:
+            self.skipped[stage] = self.skipped.get(stage, 0) + n
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'cancelled_requests': sum(self.requests.values()), 'by_reason': dict(self.requests),
+                    'skipped_work': dict(self.skipped)}
+
+
+metrics = CancelMetrics()
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def checkpoint(stage: str = "work", skipped: int = 1):
+    """Raise Cancelled if this request was cancelled, counting `skipped` units of `stage` as saved"""
+    token = _current.get()
+    if token is not None and token.cancelled:
+        metrics.skip(stage, max(1, skipped))
+        raise Cancelled(token.reason)
+
+
+def sleep(seconds: float, stage: str = "retry"):
+    """time.sleep that wakes up (and raises Cancelled) as soon as the request is cancelled"""
+    token = _current.get()
+    if token is None:
+        time.sleep(seconds)
+        return
+    if token.wait(seconds):
+        checkpoint(stage)
+
+
+async def run_cancellable(request, coro, token: Optional[CancelToken] = None, poll_s: float = 0.25):
+    """
+    Await `coro` with a CancelToken installed; raises Cancelled if the client
+    disconnects (or `token` is cancelled elsewhere) before it finishes.
+    """
+    token = token or CancelToken()
+    reset = _current.set(token)
+    try:
+        task = asyncio.ensure_future(coro)  # the task copies the context, token included
+    finally:
+        _current.reset(reset)
+
+    async def watch():
+        # The body was already read, so the next ASGI message is the disconnect. (Not
+        # request.is_disconnected(): it never sees one through BaseHTTPMiddleware.)
+        message = asyncio.ensure_future(request.receive())
+        try:
+            while not token.cancelled:
+                done, _ = await asyncio.wait({message}, timeout=poll_s)
+                if not done:
+                    continue  # also wake up now and then to notice token.cancel() from elsewhere
+                if message.exception() is not None:
+                    return  # can't tell; let the work finish
+                if message.result().get("type") == "http.disconnect":
+                    token.cancel("client disconnected")
+                    break
+                message = asyncio.ensure_future(request.receive())
+        finally:
+            message.cancel()
+        task.cancel()
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if not token.cancelled:
+            task.cancel()  # we were cancelled ourselves (server shutdown)
+            raise
+        metrics.cancelled(token.reason)
+        raise Cancelled(token.reason)
+    except Cancelled:
+        metrics.cancelled(token.reason)
+        raise
+    finally:
+        watcher.cancel()
@@ -0,0 +1,147 @@
+# backend/utils/chunker.py
+"""
+Streaming, sentence-aware chunker
+
+Reads its input incrementally (a string is walked in fixed-size blocks, an
+iterable is consumed piece by piece, e.g. one PDF page at a time) and yields
+chunks of about `size` words that end on sentence - preferably paragraph -
+boundaries, within +/- `tolerance`. Consecutive chunks share up to `overlap`
+words of whole trailing sentences. Each chunk carries the character offsets
+of its span in the (concatenated) input, so only the current chunk and one
+partial sentence are ever held in memory.
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+# Sentence end (. ! ? plus closing quotes/brackets) or a blank line, with the whitespace after it
+_BOUNDARY = re.compile(r"""[.!?]["')\]]*\s+|\n[ \t\r\f\v]*\n\s*""")
+_WORD = re.compile(r"\S+")
+
+Sentence = Tuple[int, int, str, int, bool]  # start, end, normalized text, words, ends paragraph
+
+
+def _iter_blocks(source: Union[str, Iterable[str]], block_chars: int) -> Iterator[str]:
+    if isinstance(source, str):
+        for i in range(0, len(source), block_chars):
+            yield source[i:i + block_chars]
+    else:
+        for piece in source:
+            if piece:
+                yield piece
+
+
+def _make_sentence(raw: str, start: int, para_end: bool):
+    words = raw.split()
+    if not words:
+        return None
+    lead = len(raw) - len(raw.lstrip())
+    body = raw.rstrip()
+    return (start + lead, start + len(body), " ".join(words), len(words), para_end)
+
+
+def _split_long(raw: str, start: int, max_words: int) -> Iterator[Sentence]:
+    """Hard-split a run of text with more than max_words words at word boundaries"""
+    matches = list(_WORD.finditer(raw))
+    for i in range(0, len(matches), max_words):
+        group = matches[i:i + max_words]
+        yield (start + group[0].start(), start + group[-1].end(),
+               " ".join(m.group() for m in group), len(group), False)
+
+
+def iter_sentences(source: Union[str, Iterable[str]], max_words: int = 600,
+                   block_chars: int = 1 << 16, split_words: int = None) -> Iterator[Sentence]:
+    """
+    Yield sentences with their offsets. Runs longer than max_words words
+    (e.g. PDF text without punctuation) are cut into split_words-word pieces.
+    """
+    split_words = split_words or max_words
+    soft_limit = max(block_chars, max_words * 16)
+    buf = ""
+    buf_start = 0  # offset of buf[0] in the whole input
+
+    def emit(raw: str, start: int, para_end: bool):
+        sent = _make_sentence(raw, start, para_end)
+        if sent is None:
+            return
+        if sent[3] > max_words:
+            yield from _split_long(raw, start, split_words)
+        else:
+            yield sent
+
+    for block in _iter_blocks(source, block_chars):
+        buf += block
+        pos = 0
+        for m in _BOUNDARY.finditer(buf):
+            if m.end() >= len(buf):
+                break  # the boundary may continue in the next block
+            yield from emit(buf[pos:m.end()], buf_start + pos, m.group().count("\n") >= 2)
+            pos = m.end()
+        # No boundary for a long stretch (e.g. PDF text without punctuation): cut at whitespace
+        while len(buf) - pos > soft_limit:
+            cut = buf.rfind(" ", pos, pos + soft_limit)
+            cut = cut + 1 if cut > pos else pos + soft_limit
+            yield from emit(buf[pos:cut], buf_start + pos, False)
+            pos = cut
+        buf = buf[pos:]
+        buf_start += pos
+
+    if buf:
+        yield from emit(buf, buf_start, True)
+
+
+def iter_chunks(source: Union[str, Iterable[str]], size: int = 500, overlap: int = 50,
+                tolerance: float = 0.2, block_chars: int = 1 << 16) -> Iterator[Dict]:
+    """
+    Yield {'text', 'start', 'end', 'words'} chunks of ~size words.
+    A chunk is closed at a paragraph end once it has size*(1-tolerance) words,
+    at any sentence end once it has `size` words, and never grows past
+    size*(1+tolerance) words.
+    """
+    max_words = max(1, int(size * (1 + tolerance)))
+    min_words = max(1, int(size * (1 - tolerance)))
+    overlap = max(0, min(overlap, size - 1))
+
+    current: List[Sentence] = []
+    current_words = 0
+    fresh = 0  # words in `current` not already emitted as overlap
+
+    def flush():
+        return {
+            'text': " ".join(s[2] for s in current),
+            'start': current[0][0],
+            'end': current[-1][1],
+            'words': current_words,
+        }
+
+    def tail():
+        """Trailing whole sentences that fit in `overlap` words"""
+        kept, n = [], 0
+        for s in reversed(current):
+            if n + s[3] > overlap:
+                break
+            kept.append(s)
+            n += s[3]
+        kept.reverse()
+        return kept, n
+
+    # Unpunctuated runs are cut into overlap-sized pieces so neighbours can still share words
+    pieces = overlap or size
+    for sent in iter_sentences(source, max_words=max_words, block_chars=block_chars, split_words=pieces):
+        if current and current_words + sent[3] > max_words:
+            if fresh:
+                yield flush()
+                current, current_words = tail()
+            if current_words + sent[3] > max_words:
+                current, current_words = [], 0
+            fresh = 0
+        current.append(sent)
+        current_words += sent[3]
+        fresh += sent[3]
+        if current_words >= size or (sent[4] and current_words >= min_words):
+            yield flush()
+            current, current_words = tail()
+            fresh = 0
+
+    if current and fresh:
+        yield flush()
@@ -0,0 +1,156 @@
+# backend/utils/conversation.py
+"""
+Conversation Memory - bounded per-session context for follow-up questions
+
+Each session keeps its last `keep_turns` exchanges verbatim. Older turns are
+folded into a rolling summary in the background, one small Gemini call per
+batch of evicted turns (the previous summary plus the new turns in, the
+updated summary out), so the cost of a long conversation never grows.
+render() packs the summary and the most recent turns into a fixed token
+budget for the prompt, which means clients only need to send a session_id.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token, close enough for budgeting English prompts"""
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars - 1)
+    return text[:cut if cut > max_chars // 2 else max_chars - 1].rstrip() + "…"
+
+
+def format_turn(turn: Dict, max_tokens: int) -> str:
+    return (f"Student: {truncate_tokens(turn['user'], max_tokens // 3)}\n"
+            f"Tutor: {truncate_tokens(turn['assistant'], max_tokens - max_tokens // 3)}")
+
+
+def compress_prompt(summary: str, turns: List[Dict], max_words: int) -> str:
+    joined = "\n\n".join(format_turn(t, 400) for t in turns)
+    return f"""You keep a running summary of a tutoring conversation between an AI & DS student and a tutor.
+
+CURRENT SUMMARY:
+{summary or "(none yet)"}
+
+NEW TURNS:
+{joined}
+
+Rewrite the summary so it also covers the new turns, in at most {max_words} words.
+Keep: topics covered, definitions or examples the tutor gave, what the student found hard, open questions.
+Reply with the summary only."""
+
+
+class ConversationMemory:
+    def __init__(self, compress: Callable[[str, List[Dict]], Awaitable[Optional[str]]], keep_turns: int = 4,
+                 token_budget: int = 1200, summary_tokens: int = 300, max_sessions: int = 1000,
+                 idle_ttl_s: float = 6 * 3600):
+        """`compress(summary, turns)` returns the updated summary, or None if it failed"""
+        self.compress = compress
+        self.keep_turns = max(1, keep_turns)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self.idle_ttl_s = idle_ttl_s
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = {'turns': 0, 'compressions': 0, 'compress_failures': 0, 'dropped_turns': 0, 'evicted_sessions': 0}
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def _session(self, session_id: str, create: bool = False) -> Optional[Dict]:
+        now = time.time()
+        while self._sessions:  # oldest first: drop sessions idle past the TTL
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest['updated_at'] < self.idle_ttl_s:
+                break
+            self._sessions.popitem(last=False)
+            self.stats['evicted_sessions'] += 1
+        session = self._sessions.get(session_id)
+        if session is None and create:
+            session = {'turns': [], 'pending': [], 'summary': "", 'task': None, 'turn_count': 0, 'updated_at': now}
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats['evicted_sessions'] += 1
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def add_turn(self, session_id: str, user: str, assistant: str):
+        session = self._session(session_id, create=True)
+        session['turns'].append({'user': user, 'assistant': assistant, 'at': time.time()})
+        session['turn_count'] += 1
+        session['updated_at'] = time.time()
+        self.stats['turns'] += 1
+        while len(session['turns']) > self.keep_turns:
+            session['pending'].append(session['turns'].pop(0))
+        # If summarizing keeps failing, don't let unsummarized turns pile up
+        overflow = len(session['pending']) - 4 * self.keep_turns
+        if overflow > 0:
+            del session['pending'][:overflow]
+            self.stats['dropped_turns'] += overflow
+        if session['pending'] and (session['task'] is None or session['task'].done()):
+            session['task'] = asyncio.get_running_loop().create_task(self._fold(session))
+
+    async def _fold(self, session: Dict):
+        """Fold pending turns into the rolling summary, a batch at a time"""
+        while session['pending']:
+            batch = list(session['pending'])
+            try:
+                summary = await self.compress(session['summary'], batch)
+            except Exception as e:
+                print(f"⚠️ Conversation summary failed: {e}")
+                summary = None
+            if not summary:
+                self.stats['compress_failures'] += 1
+                return  # keep the turns pending; the next add_turn retries
+            session['summary'] = truncate_tokens(summary.strip(), self.summary_tokens)
+            del session['pending'][:len(batch)]
+            self.stats['compressions'] += 1
+
+    def last_answer(self, session_id: str) -> Optional[str]:
+        session = self._session(session_id)
+        if not session:
+            return None
+        turns = session['pending'] + session['turns']
+        return turns[-1]['assistant'] if turns else None
+
+    def render(self, session_id: str, token_budget: Optional[int] = None) -> str:
+        """Summary + newest turns that fit in the budget, oldest first; '' for a new session"""
+        session = self._session(session_id)
+        if not session:
+            return ""
+        budget = token_budget or self.token_budget
+        blocks = []
+        if session['summary']:
+            summary = truncate_tokens(session['summary'], min(self.summary_tokens, budget // 3))
+            blocks.append(f"Summary of the earlier conversation: {summary}")
+            budget -= estimate_tokens(blocks[0])
+
+        recent = []
+        per_turn = max(60, budget // min(self.keep_turns, 2))
+        for turn in reversed(session['pending'] + session['turns']):
+            text = format_turn(turn, per_turn)
+            cost = estimate_tokens(text)
+            if cost > budget:
+                break
+            recent.append(text)
+            budget -= cost
+        if recent:
+            blocks.append("Recent turns:\n" + "\n\n".join(reversed(recent)))
+        return "\n\n".join(blocks)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, sessions=len(self._sessions), keep_turns=self.keep_turns,
+                    token_budget=self.token_budget)
@@ -0,0 +1,82 @@
+# backend/utils/extract.py
+"""
+Document extraction - PDF / DOCX / TXT to text and offset-carrying chunks
+
+Kept free of FastAPI and app state so that batch uploads can run
+extract_document in worker processes (a ProcessPoolExecutor pickles it by
+module path and the workers import only this module).
+"""
+
+import os
+from io import BytesIO
+from typing import Dict, Iterator
+
+import PyPDF2
+import docx
+
+from utils.chunker import iter_chunks
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+MIN_TEXT_CHARS = 50
+
+
+def iter_pdf_pages(content: bytes):
+    """Yield page texts (newline-separated) one at a time, for the streaming chunker"""
+    reader = PyPDF2.PdfReader(BytesIO(content))
+    for i, p in enumerate(reader.pages):
+        if i:
+            yield "\n"
+        yield p.extract_text() or ""
+
+
+def extract_pdf(content: bytes) -> str:
+    return "".join(iter_pdf_pages(content))
+
+
+def extract_docx(content: bytes) -> str:
+    doc = docx.Document(BytesIO(content))
+    paras = [p.text for p in doc.paragraphs if p.text.strip()]
+    return "\n".join(paras)
+
+
+def is_supported(filename: str) -> bool:
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def iter_text(filename: str, content: bytes) -> Iterator[str]:
+    """The file's text in pieces (a PDF page at a time), for the streaming chunker"""
+    name = filename.lower()
+    if name.endswith(".pdf"):
+        return iter_pdf_pages(content)
+    if name.endswith(".docx"):
+        return iter([extract_docx(content)])
+    if name.endswith(".txt"):
+        return iter([content.decode('utf-8')])
+    raise ValueError("Unsupported file type. Use PDF, DOCX, or TXT.")
+
+
+def extract_text(filename: str, content: bytes) -> str:
+    return "".join(iter_text(filename, content))
+
+
+def extract_document(filename: str, content: bytes, size: int = 500, overlap: int = 50) -> Dict:
+    """
+    Extract and chunk one file, chunking each PDF page as soon as it is extracted.
+    Never raises: returns {filename, text, chunks, pid} on success or
+    {filename, error} so one bad file can't fail a whole batch.
+    """
+    try:
+        pieces = []
+
+        def collect():
+            for piece in iter_text(filename, content):
+                pieces.append(piece)
+                yield piece
+
+        chunks = list(iter_chunks(collect(), size=size, overlap=overlap))
+        text = "".join(pieces)  # the chunk offsets index into this
+        if len(text.strip()) < MIN_TEXT_CHARS:
+            return {'filename': filename, 'error': "Uploaded file appears too short or empty."}
+        return {'filename': filename, 'text': text, 'chunks': chunks, 'pid': os.getpid()}
+    except Exception as e:
+        return {'filename': filename, 'error': f"{type(e).__name__}: {e}"}
@@ -0,0 +1,449 @@
+# backend/utils/llm_provider.py
+"""
+LLM Provider Interface - every Gemini call in the backend goes through here
+
+Providers expose the same `generate_content(prompt)` -> response-with-`.text`
+shape as genai.GenerativeModel, so callers don't care which one is active.
+Every provider also accepts `system_instruction=` and `generation_config=`
+(see utils/model_presets.py for the per-mode handles that pass them), and
+`generate_content_stream(prompt)` yields the answer text in pieces as it is
+produced.
+
+Select with the LLM_PROVIDER env var:
+- gemini  (default) real Gemini API, needs GEMINI_API_KEY
+- record  real Gemini API, every prompt/response is appended to LLM_RECORD_PATH
+- replay  serves responses from LLM_RECORD_PATH with the recorded latency, no network
+- fake    deterministic canned answers with LLM_FAKE_LATENCY_MS latency, no network
+
+Replay knobs: LLM_REPLAY_SPEED (latency multiplier, 0 = no sleeping) and
+LLM_REPLAY_MISS (error | fake) for prompts that were never recorded.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_RECORD_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recordings", "llm.jsonl")
+
+
+class LLMResponse:
+    """Minimal stand-in for genai's GenerateContentResponse"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ReplayMiss(Exception):
+    """Raised by ReplayProvider for a prompt that is not in the recording"""
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def request_key(prompt: str, system_instruction: Optional[str] = None) -> str:
+    """Recording key; plain prompts keep their old key so existing recordings still replay"""
+    return prompt_key(f"{system_instruction}\n\n{prompt}" if system_instruction else prompt)
+
+
+def _finish_reason(response) -> str:
+    try:
+        reason = response.candidates[0].finish_reason
+    except Exception:
+        return ""
+    return str(getattr(reason, "name", reason))
+
+
+def _has_text(response) -> bool:
+    try:
+        return bool(response.text)
+    except Exception:
+        return False
+
+
+def _paced(pieces: List[str], total_ms: float) -> Iterator[str]:
+    """Yield pieces with the latency spread evenly between them, like a streamed response"""
+    step = total_ms / 1000.0 / max(1, len(pieces))
+    for piece in pieces:
+        if step > 0:
+            time.sleep(step)
+        yield piece
+
+
+def _lines(text: str) -> List[str]:
+    lines = text.split("\n")
+    return [line + "\n" for line in lines[:-1]] + lines[-1:]
+
+
+class LLMProvider:
+    """Base class for all LLM backends"""
+
+    name = "base"
+    model_name = None
+    accepts_route = False  # True if generate_content takes route=<request class> (see utils/model_router.py)
+
+    def generate_content(self, prompt: str, **kwargs) -> LLMResponse:
+        raise NotImplementedError
+
+    def generate_content_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Answer text in pieces; providers without streaming yield it all at once"""
+        text = getattr(self.generate_content(prompt, **kwargs), "text", None)
+        if text:
+            yield text
+
+    def is_ready(self) -> bool:
+        return True
+
+
+# -------------------------
+# Gemini
+# -------------------------
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_candidates: Optional[List[str]] = None, discover: bool = False, label: str = "Gemini",
+                 probe: bool = True):
+        """
+        Probe candidate models with "Say OK" and keep the first that answers.
+        discover=True asks genai.list_models() for candidates first.
+        probe=False takes the first candidate without calling it.
+        """
+        import google.generativeai as genai
+
+        self.genai = genai
+        self.model = None
+        self._instructed: Dict[str, object] = {}  # system_instruction -> GenerativeModel
+        self._lock = threading.Lock()
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            print(f"❌ {label}: GEMINI_API_KEY not found")
+            return
+
+        genai.configure(api_key=api_key)
+
+        candidates = []
+        if discover:
+            try:
+                for m in genai.list_models():
+                    if 'generateContent' in m.supported_generation_methods:
+                        candidates.append(m.name.replace('models/', ''))
+            except Exception:
+                pass
+        if not candidates:
+            candidates = list(model_candidates or [])
+
+        for mn in candidates:
+            try:
+                candidate = genai.GenerativeModel(mn)
+                if not probe:
+                    self.model = candidate
+                    self.model_name = mn
+                    print(f"  ✅ {label} using model: {mn} (not probed)")
+                    break
+                test = candidate.generate_content("Say OK")
+                if test and getattr(test, "text", None):
+                    self.model = candidate
+                    self.model_name = mn
+                    print(f"  ✅ {label} using model: {mn}")
+                    break
+            except Exception as e:
+                print(f"  ❌ {mn} init failed: {type(e).__name__}: {e}")
+
+    def _model_for(self, system_instruction: str):
+        """One GenerativeModel per system instruction; None if the SDK predates system_instruction (< 0.5)"""
+        with self._lock:
+            if system_instruction not in self._instructed:
+                try:
+                    self._instructed[system_instruction] = self.genai.GenerativeModel(
+                        self.model_name, system_instruction=system_instruction)
+                except TypeError:
+                    print("⚠️ google-generativeai is too old for system instructions; sending them inline")
+                    self._instructed[system_instruction] = None
+            return self._instructed[system_instruction]
+
+    def _resolve(self, prompt: str, system_instruction: Optional[str]):
+        if self.model is None:
+            raise RuntimeError("Gemini model not initialized")
+        model = self._model_for(system_instruction) if system_instruction else self.model
+        if model is None:
+            return self.model, f"{system_instruction}\n\n{prompt}"
+        return model, prompt
+
+    def generate_content(self, prompt: str, system_instruction: Optional[str] = None, **kwargs):
+        model, prompt = self._resolve(prompt, system_instruction)
+        response = model.generate_content(prompt, **kwargs)
+
+        # Thinking models spend output tokens on reasoning first; if the cap ran out
+        # before any answer text, ask once more without the cap rather than fail.
+        config = kwargs.get("generation_config") or {}
+        if config.get("max_output_tokens") and not _has_text(response) and _finish_reason(response) == "MAX_TOKENS":
+            print(f"⚠️ Output cap of {config['max_output_tokens']} tokens hit before any text; retrying uncapped")
+            uncapped = {k: v for k, v in config.items() if k != "max_output_tokens"}
+            response = model.generate_content(prompt, **dict(kwargs, generation_config=uncapped))
+        return response
+
+    def generate_content_stream(self, prompt: str, system_instruction: Optional[str] = None, **kwargs):
+        model, prompt = self._resolve(prompt, system_instruction)
+        for chunk in model.generate_content(prompt, stream=True, **kwargs):
+            try:
+                text = chunk.text
+            except Exception:
+                text = ""  # safety-blocked or empty chunk
+            if text:
+                yield text
+
+    def is_ready(self) -> bool:
+        return self.model is not None
+
+
+# -------------------------
+# Fake (deterministic, offline)
+# -------------------------
+FAKE_WORDS = (
+    "gradient descent model loss function neural network layer weight bias "
+    "training data feature vector matrix probability regression classifier "
+    "overfitting regularization learning rate epoch batch activation "
+    "backpropagation embedding cluster decision tree accuracy precision recall"
+).split()
+
+
+class FakeProvider(LLMProvider):
+    """Same prompt -> same text, after a configurable simulated latency"""
+
+    name = "fake"
+    model_name = "fake-gemini"
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def _sentence(self, rng: random.Random, n: int = 12) -> str:
+        return " ".join(rng.choice(FAKE_WORDS) for _ in range(n)).capitalize() + "."
+
+    def _quiz(self, rng: random.Random, num_questions: int) -> str:
+        lines = []
+        for i in range(1, num_questions + 1):
+            lines.append(f"Q{i}: {self._sentence(rng, 8)[:-1]}?")
+            for letter in "ABCD":
+                lines.append(f"{letter}) {self._sentence(rng, 4)}")
+            lines.append(f"Correct Answer: {rng.choice('ABCD')}")
+            lines.append(f"Explanation: {self._sentence(rng, 10)}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def _outline(self, prompt: str) -> str:
+        """Outline entry drawn from the chunk itself, so its terms overlap the source like a real one"""
+        text = prompt.split("TEXT:", 1)[-1].rsplit("SUMMARY:", 1)[0]
+        words = re.findall(r"[a-z]+", text.lower())
+        common = [w for w, _ in Counter(w for w in words if len(w) > 3).most_common(6)]
+        return (f"SECTION: {' '.join(common[:2]).title() or 'Overview'}\n"
+                f"KEY TERMS: {', '.join(common)}\n"
+                f"SUMMARY: {' '.join(words[:25]).capitalize()}.")
+
+    def _capped(self, prompt: str, system_instruction: Optional[str], generation_config: Optional[Dict]):
+        """(simulated latency ms, answer text)"""
+        delay, text = self._answer(f"{system_instruction}\n\n{prompt}" if system_instruction else prompt)
+        max_tokens = (generation_config or {}).get("max_output_tokens")
+        if max_tokens:  # ~0.75 words per token, like the real cap
+            words = text.split(" ")
+            if len(words) > max_tokens * 3 // 4:
+                text = " ".join(words[:max_tokens * 3 // 4])
+        return delay, text
+
+    def generate_content(self, prompt: str, system_instruction: Optional[str] = None,
+                         generation_config: Optional[Dict] = None, **kwargs) -> LLMResponse:
+        delay, text = self._capped(prompt, system_instruction, generation_config)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return LLMResponse(text)
+
+    def generate_content_stream(self, prompt: str, system_instruction: Optional[str] = None,
+                                generation_config: Optional[Dict] = None, **kwargs):
+        delay, text = self._capped(prompt, system_instruction, generation_config)
+        yield from _paced(_lines(text), delay)
+
+    def _answer(self, prompt: str):
+        rng = random.Random(int(prompt_key(prompt)[:16], 16))
+        delay = self.latency_ms + (rng.random() * self.jitter_ms if self.jitter_ms else 0.0)
+        return delay, self._text(rng, prompt)
+
+    def _text(self, rng: random.Random, prompt: str) -> str:
+        if prompt == "Say OK":
+            return "OK"
+        if "multiple-choice questions" in prompt:
+            match = re.search(r"Generate (\d+) multiple-choice", prompt)
+            return self._quiz(rng, int(match.group(1)) if match else 5)
+        if "RELEVANT: [YES/NO]" in prompt:
+            score = rng.randint(0, 100)
+            return (f"RELEVANT: {'YES' if score >= 60 else 'NO'}\nSCORE: {score}\n"
+                    f"EXPLANATION: {self._sentence(rng, 8)}\nKEY_POINTS: {self._sentence(rng, 6)}")
+        if "SECTION:" in prompt and "KEY TERMS:" in prompt:
+            return self._outline(prompt)
+        if "PRIMARY_INTENT" in prompt:
+            return f"PRIMARY_INTENT: {rng.choice(['QUESTION_ANSWER', 'VIDEO_SEARCH', 'QUIZ_GENERATE'])}\nCONFIDENCE: 85"
+        return " ".join(self._sentence(rng) for _ in range(6))
+
+
+# -------------------------
+# Record / replay
+# -------------------------
+class RecordingProvider(LLMProvider):
+    """Passes calls through to `inner` and appends each exchange to a JSONL file"""
+
+    name = "record"
+
+    def __init__(self, inner: LLMProvider, path: str = DEFAULT_RECORD_PATH):
+        self.inner = inner
+        self.path = path
+        self.accepts_route = inner.accepts_route
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.inner.model_name
+
+    def _record(self, prompt: str, kwargs: Dict, text: str, latency_ms: float):
+        record = {
+            'key': request_key(prompt, kwargs.get("system_instruction")),
+            'model': self.inner.model_name,
+            'prompt': prompt,
+            'system_instruction': kwargs.get("system_instruction"),
+            'text': text,
+            'latency_ms': round(latency_ms, 2),
+            'recorded_at': time.time(),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def generate_content(self, prompt: str, **kwargs):
+        t0 = time.perf_counter()
+        response = self.inner.generate_content(prompt, **kwargs)
+        self._record(prompt, kwargs, getattr(response, "text", None) or "", (time.perf_counter() - t0) * 1000.0)
+        return response
+
+    def generate_content_stream(self, prompt: str, **kwargs):
+        """Recorded once the stream completes, as one exchange like generate_content"""
+        t0 = time.perf_counter()
+        pieces = []
+        for piece in self.inner.generate_content_stream(prompt, **kwargs):
+            pieces.append(piece)
+            yield piece
+        self._record(prompt, kwargs, "".join(pieces), (time.perf_counter() - t0) * 1000.0)
+
+    def is_ready(self) -> bool:
+        return self.inner.is_ready()
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Serves recorded responses keyed by prompt hash, sleeping for the recorded
+    latency (scaled by `speed`). Repeated prompts cycle through their recordings.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str = DEFAULT_RECORD_PATH, speed: float = 1.0, miss: str = "error"):
+        self.path = path
+        self.speed = speed
+        self.miss = miss
+        self.records: Dict[str, List[dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._fallback = FakeProvider() if miss == "fake" else None
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    rec = json.loads(line)
+                    self.records.setdefault(rec['key'], []).append(rec)
+                    self.model_name = rec.get('model') or self.model_name
+        print(f"📼 Replay provider loaded {sum(len(v) for v in self.records.values())} recordings from {path}")
+
+    def _lookup(self, prompt: str, kwargs: Dict) -> Optional[dict]:
+        key = request_key(prompt, kwargs.get("system_instruction"))
+        with self._lock:
+            recs = self.records.get(key)
+            if recs:
+                i = self._cursor.get(key, 0)
+                self._cursor[key] = i + 1
+                rec = recs[i % len(recs)]
+                self.hits += 1
+            else:
+                rec = None
+                self.misses += 1
+        if rec is None and self._fallback is None:
+            raise ReplayMiss(f"No recording for prompt {key[:12]} in {self.path}")
+        return rec
+
+    def generate_content(self, prompt: str, **kwargs) -> LLMResponse:
+        rec = self._lookup(prompt, kwargs)
+        if rec is None:
+            return self._fallback.generate_content(prompt, **kwargs)
+        if self.speed > 0 and rec.get('latency_ms'):
+            time.sleep(rec['latency_ms'] * self.speed / 1000.0)
+        return LLMResponse(rec['text'])
+
+    def generate_content_stream(self, prompt: str, **kwargs):
+        rec = self._lookup(prompt, kwargs)
+        if rec is None:
+            yield from self._fallback.generate_content_stream(prompt, **kwargs)
+            return
+        yield from _paced(_lines(rec['text']), (rec.get('latency_ms') or 0) * self.speed)
+
+    def is_ready(self) -> bool:
+        return bool(self.records) or self._fallback is not None
+
+
+def get_provider(model_candidates: Optional[List[str]] = None, discover: bool = False,
+                 label: str = "Gemini", kind: Optional[str] = None, route: bool = False) -> LLMProvider:
+    """
+    Build the provider selected by LLM_PROVIDER (see module docstring), wrapped in
+    the retry / single-flight / circuit-breaker layer unless LLM_RESILIENCE=off.
+    route=True keeps every working Gemini candidate behind a latency-aware
+    router (utils/model_router.py) instead of only the first; MODEL_ROUTER=off disables it.
+    """
+    provider = _build_provider(model_candidates, discover, label, kind, route)
+    if os.getenv("LLM_RESILIENCE", "on").lower() in ("off", "0", "false"):
+        return provider
+    from utils.llm_resilience import wrap
+    return wrap(provider)
+
+
+def _build_provider(model_candidates: Optional[List[str]], discover: bool,
+                    label: str, kind: Optional[str], route: bool = False) -> LLMProvider:
+    kind = (kind or os.getenv("LLM_PROVIDER", "gemini")).lower()
+    record_path = os.getenv("LLM_RECORD_PATH", DEFAULT_RECORD_PATH)
+
+    if kind == "fake":
+        return FakeProvider(
+            latency_ms=float(os.getenv("LLM_FAKE_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("LLM_FAKE_JITTER_MS", "0")),
+        )
+    if kind == "replay":
+        return ReplayProvider(
+            record_path,
+            speed=float(os.getenv("LLM_REPLAY_SPEED", "1.0")),
+            miss=os.getenv("LLM_REPLAY_MISS", "error"),
+        )
+    if route and len(model_candidates or []) > 1 and os.getenv("MODEL_ROUTER", "on").lower() not in ("off", "0", "false"):
+        from utils.model_router import build_router
+        gemini = build_router(model_candidates, label=label)
+    else:
+        gemini = GeminiProvider(model_candidates, discover=discover, label=label)
+    if kind == "record":
+        print(f"🔴 Recording LLM calls to {record_path}")
+        return RecordingProvider(gemini, record_path)
+    return gemini
@@ -0,0 +1,319 @@
+# backend/utils/llm_resilience.py
+"""
+Resilient LLM call layer - wraps any LLMProvider with:
+- single-flight: identical prompts already in flight share one upstream call
+- retries with full-jitter exponential backoff on transient errors (quota, 5xx, timeouts)
+- a circuit breaker that stops calling upstream after sustained failures and
+  answers from the last-good cache (or a degraded message) until it recovers
+Streamed calls (generate_content_stream) get the retries and the breaker too.
+
+Tune with LLM_MAX_RETRIES, LLM_RETRY_BASE_S, LLM_RETRY_MAX_S,
+LLM_BREAKER_THRESHOLD, LLM_BREAKER_RESET_S and LLM_FALLBACK_CACHE_SIZE.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from utils.llm_provider import LLMProvider, LLMResponse, prompt_key
+from utils import cancellation
+from utils.cancellation import Cancelled, checkpoint
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    TRANSIENT_ERRORS = (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests,
+        TimeoutError,
+        ConnectionError,
+    )
+except Exception:
+    TRANSIENT_ERRORS = (TimeoutError, ConnectionError)
+
+DEGRADED_TEXT = (
+    "⚠️ The AI service is overloaded right now, so I can't give a full answer. "
+    "Please try again in a minute."
+)
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    text = str(error).lower()
+    return any(s in text for s in ("429", "quota", "rate limit", "503", "unavailable", "deadline", "timed out"))
+
+
+def coalesce_key(prompt: str, kwargs: Dict) -> str:
+    """Only byte-identical prompts with identical kwargs share a call (case and spacing can change the answer)"""
+    return prompt_key(f"{prompt}\0{sorted(kwargs.items())!r}" if kwargs else prompt)
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half-open after `reset_timeout` s"""
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"  # let exactly one trial call through
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def record_abort(self):
+        """A call ended with no verdict (cancelled, stream closed): a half-open trial waits for the next one"""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error: Optional[Exception] = None
+        self.waiters = 0
+
+
+class ResilientLLM(LLMProvider):
+    """Drop-in LLMProvider wrapper; see module docstring"""
+
+    def __init__(self, inner: LLMProvider, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, breaker: Optional[CircuitBreaker] = None,
+                 cache_size: int = 512):
+        self.inner = inner
+        self.name = inner.name
+        self.accepts_route = inner.accepts_route
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0,
+            'upstream_calls': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'failures': 0,
+            'served_from_cache': 0,
+            'degraded': 0,
+        }
+
+    @property
+    def model_name(self):
+        return self.inner.model_name
+
+    def is_ready(self) -> bool:
+        return self.inner.is_ready()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _remember(self, key: str, text: str):
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _fallback(self, key: str) -> LLMResponse:
+        with self._lock:
+            text = self._cache.get(key)
+        if text is not None:
+            self._count('served_from_cache')
+            response = LLMResponse(text)
+            response.cached = True
+        else:
+            self._count('degraded')
+            response = LLMResponse(DEGRADED_TEXT)
+        response.degraded = True
+        return response
+
+    def _call_upstream(self, key: str, prompt: str, **kwargs):
+        attempt = 0
+        while True:
+            checkpoint("llm_call")
+            if not self.breaker.allow():
+                return self._fallback(key)
+            settled = False
+            try:
+                self._count('upstream_calls')
+                response = self.inner.generate_content(prompt, **kwargs)
+                self.breaker.record_success()
+                settled = True
+            except Cancelled:
+                raise
+            except Exception as e:
+                settled = True
+                if not is_transient(e):
+                    self.breaker.record_success()  # upstream answered; the request itself is bad
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    print(f"⚠️ LLM call failed after {attempt + 1} attempts: {type(e).__name__}: {e}")
+                    return self._fallback(key)
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                self._count('retries')
+                cancellation.sleep(delay, "llm_call")  # a cancelled request stops waiting right away
+                continue
+            finally:
+                if not settled:
+                    self.breaker.record_abort()
+            try:
+                text = response.text
+            except Exception:
+                text = None  # blocked / empty candidates; nothing worth caching
+            if text:
+                self._remember(key, text)
+            return response
+
+    def generate_content(self, prompt: str, **kwargs):
+        checkpoint("llm_call")
+        self._count('calls')
+        key = coalesce_key(prompt, kwargs)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+            else:
+                flight.waiters += 1
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if isinstance(flight.error, Cancelled):
+                return self.generate_content(prompt, **kwargs)  # the leader's client left; ours didn't
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self._call_upstream(key, prompt, **kwargs)
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def generate_content_stream(self, prompt: str, **kwargs):
+        """
+        Streamed call, not coalesced (each caller consumes its own stream).
+        Transient errors are retried only until the first piece arrives; after
+        that the caller has already used part of the answer, so they propagate.
+        """
+        self._count('calls')
+        key = coalesce_key(prompt, kwargs)
+        attempt = 0
+        while True:
+            checkpoint("llm_call")
+            if not self.breaker.allow():
+                yield self._fallback(key).text
+                return
+            pieces = []
+            settled = False
+            try:
+                self._count('upstream_calls')
+                for piece in self.inner.generate_content_stream(prompt, **kwargs):
+                    pieces.append(piece)
+                    yield piece
+                self.breaker.record_success()
+                settled = True
+            except Cancelled:
+                raise
+            except Exception as e:
+                settled = True
+                if not is_transient(e):
+                    self.breaker.record_success()  # upstream answered; the request itself is bad
+                    raise
+                self.breaker.record_failure()
+                if pieces:
+                    self._count('failures')
+                    raise
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    print(f"⚠️ LLM stream failed after {attempt + 1} attempts: {type(e).__name__}: {e}")
+                    yield self._fallback(key).text
+                    return
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                self._count('retries')
+                cancellation.sleep(delay, "llm_call")
+                continue
+            finally:
+                if not settled:
+                    # Closed by the caller once it had enough (e.g. all quiz questions): upstream
+                    # worked. Cancelled before anything arrived: no verdict.
+                    if pieces:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_abort()
+            if pieces:
+                self._remember(key, "".join(pieces))
+            return
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._inflight)
+            stats['cached_answers'] = len(self._cache)
+        stats['breaker'] = {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'trips': self.breaker.trips,
+        }
+        return stats
+
+
+def wrap(provider: LLMProvider) -> ResilientLLM:
+    """Wrap a provider using the LLM_* env configuration"""
+    return ResilientLLM(
+        provider,
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+        base_delay=float(os.getenv("LLM_RETRY_BASE_S", "0.5")),
+        max_delay=float(os.getenv("LLM_RETRY_MAX_S", "8")),
+        breaker=CircuitBreaker(
+            threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+        ),
+        cache_size=int(os.getenv("LLM_FALLBACK_CACHE_SIZE", "512")),
+    )
@@ -0,0 +1,106 @@
+# backend/utils/minhash.py
+"""
+Near-Duplicate Detection - MinHash signatures and an LSH index for chunks
+
+Each chunk is reduced to the set of its word 3-shingles, and that set to a
+128-value MinHash signature; two signatures agree in about the same fraction
+of positions as the shingle sets' Jaccard similarity. The LSH index splits
+signatures into 16 bands of 8 rows, so a lookup only returns chunks that
+share at least one whole band (pairs above ~0.7 similarity almost always do,
+pairs below ~0.4 almost never), and the caller confirms candidates with the
+exact Jaccard of the shingle sets.
+
+Words are hashed with crc32 and combined into shingle hashes with numpy, and
+the permutations come from a fixed seed, so signatures are identical across
+workers and restarts and can be stored next to the corpus segments.
+"""
+
+import re
+import zlib
+from typing import Dict, Hashable, List
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK = np.uint64(0xFFFFFFFF)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_MIX = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D], dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str) -> np.ndarray:
+    """Sorted, unique hashes of the chunk's lowercased word 3-grams (a shorter chunk is one shingle)"""
+    words = np.array([zlib.crc32(w.encode("utf-8")) for w in _WORD.findall(text.lower())], dtype=np.uint64)
+    if len(words) < SHINGLE_WORDS:
+        words = np.concatenate([words, np.zeros(SHINGLE_WORDS - len(words), dtype=np.uint64)]) if len(words) else words
+    n = len(words) - SHINGLE_WORDS + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        hashed = sum(words[i:i + n] * _MIX[i] for i in range(SHINGLE_WORDS))
+    return np.unique(hashed & _MASK)
+
+
+def signature(shingle_hashes: np.ndarray) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values); all-max when there are no shingles"""
+    if not len(shingle_hashes):
+        return np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        permuted = ((shingle_hashes[:, None] * _A + _B) % _PRIME) & _MASK
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def signatures(texts: List[str]) -> np.ndarray:
+    """Signatures for a list of chunk texts, one row per chunk"""
+    out = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        out[i] = signature(shingles(text))
+    return out
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Exact Jaccard similarity of two shingles() results"""
+    if not len(a) or not len(b):
+        return 0.0
+    common = len(np.intersect1d(a, b, assume_unique=True))
+    return common / (len(a) + len(b) - common)
+
+
+class LSHIndex:
+    """Band buckets of MinHash signatures; query() returns the keys sharing any band"""
+
+    def __init__(self):
+        self._buckets: Dict[bytes, Dict[Hashable, None]] = {}
+        self.size = 0
+
+    @staticmethod
+    def _bands(sig: np.ndarray) -> List[bytes]:
+        return [bytes([b]) + sig[b * ROWS:(b + 1) * ROWS].tobytes() for b in range(BANDS)]
+
+    def add(self, key: Hashable, sig: np.ndarray):
+        for band in self._bands(sig):
+            self._buckets.setdefault(band, {})[key] = None
+        self.size += 1
+
+    def remove(self, key: Hashable, sig: np.ndarray):
+        """Undo add(key, sig); `sig` must be the signature it was added with"""
+        for band in self._bands(sig):
+            bucket = self._buckets.get(band)
+            if bucket is not None and bucket.pop(key, False) is None and not bucket:
+                del self._buckets[band]
+        self.size -= 1
+
+    def query(self, sig: np.ndarray) -> List[Hashable]:
+        """Keys of the signatures sharing at least one band with `sig`"""
+        seen = {}
+        for band in self._bands(sig):
+            for key in self._buckets.get(band, ()):
+                seen[key] = None
+        return list(seen)
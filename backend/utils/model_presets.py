@@ -0,0 +1,210 @@
+# backend/utils/model_presets.py
+"""
+Model Presets - per-mode model handles with a system instruction and generation config
+
+Each mode (normal chat, simplified chat, quiz, simplify rewrite, intent
+classification, video segment scoring) gets a ModelHandle: the shared
+provider plus a fixed system instruction, temperature and max_output_tokens.
+Call sites send only what changes per request (the question, its context),
+and the standing instructions live in one place instead of being pasted into
+every prompt. Output length is always bounded.
+
+Override a preset with MODEL_PRESET_<MODE>_MAX_TOKENS / _TEMPERATURE,
+e.g. MODEL_PRESET_NORMAL_MAX_TOKENS=1024.
+"""
+
+import os
+import threading
+from typing import Dict, Iterator, Optional
+
+EXAMPLE_NUDGE = "Also include one short, branch-specific example (AI/DS) related to the topic."
+CLOSING = ("Write your answer in a friendly, teaching style. If the question is ambiguous, explain the core "
+           "idea and show what a clarifying follow-up question the student could ask.")
+CONTEXT_RULES = ("The message may include reference context from the student's uploaded files (use it only to "
+                 "inform your answer; do not copy it, and mention which file(s) you referenced if relevant) and the "
+                 "conversation so far (use it to resolve follow-up questions like \"why?\" or \"give another example\").")
+
+PRESETS: Dict[str, Dict] = {
+    'normal': {
+        'temperature': 0.7,
+        'max_output_tokens': 2048,
+        'system_instruction': f"""You are an AI Teaching Assistant specifically for Artificial Intelligence & Data Science (AI & DS) engineering students.
+Your role: TEACH — not just summarize. Use intuition, examples, short code snippets (if relevant), and analogies.
+- Break complex ideas into simple steps.
+- Explain WHY things work and WHEN to use them.
+- NEVER copy text verbatim from provided syllabus materials — use them only as background reference.
+- Keep answers concise unless the user asks for a deep dive.
+{CONTEXT_RULES}
+{EXAMPLE_NUDGE}
+{CLOSING}""",
+    },
+    'simplified': {
+        'temperature': 0.8,
+        'max_output_tokens': 512,
+        'system_instruction': f"""You are an AI Teaching Assistant in SIMPLIFY MODE. Explain as if speaking to a beginner or a 10-year-old.
+- Use short sentences, everyday analogies, and emojis where appropriate.
+- Avoid jargon. If a technical word is necessary, define it simply.
+- Give one concrete AI or Data Science example (like chatbots or recommender systems).
+- Keep it concise (3-6 short sentences).
+{CONTEXT_RULES}
+{CLOSING}""",
+    },
+    'rewrite': {
+        'temperature': 0.5,
+        'max_output_tokens': 512,
+        'system_instruction': """You are an AI Teaching Assistant for AI & DS students. The student asked for a simpler version of
+the assistant's previous reply, which is the whole message. Rewrite it so it is:
+- Simple and easy to understand (like explaining to a beginner or a 10-year-old).
+- Use everyday analogies and short sentences.
+- Keep it concise (3-6 short sentences).
+- Add one quick AI-related example (like a chatbot or recommendation system) to make it concrete.
+- Keep a friendly tone and include an emoji or two if helpful.
+Reply with the simplified version only.""",
+    },
+    'quiz': {
+        'temperature': 0.7,
+        'max_output_tokens': 2048,  # raised per request for long quizzes, see quiz_max_tokens()
+        'system_instruction': """You are an AI Teaching Assistant for AI & DS students who writes multiple-choice quizzes.
+Format exactly like this:
+Q1: [Question]
+A) [Option]
+B) [Option]
+C) [Option]
+D) [Option]
+Correct Answer: [A/B/C/D]
+Explanation: [Brief explanation]
+
+Make sure each question has 4 options, one correct answer, and a clear explanation.""",
+    },
+    'intent': {
+        'temperature': 0.0,
+        'max_output_tokens': 256,
+        'system_instruction': """Analyze the user query and classify its intent into ONE of:
+1. VIDEO_SEARCH - User wants video explanations
+2. QUESTION_ANSWER - User wants text explanation
+3. QUIZ_GENERATE - User wants practice questions
+4. CONCEPT_EXPLAIN - User wants simple explanation
+
+Respond in this format:
+PRIMARY_INTENT: [intent]
+CONFIDENCE: [0-100]
+
+Keywords:
+- "video", "watch", "show me" → VIDEO_SEARCH
+- "test me", "quiz", "practice" → QUIZ_GENERATE""",
+    },
+    'segment_score': {
+        'temperature': 0.0,
+        'max_output_tokens': 256,
+        'system_instruction': """Analyze if the video transcript segment explains the student's concept/doubt.
+
+Respond in this EXACT format:
+RELEVANT: [YES/NO]
+SCORE: [0-100]
+EXPLANATION: [One sentence explaining why it's relevant or not]
+KEY_POINTS: [List 2-3 key points covered in this segment]
+
+Be strict - only mark as relevant if it DIRECTLY addresses the doubt.""",
+    },
+}
+
+
+def quiz_max_tokens(num_questions: int) -> int:
+    """~150 tokens per question plus headroom, never below the preset"""
+    return max(PRESETS['quiz']['max_output_tokens'], 150 * num_questions + 256)
+
+
+def get_preset(mode: str) -> Dict:
+    """Preset for `mode` with env overrides applied; KeyError for an unknown mode"""
+    preset = dict(PRESETS[mode])
+    prefix = f"MODEL_PRESET_{mode.upper()}_"
+    if os.getenv(prefix + "MAX_TOKENS"):
+        preset['max_output_tokens'] = int(os.getenv(prefix + "MAX_TOKENS"))
+    if os.getenv(prefix + "TEMPERATURE"):
+        preset['temperature'] = float(os.getenv(prefix + "TEMPERATURE"))
+    return preset
+
+
+def _tokens(chars: int) -> int:
+    return (chars + 3) // 4
+
+
+def _usage(response, field: str) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    value = getattr(usage, field, None) if usage is not None else None
+    return value if isinstance(value, int) else None
+
+
+class ModelHandle:
+    """A provider preconfigured for one mode; drop-in for provider.generate_content"""
+
+    def __init__(self, provider, mode: str, preset: Optional[Dict] = None):
+        self.provider = provider
+        self.mode = mode
+        self.preset = preset or get_preset(mode)
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'payload_tokens': 0, 'instruction_tokens': 0, 'output_tokens': 0}
+
+    @property
+    def name(self) -> str:
+        return self.provider.name
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.provider.model_name
+
+    def is_ready(self) -> bool:
+        return self.provider.is_ready()
+
+    def _kwargs(self, max_output_tokens: Optional[int]) -> Dict:
+        kwargs = {
+            'system_instruction': self.preset['system_instruction'],
+            'generation_config': {
+                'temperature': self.preset['temperature'],
+                'max_output_tokens': max_output_tokens or self.preset['max_output_tokens'],
+            },
+        }
+        if getattr(self.provider, "accepts_route", False):
+            kwargs['route'] = self.mode  # per-mode latency stats in the model router
+        return kwargs
+
+    def _account(self, prompt: str, output_tokens: int):
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['payload_tokens'] += _tokens(len(prompt))
+            self.stats['instruction_tokens'] += _tokens(len(self.preset['system_instruction']))
+            self.stats['output_tokens'] += output_tokens
+
+    def generate_content(self, prompt: str, max_output_tokens: Optional[int] = None):
+        response = self.provider.generate_content(prompt, **self._kwargs(max_output_tokens))
+        try:
+            text = response.text or ""
+        except Exception:
+            text = ""
+        output = _usage(response, "candidates_token_count")
+        self._account(prompt, output if output is not None else _tokens(len(text)))
+        return response
+
+    def stream_content(self, prompt: str, max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        """Like generate_content, but yields the answer text in pieces as the model writes it"""
+        chars = 0
+        try:
+            for piece in self.provider.generate_content_stream(prompt, **self._kwargs(max_output_tokens)):
+                chars += len(piece)
+                yield piece
+        finally:
+            self._account(prompt, _tokens(chars))
+
+    def get_stats(self) -> Dict:
+        calls = self.stats['calls'] or 1
+        return dict(
+            self.stats,
+            max_output_tokens=self.preset['max_output_tokens'],
+            temperature=self.preset['temperature'],
+            payload_tokens_per_call=round(self.stats['payload_tokens'] / calls, 1),
+            output_tokens_per_call=round(self.stats['output_tokens'] / calls, 1),
+        )
+
+
+def build_handles(provider, modes=None) -> Dict[str, ModelHandle]:
+    return {mode: ModelHandle(provider, mode) for mode in (modes or PRESETS)}
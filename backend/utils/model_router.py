@@ -0,0 +1,348 @@
+# backend/utils/model_router.py
+"""
+Model Router - spread requests over every working MODEL_CANDIDATES model
+
+Every candidate that answers the startup probe stays available. The router
+keeps a rolling window of latencies and outcomes per (request class, model),
+where the class is the ModelHandle mode (normal, quiz, intent, ...) or
+"default" for plain calls, and sends each call to the earliest candidate in
+the list whose score (p50 latency, inflated by its error rate) is within
+`tolerance` of the best one. List order stays the quality preference; a model
+only loses its traffic when it is clearly slower or failing. A model that
+fails `failure_threshold` times in a row sits out for `cooldown_s`, and a
+transient error fails over to the next model once.
+
+Hedging (MODEL_HEDGE=on): when the chosen model has not answered within its
+own p95 for the class, the same request also goes to the fastest other
+healthy model and whichever answers first wins. Hedges are capped at
+`hedge_ratio` of calls so a general slowdown can't double the load.
+
+Env: MODEL_ROUTER (on|off), MODEL_ROUTER_TOLERANCE, MODEL_ROUTER_WINDOW,
+MODEL_ROUTER_COOLDOWN_S, MODEL_HEDGE, MODEL_HEDGE_MAX_RATIO, MODEL_ROUTER_PROBE
+(on: probe every candidate at startup, in parallel; off: trust the list and
+let the failure cooldown route around a broken model).
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from utils.cancellation import checkpoint
+from utils.llm_provider import GeminiProvider, LLMProvider
+from utils.llm_resilience import is_transient
+
+MIN_SAMPLES = 5            # successful calls in a class before a model's latency counts for routing
+EXPLORE_RATE = 0.05        # share of calls sent elsewhere to keep the other models' stats fresh
+WARMUP_EXPLORE_RATE = 0.2  # ... while some model has fewer than MIN_SAMPLES outcomes in the class
+
+
+def _pct(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+
+class _Window:
+    """Last `size` outcomes of one model for one request class"""
+
+    def __init__(self, size: int):
+        self.latencies = deque(maxlen=size)  # ms, successful calls only
+        self.outcomes = deque(maxlen=size)   # True = success
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency_ms: float, ok: bool):
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency_ms)
+        else:
+            self.errors += 1
+
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self) -> Optional[float]:
+        """Expected latency, penalized by errors; None without data"""
+        if not self.latencies:
+            return None
+        return _pct(self.latencies, 50) * (1 + 4 * self.error_rate())
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate(), 3),
+            'p50_ms': _pct(self.latencies, 50),
+            'p95_ms': _pct(self.latencies, 95),
+        }
+
+
+class ModelRouter(LLMProvider):
+    """LLMProvider over several single-model providers; see module docstring"""
+
+    name = "router"
+    accepts_route = True  # ModelHandle passes route=<mode>
+
+    def __init__(self, providers: List[LLMProvider], tolerance: float = 0.5, window: int = 50,
+                 failure_threshold: int = 3, cooldown_s: float = 30.0, hedge: bool = False,
+                 hedge_ratio: float = 0.1):
+        self.providers: Dict[str, LLMProvider] = {}
+        self.order: List[str] = []  # candidate order = preference
+        self.tolerance = tolerance
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.hedge = hedge
+        self.hedge_ratio = hedge_ratio
+        self._windows: Dict[Tuple[str, str], _Window] = {}
+        self._consecutive: Dict[str, int] = {}
+        self._cooldown_until: Dict[str, float] = {}
+        self._last_route: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge") if hedge else None
+        self.stats = {'calls': 0, 'failovers': 0, 'explored': 0, 'hedges': 0, 'hedge_wins': 0,
+                      'hedge_skipped_budget': 0, 'cooldowns': 0}
+        for provider in providers:
+            self.add(provider)
+
+    def add(self, provider: LLMProvider):
+        name = provider.model_name
+        self.providers[name] = provider
+        self.order.append(name)
+        self._consecutive[name] = 0
+        self._cooldown_until[name] = 0.0
+
+    @property
+    def model_name(self) -> Optional[str]:
+        with self._lock:
+            return self._last_route.get("default") or (self.order[0] if self.order else None)
+
+    def is_ready(self) -> bool:
+        return any(p.is_ready() for p in self.providers.values())
+
+    # ---- bookkeeping -------------------------------------------------------
+
+    def _win(self, route: str, model_name: str) -> _Window:
+        key = (route, model_name)
+        if key not in self._windows:
+            self._windows[key] = _Window(self.window)
+        return self._windows[key]
+
+    def record(self, route: str, model_name: str, latency_ms: float, ok: bool):
+        with self._lock:
+            self._win(route, model_name).record(latency_ms, ok)
+            if route != "*":
+                self._win("*", model_name).record(latency_ms, ok)
+            if ok:
+                self._consecutive[model_name] = 0
+                return
+            self._consecutive[model_name] += 1
+            if self._consecutive[model_name] >= self.failure_threshold:
+                if self._cooldown_until[model_name] < time.monotonic():
+                    self.stats['cooldowns'] += 1
+                    print(f"⚠️ Model {model_name} failed {self._consecutive[model_name]}x in a row; "
+                          f"routing around it for {self.cooldown_s:g}s")
+                self._cooldown_until[model_name] = time.monotonic() + self.cooldown_s
+
+    def _samples(self, route: str, model_name: str) -> int:
+        win = self._windows.get((route, model_name))
+        return len(win.latencies) if win is not None else 0
+
+    def _outcomes(self, route: str, model_name: str) -> int:
+        win = self._windows.get((route, model_name))
+        return len(win.outcomes) if win is not None else 0
+
+    def _score(self, route: str, model_name: str) -> Optional[float]:
+        if self._samples(route, model_name) < MIN_SAMPLES:
+            return None
+        return self._windows[(route, model_name)].score()
+
+    def p95(self, route: str, model_name: str) -> Optional[float]:
+        if self._samples(route, model_name) < MIN_SAMPLES:
+            return None
+        return _pct(self._windows[(route, model_name)].latencies, 95)
+
+    # ---- routing -----------------------------------------------------------
+
+    def ranked(self, route: str) -> List[str]:
+        """Models to try for `route`, best first"""
+        with self._lock:
+            now = time.monotonic()
+            healthy = [m for m in self.order if self._cooldown_until[m] <= now]
+            if not healthy:  # everything is cooling down: least recently failed first
+                return sorted(self.order, key=lambda m: self._cooldown_until[m])
+            scores = {m: self._score(route, m) for m in healthy}
+            known = [s for s in scores.values() if s is not None]
+            if known:
+                # Earliest candidate within tolerance of the best; models without data don't compete
+                best = min(known)
+                chosen = next(m for m in healthy if scores[m] is not None and scores[m] <= best * (1 + self.tolerance))
+            else:
+                chosen = healthy[0]
+            others = [m for m in healthy if m != chosen]
+            fewest = min((self._outcomes(route, m) for m in others), default=0)
+            if others and random.random() < (WARMUP_EXPLORE_RATE if fewest < MIN_SAMPLES else EXPLORE_RATE):
+                chosen = random.choice([m for m in others if self._outcomes(route, m) == fewest])
+                self.stats['explored'] += 1
+            rest = sorted((m for m in healthy if m != chosen),
+                          key=lambda m: scores[m] if scores[m] is not None else float("inf"))
+            return [chosen] + rest + [m for m in self.order if m not in healthy]
+
+    def _timed_call(self, route: str, model_name: str, prompt: str, kwargs: Dict):
+        t0 = time.perf_counter()
+        try:
+            response = self.providers[model_name].generate_content(prompt, **kwargs)
+        except Exception as e:
+            if is_transient(e):
+                self.record(route, model_name, 0.0, ok=False)
+            raise
+        self.record(route, model_name, (time.perf_counter() - t0) * 1000.0, ok=True)
+        return response
+
+    def _hedged_call(self, route: str, ranked: List[str], prompt: str, kwargs: Dict):
+        """Primary on the pool; after its p95, the fastest other model too. First success wins."""
+        primary = ranked[0]
+        delay_ms = self.p95(route, primary)
+        with self._lock:
+            backups = [m for m in ranked[1:] if self._cooldown_until[m] <= time.monotonic()
+                       and self._score(route, m) is not None]
+        if delay_ms is None or not backups:
+            return self._timed_call(route, primary, prompt, kwargs)
+
+        first = self._pool.submit(contextvars.copy_context().run, self._timed_call, route, primary, prompt, kwargs)
+        done, _ = wait([first], timeout=delay_ms / 1000.0)
+        if done:
+            return first.result()
+        # Cancelled here ends ResilientLLM's call with no outcome; a half-open breaker goes back to open
+        checkpoint("llm_hedge")
+        with self._lock:
+            if self.stats['hedges'] >= self.hedge_ratio * self.stats['calls']:
+                self.stats['hedge_skipped_budget'] += 1
+                backups = []
+            else:
+                self.stats['hedges'] += 1
+        if not backups:
+            return first.result()
+
+        backup = min(backups, key=lambda m: self._score(route, m))
+        second = self._pool.submit(contextvars.copy_context().run, self._timed_call, route, backup, prompt, kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is second:
+                    with self._lock:
+                        self.stats['hedge_wins'] += 1
+                return response  # the slower call finishes in the background and still updates the stats
+        raise error
+
+    def generate_content(self, prompt: str, route: str = "default", **kwargs):
+        ranked = self.ranked(route)
+        with self._lock:
+            self.stats['calls'] += 1
+            self._last_route[route] = ranked[0]
+        try:
+            if self.hedge and len(ranked) > 1:
+                return self._hedged_call(route, ranked, prompt, kwargs)
+            return self._timed_call(route, ranked[0], prompt, kwargs)
+        except Exception as e:
+            if not is_transient(e) or len(ranked) < 2:
+                raise
+            checkpoint("llm_call")
+            with self._lock:
+                self.stats['failovers'] += 1
+            print(f"⚠️ {ranked[0]} failed ({type(e).__name__}); failing over to {ranked[1]}")
+            return self._timed_call(route, ranked[1], prompt, kwargs)
+
+    def generate_content_stream(self, prompt: str, route: str = "default", **kwargs):
+        """Streams from the best model (no hedging); fails over only before the first piece"""
+        ranked = self.ranked(route)
+        with self._lock:
+            self.stats['calls'] += 1
+            self._last_route[route] = ranked[0]
+        for attempt, model_name in enumerate(ranked[:2]):
+            t0 = time.perf_counter()
+            started = False
+            ok = None
+            try:
+                for piece in self.providers[model_name].generate_content_stream(prompt, **kwargs):
+                    started = True
+                    yield piece
+                ok = True
+            except Exception as e:
+                ok = False
+                if is_transient(e):
+                    self.record(route, model_name, 0.0, ok=False)
+                if started or attempt or not is_transient(e) or len(ranked) < 2:
+                    raise
+                with self._lock:
+                    self.stats['failovers'] += 1
+                print(f"⚠️ {model_name} stream failed ({type(e).__name__}); failing over to {ranked[1]}")
+                continue
+            finally:
+                # Finished, or closed by the caller after some pieces: the model answered
+                if ok or (ok is None and started):
+                    self.record(route, model_name, (time.perf_counter() - t0) * 1000.0, ok=True)
+            return
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            models = {}
+            for m in self.order:
+                models[m] = {
+                    'healthy': self._cooldown_until[m] <= now,
+                    'cooldown_s': round(max(0.0, self._cooldown_until[m] - now), 1),
+                    'consecutive_failures': self._consecutive[m],
+                    'overall': self._win("*", m).to_dict(),
+                    'classes': {route: w.to_dict() for (route, name), w in self._windows.items()
+                                if name == m and route != "*"},
+                }
+            return dict(self.stats, hedge=self.hedge, tolerance=self.tolerance, order=self.order,
+                        routes=dict(self._last_route), models=models)
+
+
+def build_router(model_candidates: List[str], label: str = "Gemini") -> LLMProvider:
+    """A router over the candidates that answer the probe (the model itself if only one does)"""
+    router = ModelRouter(
+        [],
+        tolerance=float(os.getenv("MODEL_ROUTER_TOLERANCE", "0.5")),
+        window=int(os.getenv("MODEL_ROUTER_WINDOW", "50")),
+        cooldown_s=float(os.getenv("MODEL_ROUTER_COOLDOWN_S", "30")),
+        hedge=os.getenv("MODEL_HEDGE", "off").lower() in ("on", "1", "true"),
+        hedge_ratio=float(os.getenv("MODEL_HEDGE_MAX_RATIO", "0.1")),
+    )
+    probe = os.getenv("MODEL_ROUTER_PROBE", "on").lower() not in ("off", "0", "false")
+    # Probes are one network round trip each; run them side by side, keep the candidate order
+    with ThreadPoolExecutor(max_workers=max(1, len(model_candidates))) as pool:
+        providers = list(pool.map(lambda mn: GeminiProvider([mn], label=label, probe=probe), model_candidates))
+    for provider in providers:
+        if provider.is_ready():
+            router.add(provider)
+    if len(router.order) == 1:
+        return router.providers[router.order[0]]
+    print(f"🔀 Routing across {len(router.order)} models: {', '.join(router.order)}"
+          f"{' (hedging on)' if router.hedge else ''}")
+    return router
+
+
+def find_router(provider) -> Optional[ModelRouter]:
+    """The ModelRouter inside a (possibly wrapped) provider, if any"""
+    while provider is not None:
+        if isinstance(provider, ModelRouter):
+            return provider
+        provider = getattr(provider, "inner", None)
+    return None
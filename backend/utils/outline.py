@@ -0,0 +1,135 @@
+# backend/utils/outline.py
+"""
+Document Outlines - compact per-chunk summaries built in the background after upload
+
+An outline has one entry per chunk (section title, key terms, a one-or-two
+sentence summary), the document's sections (runs of chunks sharing a title)
+and its most frequent key terms. Chat prompts use an entry instead of the raw
+~500-word chunk whenever the entry covers the question; the raw text is only
+sent when it does not, or when the question needs exact wording (code,
+formulas, derivations).
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import AsyncContextManager, Callable, Dict, List, Optional, Tuple
+
+from utils.transcript_index import tokenize
+
+OUTLINE_VERSION = 1
+
+# Questions that need the source text itself, not a paraphrase
+RAW_TRIGGERS = ("code", "formula", "equation", "derive", "derivation", "proof", "exact", "quote",
+                "verbatim", "syntax", "step by step", "step-by-step", "algorithm", "pseudocode")
+
+_FIELD = re.compile(r"^\s*(SECTION|KEY TERMS|SUMMARY)\s*:\s*(.*)$", re.IGNORECASE)
+
+
+def outline_prompt(chunk: str, _summary_type: str = 'outline') -> str:
+    return f"""You are indexing an AI & DS course document so a tutor can find things quickly.
+For the text below, reply in exactly this format and nothing else:
+SECTION: <short title of the topic, at most 6 words>
+KEY TERMS: <up to 8 comma-separated technical terms that appear in the text>
+SUMMARY: <one or two sentences with the main point, keeping exact definitions>
+
+TEXT:
+{chunk}
+"""
+
+
+def parse_outline_entry(text: str) -> Dict:
+    """Parse SECTION / KEY TERMS / SUMMARY lines; free-form replies become a summary-only entry"""
+    entry = {'section': "", 'key_terms': [], 'summary': ""}
+    current = None
+    for line in text.splitlines():
+        m = _FIELD.match(line)
+        if m:
+            current = m.group(1).upper()
+            value = m.group(2).strip()
+        elif current == 'SUMMARY' and line.strip():
+            value = line.strip()
+        else:
+            continue
+        if current == 'SECTION':
+            entry['section'] = value
+        elif current == 'KEY TERMS':
+            entry['key_terms'] = [t.strip() for t in value.split(",") if t.strip()][:8]
+        else:
+            entry['summary'] = f"{entry['summary']} {value}".strip()
+    if not entry['summary'] and not entry['section']:
+        entry['summary'] = " ".join(text.split()[:60])
+    return entry
+
+
+async def build_outline(summarizer, chunks: List[str], step: Optional[Callable[[], AsyncContextManager]] = None,
+                        batch: int = 8) -> Dict:
+    """
+    One outline call per chunk through the summarizer (shared cap and per-chunk
+    cache), `batch` chunks at a time, each batch inside `async with step()`
+    (e.g. an admission slot) so a long document never holds one for long.
+    """
+    t0 = time.perf_counter()
+    raw = []
+    for i in range(0, len(chunks), max(1, batch)):
+        async with (step or nullcontext)():
+            raw += await summarizer.summarize_chunks(chunks[i:i + batch], 'outline', prompt_fn=outline_prompt)
+    entries = [parse_outline_entry(r) if r else None for r in raw]
+
+    sections = []
+    for i, e in enumerate(entries):
+        title = (e or {}).get('section') or ""
+        if sections and sections[-1]['title'].lower() == title.lower():
+            sections[-1]['chunks'].append(i)
+        else:
+            sections.append({'title': title, 'chunks': [i]})
+
+    terms = Counter(t.lower() for e in entries if e for t in e['key_terms'])
+    return {
+        'version': OUTLINE_VERSION,
+        'chunks': entries,
+        'sections': sections,
+        'key_terms': [t for t, _ in terms.most_common(20)],
+        'missing': sum(1 for e in entries if e is None),
+        'built_ms': round((time.perf_counter() - t0) * 1000, 1),
+        'built_at': time.time(),
+    }
+
+
+def wants_raw(question: str) -> bool:
+    q = question.lower()
+    return any(t in q for t in RAW_TRIGGERS)
+
+
+def covers(question: str, chunk_text: str, entry: Dict, min_coverage: float = 0.5) -> bool:
+    """
+    Does the entry mention enough of the question terms that made this chunk
+    match? If not, the answer probably lives in details the summary dropped.
+    """
+    matched = set(tokenize(question)) & set(tokenize(chunk_text))
+    if not matched:
+        return True
+    compact = " ".join([entry.get('section', ""), " ".join(entry.get('key_terms', [])), entry.get('summary', "")])
+    return len(matched & set(tokenize(compact))) / len(matched) >= min_coverage
+
+
+def compact_context(question: str, hits: List[Dict], get_entry: Callable[[str, int], Optional[Dict]],
+                    force_raw: bool = False) -> Tuple[List[str], Dict]:
+    """
+    Turn retrieval hits ({doc_id, chunk, text, filename}) into prompt context,
+    using outline entries where they suffice. Returns (parts, {'compact': n, 'raw': n}).
+    """
+    parts, counts = [], {'compact': 0, 'raw': 0}
+    for h in hits:
+        entry = None if force_raw else get_entry(h['doc_id'], h['chunk'])
+        if entry and entry.get('summary') and covers(question, h['text'], entry):
+            files = [h.get('filename', '')] + [a['filename'] for a in h.get('also_in', []) if a['filename'] != h.get('filename')]
+            label = f"{', '.join(dict.fromkeys(files))} › {entry['section']}".strip(" ›")
+            terms = f" (key terms: {', '.join(entry['key_terms'])})" if entry['key_terms'] else ""
+            parts.append(f"[{label}] {entry['summary']}{terms}")
+            counts['compact'] += 1
+        else:
+            parts.append(h['text'])
+            counts['raw'] += 1
+    return parts, counts
@@ -0,0 +1,78 @@
+# backend/utils/profiler.py
+"""
+Sampling Profiler - on-demand, whole-process stack sampling
+
+A daemon thread snapshots every thread's Python stack (sys._current_frames)
+every `interval_s` for a fixed window and counts identical stacks. The result
+is in the collapsed ("folded") format used by flamegraph.pl, speedscope and
+inferno: one line per distinct stack, root first, frames joined by ';',
+followed by the sample count. Nothing is installed in the interpreter, so the
+overhead only exists while a profile is running.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.last: Optional[Dict] = None
+
+    def _sample(self, counts: Counter, own_ident: int, names: Dict[int, str], include_idle: bool):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if not include_idle and stack and stack[0].startswith(("select ", "wait ", "_worker ", "poll ")):
+                continue  # parked thread: the event loop waiting for I/O, an idle pool worker
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(stack))] += 1
+
+    def profile(self, duration_s: float, interval_s: float = 0.005, include_idle: bool = False) -> Dict:
+        """
+        Sample for duration_s (blocking; run it in a thread). Returns
+        {collapsed, samples, stacks, duration_s, interval_s}. Raises RuntimeError
+        if a profile is already running.
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already running")
+            self.running = True
+        try:
+            counts: Counter = Counter()
+            own = threading.get_ident()
+            samples = 0
+            t0 = time.perf_counter()
+            deadline = t0 + duration_s
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                self._sample(counts, own, names, include_idle)
+                samples += 1
+                time.sleep(interval_s)
+            collapsed = "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+            self.last = {
+                'collapsed': collapsed,
+                'samples': samples,
+                'stacks': len(counts),
+                'duration_s': round(time.perf_counter() - t0, 3),
+                'interval_s': interval_s,
+                'finished_at': time.time(),
+            }
+            return self.last
+        finally:
+            with self._lock:
+                self.running = False
@@ -0,0 +1,82 @@
+# backend/utils/quiz_stream.py
+"""
+Quiz Parser - turns the quiz preset's text format into question dicts
+
+QuizStreamParser is fed the model output piece by piece while it streams and
+hands back each question as soon as it is complete: when its Explanation line
+ends (the last line of a question), when the next "Q<n>:" line starts, or at
+finish(). Lines are parsed with the same rules the /api/generate-quiz parser
+always used, so streamed and non-streamed quizzes have the same
+{question, options, correct_answer, explanation} shape.
+"""
+
+from typing import Dict, List, Optional
+
+OPTION_LETTERS = "ABCD"
+
+
+class QuizStreamParser:
+    def __init__(self):
+        self._buffer = ""
+        self._current: Optional[Dict] = None
+
+    def feed(self, text: str) -> List[Dict]:
+        """Add streamed text; returns the questions it completed (possibly none)"""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        done = []
+        for line in lines:
+            done.extend(self._line(line))
+        return done
+
+    def finish(self) -> List[Dict]:
+        """End of stream: parse the last partial line and flush the open question"""
+        done = self._line(self._buffer)
+        self._buffer = ""
+        if self._current:
+            done.append(self._current)
+            self._current = None
+        return done
+
+    def _line(self, line: str) -> List[Dict]:
+        line = line.strip()
+        if not line:
+            return []
+        if line.startswith("Q") and ":" in line:
+            done = [self._current] if self._current else []
+            self._current = {"question": line.split(":", 1)[1].strip(), "options": [], "correct_answer": "", "explanation": ""}
+            return done
+        current = self._current
+        if current is None:
+            return []  # preamble before the first question
+        if line.startswith(tuple(f"{letter})" for letter in OPTION_LETTERS)):
+            current["options"].append(line)
+        elif line.lower().startswith("correct answer"):
+            ans = line.split(":")[-1].strip()
+            current["correct_answer"] = ans[0].upper() if ans else "A"
+        elif line.lower().startswith("explanation"):
+            current["explanation"] = line.split(":", 1)[-1].strip()
+            self._current = None
+            return [current]
+        return []
+
+
+def parse_quiz(text: str) -> List[Dict]:
+    """All questions in a complete model answer"""
+    parser = QuizStreamParser()
+    return parser.feed(text) + parser.finish()
+
+
+def validate_question(question: Dict) -> Optional[str]:
+    """None if the question can be shown as-is, else what is wrong with it"""
+    if not question.get("question"):
+        return "missing question text"
+    letters = [opt[0] for opt in question.get("options", [])]
+    if letters != list(OPTION_LETTERS):
+        return f"expected options A-D, got {''.join(letters) or 'none'}"
+    answer = question.get("correct_answer") or ""
+    if len(answer) != 1 or answer not in OPTION_LETTERS:
+        return f"invalid correct answer {question.get('correct_answer')!r}"
+    if not question.get("explanation"):
+        return "missing explanation"
+    return None
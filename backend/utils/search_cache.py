@@ -0,0 +1,122 @@
+# backend/utils/search_cache.py
+"""
+YouTube Search Cache - shared by main.py's and agents/youtube_agent.py's YouTubeAgent
+
+Queries are normalized (case, punctuation, whitespace) and cached with a TTL
+and an LRU size bound. Entries past their TTL but within the stale window are
+still served immediately while a background thread refreshes them
+(stale-while-revalidate). Configure with YT_SEARCH_TTL_S, YT_SEARCH_STALE_S
+and YT_SEARCH_CACHE_SIZE.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+_PUNCT = re.compile(r"[^\w\s]+")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(_PUNCT.sub(" ", query.casefold()).split())
+
+
+class _Entry:
+    def __init__(self, results: List[Dict], limit: int):
+        self.results = results
+        self.limit = limit  # max_results the results were fetched with
+        self.fetched_at = time.monotonic()
+        self.refreshing = False
+
+
+class SearchCache:
+    def __init__(self, fetch: Callable[[str, int], List[Dict]], ttl_s: float = 6 * 3600,
+                 stale_s: float = 24 * 3600, max_entries: int = 1000):
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0}
+
+    def _put(self, key: str, results: List[Dict], limit: int):
+        if not results:
+            return  # an empty scrape is more likely a hiccup than a real answer
+        with self._lock:
+            self._entries[key] = _Entry(results, limit)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key: str, query: str, limit: int):
+        try:
+            self._put(key, self.fetch(query, limit), limit)
+            with self._lock:
+                self.stats['refreshes'] += 1
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"⚠️ Background YouTube search refresh failed: {e}")
+        finally:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+
+    def search(self, query: str, max_results: int) -> List[Dict]:
+        key = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            usable = entry is not None and entry.limit >= max_results
+            age = now - entry.fetched_at if usable else None
+            if usable and age < self.ttl_s:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry.results[:max_results]
+            if usable and age < self.ttl_s + self.stale_s:
+                self._entries.move_to_end(key)
+                self.stats['stale_hits'] += 1
+                start_refresh = not entry.refreshing
+                entry.refreshing = True
+                results = entry.results[:max_results]
+            else:
+                self.stats['misses'] += 1
+                start_refresh = None
+
+        if start_refresh is None:
+            limit = max(max_results, entry.limit if entry is not None else 0)
+            results = self.fetch(query, limit)
+            self._put(key, results, limit)
+            return results[:max_results]
+        if start_refresh:
+            threading.Thread(target=self._refresh, args=(key, query, entry.limit), daemon=True).start()
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries))
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def _youtube_fetch(query: str, max_results: int) -> List[Dict]:
+    from youtube_search import YoutubeSearch
+    return YoutubeSearch(f"{query} tutorial explanation", max_results=max_results).to_dict()
+
+
+youtube_search_cache = SearchCache(
+    _youtube_fetch,
+    ttl_s=float(os.getenv("YT_SEARCH_TTL_S", str(6 * 3600))),
+    stale_s=float(os.getenv("YT_SEARCH_STALE_S", str(24 * 3600))),
+    max_entries=int(os.getenv("YT_SEARCH_CACHE_SIZE", "1000")),
+)
+
+
+def cached_youtube_search(query: str, max_results: int) -> List[Dict]:
+    """YoutubeSearch(f"{query} tutorial explanation").to_dict(), via the shared cache"""
+    return youtube_search_cache.search(query, max_results)
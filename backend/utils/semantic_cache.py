@@ -0,0 +1,215 @@
+# backend/utils/semantic_cache.py
+"""
+Semantic Answer Cache - reuse answers to questions that mean the same thing
+
+Questions are embedded locally (no network) as L2-normalized hashed
+features: content words (common AI & DS shorthand canonicalized, so "what's
+backprop" and "explain backpropagation" embed the same), adjacent content
+word pairs so word order counts ("is ReLU better than sigmoid" is not "is
+sigmoid better than ReLU"), plus lightly weighted character 3-5-grams for
+plurals and spelling variants. What the question asks for - a definition, an
+example, a comparison, why, how, a negation - is a separate intent key that
+must match exactly, so "what is overfitting" never returns the answer to
+"give an example of overfitting". Vectors live in one preallocated float32
+matrix and a lookup is a single matrix-vector product, masked to the rows of
+the caller's scope (corpus generation + mode) and intent. An answer is reused
+when the best cosine similarity reaches `threshold`
+(SEMANTIC_CACHE_THRESHOLD). Full cache -> least recently used row is reused.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did what whats what's which who whom how why when where
+can could would should will shall may might must please tell me explain describe define give show
+about of in on for to with by from as at into and or i you we my your it its this that these those
+meaning mean means definition example examples some any difference between vs versus compare
+""".split())
+
+# Spellings of the same concept -> one token (multi-word terms must not lose a word to the stopwords)
+CANONICAL = [(re.compile(p), token) for p, token in (
+    (r"\bback[\s-]?prop(agation)?\b", "backprop"),
+    (r"\bk[\s-]?means\b", "kmeans"),
+    (r"\bk[\s-]?nearest[\s-]neighbou?rs?\b|\bk[\s-]?nn\b", "knn"),
+    (r"\bconvolutional neural net(work)?s?\b", "cnn"),
+    (r"\brecurrent neural net(work)?s?\b", "rnn"),
+    (r"\bneural net(work)?s?\b|\bnn\b", "neuralnet"),
+    (r"\bsupport vector machines?\b", "svm"),
+    (r"\bprincipal component analysis\b", "pca"),
+    (r"\bstochastic gradient descent\b", "sgd"),
+    (r"\bgradient descent\b|\bgd\b", "gradientdescent"),
+    (r"\bnatural language processing\b", "nlp"),
+    (r"\bmachine learning\b", "ml"),
+    (r"\bdeep learning\b", "dl"),
+    (r"\bartificial intelligence\b", "ai"),
+    (r"\blong short[\s-]term memory\b", "lstm"),
+    (r"\bbias[\s-]variance\b", "biasvariance"),
+    (r"isation\b", "ization"),
+)]
+
+# What the question asks for; stopwords above are dropped from the vector, not from the intent
+INTENTS = [(re.compile(p), bit) for p, bit in (
+    (r"\b(whats|what is|what are|what does|define|definition|meaning|means?|explain|describe|tell me about)\b", 1),
+    (r"\b(examples?|instances?|eg|illustrate)\b", 2),
+    (r"\b(differences?|differ|vs|versus|compare|comparison|better|worse|than)\b", 4),
+    (r"\bwhy\b", 8),
+    (r"\bhow\b", 16),
+    (r"\b(not|no|never|without|isnt|arent|dont|doesnt|cant|cannot)\b", 32),
+)]
+
+_WORD = re.compile(r"[a-z0-9]+")
+NGRAM_WEIGHT = 0.5  # per word, spread over its n-grams; whole words dominate
+BIGRAM_WEIGHT = 1.0
+
+
+def content_words(text: str) -> List[str]:
+    text = text.lower().replace("'", "")
+    for pattern, token in CANONICAL:
+        text = pattern.sub(token, text)
+    words = [w for w in _WORD.findall(text) if w not in STOPWORDS]
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+
+_FOLLOW_UP = re.compile(r"\b(it|its|that|this|those|these|they|them|above|again|another|more|previous|earlier|same)\b")
+
+
+def is_follow_up(question: str) -> bool:
+    """Refers back to the conversation ("why is that?", "another example") or has no topic of its own ("why?")"""
+    return bool(_FOLLOW_UP.search(question.lower())) or not content_words(question)
+
+
+def intent(text: str) -> int:
+    """Bitmask of the INTENTS the question expresses (0 = just a topic)"""
+    text = text.lower().replace("'", "")
+    return sum(bit for pattern, bit in INTENTS if pattern.search(text))
+
+
+def _bucket(feature: str, dim: int) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little") % dim
+
+
+def embed(text: str, dim: int = 1024) -> Optional[np.ndarray]:
+    """Hashed word, word pair and char n-gram vector, L2-normalized; None when there is nothing to embed"""
+    vec = np.zeros(dim, dtype=np.float32)
+    words = content_words(text)
+    for a, b in zip(words, words[1:]):
+        vec[_bucket(f"b:{a} {b}", dim)] += BIGRAM_WEIGHT
+    for w in words:
+        vec[_bucket("w:" + w, dim)] += 1.0
+        padded = f"<{w}>"
+        grams = [padded[i:i + n] for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+        for g in grams:
+            vec[_bucket(g, dim)] += NGRAM_WEIGHT / len(grams) ** 0.5
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else None
+
+
+class SemanticCache:
+    def __init__(self, capacity: int = 2048, threshold: float = 0.88, dim: int = 1024, ttl_s: float = 24 * 3600):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dim = dim
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._scope = np.full(capacity, -1, dtype=np.int64)  # -1 = free row
+        self._intent = np.zeros(capacity, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._entries: List[Optional[Dict]] = [None] * capacity
+        self._scope_ids: Dict[Hashable, int] = {}
+        self._next_scope = 0
+        self.stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'inserts': 0, 'evictions': 0, 'expired': 0}
+
+    def _scope_id(self, scope: Hashable) -> int:
+        if scope not in self._scope_ids:
+            self._scope_ids[scope] = self._next_scope
+            self._next_scope += 1
+        return self._scope_ids[scope]
+
+    def lookup(self, question: str, scope: Hashable) -> Optional[Dict]:
+        """Best cached entry in scope with the same intent and similarity >= threshold, as {answer, question, similarity, ...}"""
+        vec = embed(question, self.dim)
+        wants = intent(question)
+        with self._lock:
+            self.stats['lookups'] += 1
+            sid = self._scope_ids.get(scope)
+            if vec is None or sid is None:
+                self.stats['misses'] += 1
+                return None
+            now = time.time()
+            in_scope = self._scope == sid
+            stale = in_scope & (now - self._created > self.ttl_s)
+            if stale.any():
+                self._free(np.flatnonzero(stale))
+                self.stats['expired'] += int(stale.sum())
+                in_scope &= ~stale
+            in_scope &= self._intent == wants
+            if not in_scope.any():
+                self.stats['misses'] += 1
+                return None
+            # One pass over the whole matrix beats gathering the scope's rows first
+            sims = self._vectors @ vec
+            sims[~in_scope] = -1.0
+            row = int(np.argmax(sims))
+            if sims[row] < self.threshold:
+                self.stats['misses'] += 1
+                return None
+            self._last_used[row] = now
+            self.stats['hits'] += 1
+            entry = self._entries[row]
+            entry['hits'] += 1
+            return dict(entry, similarity=round(float(sims[row]), 4))
+
+    def insert(self, question: str, answer: str, scope: Hashable, meta: Optional[Dict] = None):
+        vec = embed(question, self.dim)
+        if vec is None:
+            return
+        with self._lock:
+            free = np.flatnonzero(self._scope == -1)
+            if len(free):
+                row = int(free[0])
+            else:
+                row = int(np.argmin(self._last_used))
+                self.stats['evictions'] += 1
+            now = time.time()
+            self._vectors[row] = vec
+            self._scope[row] = self._scope_id(scope)
+            self._intent[row] = intent(question)
+            self._last_used[row] = self._created[row] = now
+            self._entries[row] = {'question': question, 'answer': answer, 'hits': 0, 'created_at': now, **(meta or {})}
+            self.stats['inserts'] += 1
+
+    def _free(self, rows):
+        self._scope[rows] = -1
+        self._last_used[rows] = 0.0
+        for r in rows:
+            self._entries[int(r)] = None
+
+    def retain(self, keep) -> int:
+        """Drop every entry whose scope fails keep(scope), e.g. after the corpus changed; returns rows freed"""
+        with self._lock:
+            dead = [sid for scope, sid in self._scope_ids.items() if not keep(scope)]
+            rows = np.flatnonzero(np.isin(self._scope, dead)) if dead else np.array([], dtype=np.int64)
+            self._free(rows)
+            for scope in [s for s, sid in self._scope_ids.items() if sid in dead]:
+                del self._scope_ids[scope]
+            return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._free(np.arange(self.capacity))
+            self._scope_ids.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            used = int(np.count_nonzero(self._scope != -1))
+        lookups = self.stats['lookups'] or 1
+        return dict(self.stats, entries=used, capacity=self.capacity, threshold=self.threshold,
+                    hit_rate=round(self.stats['hits'] / lookups, 3))
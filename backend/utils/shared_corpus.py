@@ -0,0 +1,900 @@
+# backend/utils/shared_corpus.py
+"""
+Shared Corpus - uploaded documents and their retrieval index, shared by all workers
+
+Every uploaded document becomes one immutable, versioned binary segment file
+(chunk texts, character offsets, the document text and a sorted term table
+with postings) in CORPUS_DIR, which defaults to backend/data/corpus so uploads
+survive restarts and deploys. Segments are memory-mapped, so every
+`uvicorn --workers N` process reads the same pages without copying them, and
+nothing is parsed at startup: terms are binary-searched in the mapped table
+and pages are only read when a query touches them.
+
+A small manifest lists the live segments under a generation number; any
+worker can publish an upload by writing its segment and then swapping in a
+new manifest (under a file lock), and the other workers notice the new
+generation on their next query.
+
+Deleting or replacing a document only touches that document: its segment is
+moved to the manifest's tombstone list (a replacement gets a fresh segment
+under the same doc_id), and a background compaction removes tombstoned files
+once CORPUS_COMPACT_GRACE_S has passed, so workers still reading them are safe.
+
+Near-duplicate chunks (the same passage in the lecture notes, the slides and
+the textbook) are found at upload time with MinHash/LSH (utils/minhash.py,
+signatures stored as `.minhash` sidecars). A chunk whose shingle Jaccard with
+an already indexed chunk is at least CORPUS_DEDUP_THRESHOLD keeps its text in
+its own segment but gets no postings; the manifest records it under its
+document's 'duplicates', and search hits on the canonical chunk list it in
+'also_in'. If the canonical chunk's document is deleted or replaced, its
+duplicates are matched again, and those left without a match are indexed
+in a rewritten segment.
+
+Documents can be filed into named collections, a course and a unit within
+it (plus the document itself). Each generation keeps partition lists of the
+segments per course, per (course, unit) and per doc_id, so a search with a
+scope ({course, unit, doc_ids}) only touches the postings of the segments in
+that scope, and its cost follows the scope rather than the whole corpus.
+"""
+
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils import minhash
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SEGMENT_MAGIC = b"AITASEG\0"
+SEGMENT_VERSION = 2
+MANIFEST = "manifest.json"
+MANIFEST_FORMAT = 2
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "corpus")
+
+# Segment layout (little endian):
+#   header | chunk table | chunk texts | document text | term table | term bytes | postings
+# magic, version, chunk count, term count, chunk table offset, document text offset/length, term table offset
+_HEADER = struct.Struct("<8sIIIQQQQ")
+# text offset, text length, start, end (character offsets in the document)
+_CHUNK = struct.Struct("<QIQQ")
+# term offset, term length, postings offset, postings count (postings are uint32 chunk ids)
+_TERM = struct.Struct("<QIQI")
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock across processes on `path` (created if missing) for the duration of the block"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def chunk_terms(text: str) -> set:
+    """Same tokenization as main.search_chunks"""
+    return set(text.lower().split())
+
+
+def write_segment(path: str, text: str, chunks: List[Dict], skip=()) -> int:
+    """
+    Serialize a document ({text, start, end} chunks) to an immutable segment file.
+    Chunks in `skip` are stored but not indexed; returns the index bytes that saved.
+    """
+    encoded = [c['text'].encode("utf-8") for c in chunks]
+    postings: Dict[bytes, List[int]] = {}
+    left_out: Dict[bytes, int] = {}
+    for i, c in enumerate(chunks):
+        for term in chunk_terms(c['text']):
+            key = term.encode("utf-8")
+            if i in skip:
+                left_out[key] = left_out.get(key, 0) + 1
+            else:
+                postings.setdefault(key, []).append(i)
+    terms = sorted(postings)  # byte order, for binary search
+    doc_bytes = text.encode("utf-8")
+
+    table_off = _HEADER.size
+    pos = table_off + _CHUNK.size * len(chunks)
+    table = []
+    for c, data in zip(chunks, encoded):
+        table.append(_CHUNK.pack(pos, len(data), c.get('start', 0), c.get('end', 0)))
+        pos += len(data)
+    doc_off = pos
+    terms_off = doc_off + len(doc_bytes)
+    term_pos = terms_off + _TERM.size * len(terms)
+    post_pos = term_pos + sum(len(t) for t in terms)
+    term_table, post_data = [], []
+    for t in terms:
+        ids = postings[t]
+        term_table.append(_TERM.pack(term_pos, len(t), post_pos, len(ids)))
+        post_data.append(struct.pack(f"<{len(ids)}I", *ids))
+        term_pos += len(t)
+        post_pos += 4 * len(ids)
+    header = _HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(chunks), len(terms),
+                          table_off, doc_off, len(doc_bytes), terms_off)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        for part in (header, b"".join(table), b"".join(encoded), doc_bytes,
+                     b"".join(term_table), b"".join(terms), b"".join(post_data)):
+            f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return sum(4 * n + (0 if t in postings else _TERM.size + len(t)) for t, n in left_out.items())
+
+
+class Segment:
+    """Read-only, memory-mapped view of one document; only the header is read up front"""
+
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _HEADER.size or self._mm[:8] != SEGMENT_MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a corpus segment")
+        (_, version, self.n_chunks, self.n_terms, self._table_off, self._doc_off,
+         self._doc_len, self._terms_off) = _HEADER.unpack_from(self._mm, 0)
+        if version != SEGMENT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is segment format v{version}, expected v{SEGMENT_VERSION}")
+
+    def _term(self, i: int) -> Tuple[bytes, int, int]:
+        t_off, t_len, p_off, p_count = _TERM.unpack_from(self._mm, self._terms_off + i * _TERM.size)
+        return self._mm[t_off:t_off + t_len], p_off, p_count
+
+    def postings(self, term: str) -> Tuple[int, ...]:
+        """Chunk ids containing `term`, by binary search over the mapped term table"""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.n_terms:
+            return ()
+        found, p_off, p_count = self._term(lo)
+        if found != key:
+            return ()
+        return struct.unpack_from(f"<{p_count}I", self._mm, p_off)
+
+    def chunk(self, i: int) -> str:
+        off, length, _, _ = _CHUNK.unpack_from(self._mm, self._table_off + i * _CHUNK.size)
+        return self._mm[off:off + length].decode("utf-8")
+
+    def chunk_offsets(self, i: int) -> Tuple[int, int]:
+        _, _, start, end = _CHUNK.unpack_from(self._mm, self._table_off + i * _CHUNK.size)
+        return start, end
+
+    def chunks(self) -> List[str]:
+        return [self.chunk(i) for i in range(self.n_chunks)]
+
+    def text(self) -> str:
+        return self._mm[self._doc_off:self._doc_off + self._doc_len].decode("utf-8")
+
+
+class _Deduper:
+    """Matches new chunks against the canonical chunks of the corpus, and against each other"""
+
+    def __init__(self, threshold: float, index: minhash.LSHIndex, index_lock: threading.Lock,
+                 segments: Dict[str, Segment], versions: Dict[str, str], exclude: Optional[str] = None):
+        self.threshold = threshold
+        self.versions = versions  # doc_id -> segment the matches were made against
+        self.exclude = exclude  # doc_id being replaced; its old chunks are not candidates
+        self._index = index  # the corpus' shared index of published canonical chunks
+        self._index_lock = index_lock
+        self._new = minhash.LSHIndex()  # canonical chunks of this write, not published yet
+        self._segments = segments
+        self._shingles: Dict[Tuple[str, int], np.ndarray] = {}
+        self._pending: Dict[Tuple[str, int], str] = {}  # chunks of documents not published yet
+
+    def _candidates(self, sig: np.ndarray) -> List[Tuple[str, int]]:
+        with self._index_lock:
+            published = self._index.query(sig)
+        # (chunks of documents newer than this write's snapshot are left to the next write)
+        return [k for k in published if k[0] != self.exclude and k[0] in self.versions] + self._new.query(sig)
+
+    def _shingles_of(self, key: Tuple[str, int]) -> np.ndarray:
+        found = self._shingles.get(key)
+        if found is None:
+            text = self._pending.get(key)
+            if text is None:
+                text = self._segments[key[0]].chunk(key[1])
+            found = self._shingles[key] = minhash.shingles(text)
+        return found
+
+    def match(self, doc_id: str, texts: List[str], sigs: np.ndarray,
+              only: Optional[Set[int]] = None) -> Dict[int, Tuple[str, int]]:
+        """{chunk: (doc_id, chunk) of its canonical copy}; unmatched chunks join the index"""
+        duplicates = {}
+        for i, text in enumerate(texts):
+            if only is not None and i not in only:
+                continue
+            own = minhash.shingles(text)
+            best, best_sim = None, 0.0
+            if len(own):
+                for cand in self._candidates(sigs[i]):
+                    sim = minhash.jaccard(own, self._shingles_of(cand))
+                    if sim >= self.threshold and sim > best_sim:
+                        best, best_sim = cand, sim
+            if best is not None:
+                duplicates[i] = best
+            else:
+                key = (doc_id, i)
+                self._new.add(key, sigs[i])
+                self._pending[key] = text
+                self._shingles[key] = own
+        return duplicates
+
+
+def _without_dedup(entry: Dict) -> Dict:
+    return {k: v for k, v in entry.items() if k not in ('duplicates', 'index_bytes_saved')}
+
+
+def _collection_fields(course: Optional[str], unit: Optional[str]) -> Dict:
+    return {k: v for k, v in (('course', course), ('unit', unit)) if v}
+
+
+def _dedup_fields(duplicates: Dict[int, Tuple[str, int]], saved: int) -> Dict:
+    if not duplicates:
+        return {}
+    return {'duplicates': {str(i): list(ref) for i, ref in sorted(duplicates.items())}, 'index_bytes_saved': saved}
+
+
+class SharedCorpus:
+    def __init__(self, root: Optional[str] = None, compact_grace_s: float = 30.0, dedup_threshold: float = 0.0):
+        self.root = root or DEFAULT_DIR
+        self.compact_grace_s = compact_grace_s
+        self.dedup_threshold = dedup_threshold
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest_path = os.path.join(self.root, MANIFEST)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.generation = 0
+        self._docs: List[Dict] = []
+        self._segments: Dict[str, Segment] = {}
+        self._outlines: Dict[str, Dict] = {}  # segment name -> outline
+        self._signatures: Dict[str, np.ndarray] = {}  # segment name -> MinHash signatures
+        self._lsh = minhash.LSHIndex()  # canonical chunks of the live documents, kept up to date
+        self._lsh_docs: Dict[str, Tuple[str, List]] = {}  # doc_id -> (segment, [(key, signature)]) in _lsh
+        self._lsh_lock = threading.Lock()
+        self._aliases: Dict[Tuple[str, int], List[Dict]] = {}  # canonical chunk -> its duplicates
+        self._partitions: Dict[str, Dict] = {'course': {}, 'unit': {}, 'doc': {}}  # -> corpus positions
+        self._compact_timer: Optional[threading.Timer] = None
+        self.stats = {'searches': 0, 'reloads': 0, 'published': 0, 'deleted': 0, 'replaced': 0,
+                      'compactions': 0, 'files_removed': 0, 'duplicates_rehomed': 0, 'duplicate_hits_folded': 0,
+                      'scoped_searches': 0, 'segments_scanned': 0}
+        t0 = time.perf_counter()
+        self.refresh()
+        self.stats['load_ms'] = round((time.perf_counter() - t0) * 1000, 2)
+        if self._docs:
+            print(f"📚 Corpus: {len(self._docs)} documents, {sum(d['chunks'] for d in self._docs)} chunks "
+                  f"mapped from {self.root} in {self.stats['load_ms']:.1f} ms")
+
+    # -------------------------
+    # Manifest / cross-process sync
+    # -------------------------
+    def _write_lock(self):
+        """Exclusive lock across processes while the manifest is rewritten"""
+        return file_lock(os.path.join(self.root, "manifest.lock"))
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {'format': MANIFEST_FORMAT, 'generation': 0, 'documents': []}
+        if manifest.get('format') != MANIFEST_FORMAT:
+            # Written by an older build: keep the generation moving forward, drop the documents
+            print(f"⚠️ Corpus manifest in {self.root} has an incompatible format; starting empty")
+            return {'format': MANIFEST_FORMAT, 'generation': manifest.get('generation', 0), 'documents': []}
+        return manifest
+
+    def _write_manifest(self, manifest: Dict):
+        """Durable atomic swap: the new manifest (and the segments it names) survives a crash, or the old one stays"""
+        tmp = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path)
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        """Persist the directory entries (renamed manifest, new segment files); no-op where unsupported (Windows)"""
+        if fcntl is None:
+            return
+        fd = os.open(self.root, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def refresh(self):
+        """Pick up documents published by other workers (one stat() when nothing changed)"""
+        try:
+            st = os.stat(self._manifest_path)
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            self._apply(self._read_manifest())
+            self._stamp = stamp
+
+    def _apply(self, manifest: Dict):
+        segments = {}
+        docs = []
+        for d in manifest['documents']:
+            seg = self._segments.get(d['doc_id'])
+            if seg is None or seg.name != d['segment']:
+                try:
+                    seg = Segment(os.path.join(self.root, d['segment']))
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ Skipping corpus segment {d['segment']}: {e}")
+                    continue
+            segments[d['doc_id']] = seg
+            docs.append(d)
+        # Dropped segments are unmapped once no in-progress search still holds them
+        self._segments = segments
+        live = {seg.name for seg in segments.values()}
+        self._outlines = {k: v for k, v in self._outlines.items() if k in live}
+        self._signatures = {k: v for k, v in self._signatures.items() if k in live}
+        aliases: Dict[Tuple[str, int], List[Dict]] = {}
+        for d in docs:
+            for i, (canon_doc, canon_chunk) in d.get('duplicates', {}).items():
+                aliases.setdefault((canon_doc, canon_chunk), []).append(
+                    {'doc_id': d['doc_id'], 'filename': d['filename'], 'chunk': int(i)})
+        self._aliases = aliases
+        partitions = {'course': {}, 'unit': {}, 'doc': {}}
+        for order, d in enumerate(docs):
+            partitions['course'].setdefault(d.get('course'), []).append(order)
+            partitions['unit'].setdefault((d.get('course'), d.get('unit')), []).append(order)
+            partitions['doc'][d['doc_id']] = order
+        self._partitions = partitions
+        self._docs = docs
+        self.generation = manifest['generation']
+        self.stats['reloads'] += 1
+
+    # -------------------------
+    # Writes (any worker)
+    # -------------------------
+    def add_document(self, filename: str, text: str, chunks: List[Dict],
+                     course: Optional[str] = None, unit: Optional[str] = None) -> Dict:
+        """Write a segment for the document and publish it in a new generation"""
+        return self.add_documents([(filename, text, chunks)], course=course, unit=unit)[0]
+
+    def add_documents(self, documents: List[Tuple[str, str, List[Dict]]],
+                      course: Optional[str] = None, unit: Optional[str] = None) -> List[Dict]:
+        """Write a segment per (filename, text, chunks) and publish them all in one generation"""
+        deduper = self._deduper()
+        entries = []
+        for filename, text, chunks in documents:
+            doc_id = uuid.uuid4().hex[:12]
+            segment = f"doc-{doc_id}.seg"
+            entries.append({
+                'doc_id': doc_id,
+                'filename': filename,
+                'uploaded_at': time.time(),
+                'chunks': len(chunks),
+                'segment': segment,
+                **_collection_fields(course, unit),
+                **self._write_document(doc_id, segment, text, chunks, deduper),
+            })
+        if not entries:
+            return []
+        with self._write_lock():
+            manifest = self._read_manifest()
+            stale = self._stale_matches(manifest, entries, deduper)
+            manifest['generation'] += 1
+            manifest['documents'].extend(entries)
+            self._write_manifest(manifest)
+        self.stats['published'] += len(entries)
+        self.refresh()
+        self._rehome_duplicates(stale)
+        return entries
+
+    def _tombstone(self, manifest: Dict, entries: List[Dict]):
+        now = time.time()
+        manifest.setdefault('tombstones', []).extend(
+            {'doc_id': d['doc_id'], 'segment': d['segment'], 'deleted_at': now} for d in entries
+        )
+
+    def delete_document(self, doc_id: str) -> Optional[Dict]:
+        """Unpublish one document; its files are removed by the next compaction"""
+        with self._write_lock():
+            manifest = self._read_manifest()
+            entry = next((d for d in manifest['documents'] if d['doc_id'] == doc_id), None)
+            if entry is None:
+                return None
+            manifest['documents'] = [d for d in manifest['documents'] if d['doc_id'] != doc_id]
+            manifest['generation'] += 1
+            self._tombstone(manifest, [entry])
+            self._write_manifest(manifest)
+        self.stats['deleted'] += 1
+        self.refresh()
+        self._rehome_duplicates({doc_id})
+        self._schedule_compaction()
+        return entry
+
+    def replace_document(self, doc_id: str, filename: str, text: str, chunks: List[Dict]) -> Optional[Dict]:
+        """Swap in new content under the same doc_id (and corpus position); None if doc_id is unknown"""
+        if not any(d['doc_id'] == doc_id for d in self._snapshot()[0]):
+            return None
+        segment = f"doc-{doc_id}-{uuid.uuid4().hex[:8]}.seg"
+        deduper = self._deduper(exclude=doc_id)
+        fields = self._write_document(doc_id, segment, text, chunks, deduper)
+        stale = {doc_id}
+        with self._write_lock():
+            manifest = self._read_manifest()
+            docs = manifest['documents']
+            pos = next((i for i, d in enumerate(docs) if d['doc_id'] == doc_id), None)
+            if pos is None:  # deleted by another worker meanwhile
+                self._tombstone(manifest, [{'doc_id': doc_id, 'segment': segment}])
+                self._write_manifest(manifest)
+                entry = None
+            else:
+                old = docs[pos]
+                entry = dict(_without_dedup(old), filename=filename, chunks=len(chunks), segment=segment,
+                             updated_at=time.time(), **fields)
+                stale |= self._stale_matches(manifest, [entry], deduper)
+                docs[pos] = entry
+                manifest['generation'] += 1
+                self._tombstone(manifest, [old])
+                self._write_manifest(manifest)
+        if entry is not None:
+            self.stats['replaced'] += 1
+        self.refresh()
+        self._rehome_duplicates(stale)
+        self._schedule_compaction()
+        return entry
+
+    def set_collection(self, doc_id: str, course: Optional[str], unit: Optional[str]) -> Optional[Dict]:
+        """File a document under a course/unit (None removes it); only the manifest changes"""
+        with self._write_lock():
+            manifest = self._read_manifest()
+            docs = manifest['documents']
+            pos = next((i for i, d in enumerate(docs) if d['doc_id'] == doc_id), None)
+            if pos is None:
+                return None
+            entry = {k: v for k, v in docs[pos].items() if k not in ('course', 'unit')}
+            entry.update(_collection_fields(course, unit))
+            docs[pos] = entry
+            manifest['generation'] += 1
+            self._write_manifest(manifest)
+        self.refresh()
+        return entry
+
+    def clear(self) -> int:
+        with self._write_lock():
+            manifest = self._read_manifest()
+            removed = manifest['documents']
+            manifest['documents'] = []
+            manifest['generation'] += 1
+            self._tombstone(manifest, removed)
+            self._write_manifest(manifest)
+        self.refresh()
+        self._schedule_compaction()
+        return len(removed)
+
+    # -------------------------
+    # Near-duplicate chunks
+    # -------------------------
+    def _minhash_path(self, segment: str) -> str:
+        return os.path.join(self.root, f"{segment}.minhash")
+
+    def _store_signatures(self, segment: str, sigs: np.ndarray):
+        path = self._minhash_path(segment)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        sigs.tofile(tmp)
+        os.replace(tmp, path)
+        with self._lock:
+            self._signatures[segment] = sigs
+
+    def _segment_signatures(self, seg: Segment) -> np.ndarray:
+        """A segment's chunk signatures, from its sidecar (computed and stored if missing)"""
+        sigs = self._signatures.get(seg.name)
+        if sigs is not None:
+            return sigs
+        try:
+            sigs = np.fromfile(self._minhash_path(seg.name), dtype=np.uint32).reshape(-1, minhash.NUM_PERM)
+        except (OSError, ValueError):
+            sigs = None
+        if sigs is None or len(sigs) != seg.n_chunks:
+            sigs = minhash.signatures(seg.chunks())
+            self._store_signatures(seg.name, sigs)
+        with self._lock:
+            self._signatures[seg.name] = sigs
+        return sigs
+
+    def _sync_lsh(self, docs: List[Dict], segments: Dict[str, Segment]):
+        """
+        Bring the shared LSH index in line with `docs`. Only documents whose
+        segment changed (published, replaced, rehomed or deleted, by any worker)
+        are added or removed; a segment's canonical chunks never change.
+        """
+        live = {d['doc_id']: d['segment'] for d in docs}
+        with self._lsh_lock:
+            for doc_id, (segment, keys) in list(self._lsh_docs.items()):
+                if live.get(doc_id) != segment:
+                    for key, sig in keys:
+                        self._lsh.remove(key, sig)
+                    del self._lsh_docs[doc_id]
+            for d in docs:
+                if d['doc_id'] in self._lsh_docs:
+                    continue
+                seg = segments[d['doc_id']]
+                sigs = self._segment_signatures(seg)
+                duplicates = d.get('duplicates', {})
+                keys = [((d['doc_id'], i), sigs[i]) for i in range(seg.n_chunks) if str(i) not in duplicates]
+                for key, sig in keys:
+                    self._lsh.add(key, sig)
+                self._lsh_docs[d['doc_id']] = (d['segment'], keys)
+
+    def _deduper(self, exclude: Optional[str] = None) -> Optional[_Deduper]:
+        """Matcher against the canonical chunks of every live document (None if dedup is off)"""
+        if not self.dedup_threshold:
+            return None
+        docs, segments = self._snapshot()
+        self._sync_lsh(docs, segments)
+        return _Deduper(self.dedup_threshold, self._lsh, self._lsh_lock, segments,
+                        {d['doc_id']: d['segment'] for d in docs if d['doc_id'] != exclude}, exclude=exclude)
+
+    def _write_document(self, doc_id: str, segment: str, text: str, chunks: List[Dict],
+                        deduper: Optional[_Deduper]) -> Dict:
+        """Write the segment, leaving near-duplicate chunks unindexed; returns the entry's dedup fields"""
+        path = os.path.join(self.root, segment)
+        if deduper is None:
+            write_segment(path, text, chunks)
+            return {}
+        texts = [c['text'] for c in chunks]
+        sigs = minhash.signatures(texts)
+        duplicates = deduper.match(doc_id, texts, sigs)
+        saved = write_segment(path, text, chunks, skip=duplicates)
+        self._store_signatures(segment, sigs)
+        return _dedup_fields(duplicates, saved)
+
+    @staticmethod
+    def _stale_matches(manifest: Dict, entries: List[Dict], deduper: Optional[_Deduper]) -> Set[str]:
+        """Canonical documents the entries point at that were deleted or replaced since matching"""
+        if deduper is None:
+            return set()
+        live = {d['doc_id']: d['segment'] for d in manifest['documents']}
+        return {
+            canon_doc
+            for e in entries
+            for canon_doc, _ in e.get('duplicates', {}).values()
+            if canon_doc in deduper.versions and live.get(canon_doc) != deduper.versions[canon_doc]
+        }
+
+    def _rehome_duplicates(self, gone: Set[str]):
+        """Duplicates of chunks in deleted/replaced documents find a new canonical copy or get indexed"""
+        for d in self._snapshot()[0]:
+            # (references within a document were matched against its current version)
+            dangling = {int(i) for i, (canon_doc, _) in d.get('duplicates', {}).items()
+                        if canon_doc in gone and canon_doc != d['doc_id']}
+            if dangling:
+                self._rehome(d, dangling)
+
+    def _rehome(self, d: Dict, dangling: Set[int]):
+        seg = self._snapshot()[1].get(d['doc_id'])
+        if seg is None or seg.name != d['segment']:
+            return  # replaced or deleted meanwhile; that write rematched it
+        kept = {int(i): tuple(ref) for i, ref in d['duplicates'].items() if int(i) not in dangling}
+        deduper = self._deduper()
+        matched = {}
+        if deduper is not None:
+            matched = deduper.match(d['doc_id'], seg.chunks(), self._segment_signatures(seg), only=dangling)
+        duplicates = {**kept, **matched}
+        promoted = dangling - set(matched)
+        segment, saved = d['segment'], d.get('index_bytes_saved', 0)
+        if promoted:
+            # Same chunks and positions, so references to this document's chunks stay valid
+            segment = f"doc-{d['doc_id']}-{uuid.uuid4().hex[:8]}.seg"
+            chunks = [dict(zip(('start', 'end'), seg.chunk_offsets(i)), text=seg.chunk(i)) for i in range(seg.n_chunks)]
+            saved = write_segment(os.path.join(self.root, segment), seg.text(), chunks, skip=duplicates)
+            for sidecar in (self._minhash_path, self._outline_path):
+                if os.path.exists(sidecar(seg.name)):
+                    shutil.copyfile(sidecar(seg.name), sidecar(segment))
+        with self._write_lock():
+            manifest = self._read_manifest()
+            docs = manifest['documents']
+            pos = next((i for i, e in enumerate(docs) if e['doc_id'] == d['doc_id']), None)
+            if pos is None or docs[pos]['segment'] != d['segment']:
+                if promoted:
+                    self._tombstone(manifest, [{'doc_id': d['doc_id'], 'segment': segment}])
+                    self._write_manifest(manifest)
+                return
+            old = docs[pos]
+            docs[pos] = dict(_without_dedup(old), segment=segment, **_dedup_fields(duplicates, saved))
+            manifest['generation'] += 1
+            if promoted:
+                self._tombstone(manifest, [old])
+            self._write_manifest(manifest)
+        self.stats['duplicates_rehomed'] += len(dangling)
+        self.refresh()
+
+    # -------------------------
+    # Compaction
+    # -------------------------
+    def _schedule_compaction(self):
+        """Run compact() once the grace period for the newest tombstone is over"""
+        with self._lock:
+            if self._compact_timer is None:
+                self._compact_timer = threading.Timer(self.compact_grace_s + 0.5, self._run_compaction)
+                self._compact_timer.daemon = True
+                self._compact_timer.start()
+
+    def _run_compaction(self):
+        with self._lock:
+            self._compact_timer = None
+        try:
+            if self.compact()['pending']:
+                self._schedule_compaction()
+        except Exception as e:
+            print(f"⚠️ Corpus compaction failed: {e}")
+
+    def compact(self, grace_s: Optional[float] = None) -> Dict:
+        """Delete the files of tombstones older than the grace period; returns counts"""
+        grace_s = self.compact_grace_s if grace_s is None else grace_s
+        cutoff = time.time() - grace_s
+        removed = 0
+        with self._write_lock():
+            manifest = self._read_manifest()
+            tombstones = manifest.get('tombstones', [])
+            if not tombstones:
+                return {'removed': 0, 'pending': 0}
+            live = {d['segment'] for d in manifest['documents']}
+            keep = []
+            for t in tombstones:
+                if t['deleted_at'] > cutoff or t['segment'] in live:
+                    keep.append(t)
+                    continue
+                try:
+                    for path in (os.path.join(self.root, t['segment']), self._outline_path(t['segment']),
+                                 self._minhash_path(t['segment'])):
+                        if os.path.exists(path):
+                            os.remove(path)
+                            removed += 1
+                except OSError:
+                    keep.append(t)  # still mapped by another process (Windows); try again later
+            manifest['tombstones'] = keep
+            self._write_manifest(manifest)
+        self.stats['compactions'] += 1
+        self.stats['files_removed'] += removed
+        return {'removed': removed, 'pending': len(keep)}
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def _snapshot(self) -> Tuple[List[Dict], Dict[str, Segment]]:
+        self.refresh()
+        with self._lock:
+            return list(self._docs), dict(self._segments)
+
+    def _view(self) -> Tuple[List[Dict], Dict[str, Segment], Dict[str, Dict], Dict[Tuple[str, int], List[Dict]]]:
+        """_snapshot() plus the partitions and duplicate references of the same generation"""
+        self.refresh()
+        with self._lock:
+            return list(self._docs), dict(self._segments), self._partitions, self._aliases
+
+    @staticmethod
+    def _select(docs: List[Dict], partitions: Dict[str, Dict], scope: Optional[Dict]) -> List[int]:
+        """
+        Corpus positions of the documents in `scope` ({course, unit, doc_ids}, all
+        optional; None is the whole corpus), found through the partition lists.
+        """
+        if not scope:
+            return list(range(len(docs)))
+        course, unit, doc_ids = scope.get('course'), scope.get('unit'), scope.get('doc_ids')
+        if doc_ids is not None:
+            orders = [partitions['doc'][i] for i in doc_ids if i in partitions['doc']]
+            orders = [o for o in orders if (course is None or docs[o].get('course') == course)
+                      and (unit is None or docs[o].get('unit') == unit)]
+        elif unit is not None:
+            orders = [o for (c, u), part in partitions['unit'].items()
+                      if u == unit and (course is None or c == course) for o in part]
+        elif course is not None:
+            orders = partitions['course'].get(course, [])
+        else:
+            return list(range(len(docs)))
+        return sorted(set(orders))
+
+    def documents(self, scope: Optional[Dict] = None) -> List[Dict]:
+        docs, _, partitions, _ = self._view()
+        return [{k: docs[o].get(k) for k in ('doc_id', 'filename', 'uploaded_at', 'updated_at', 'chunks', 'course', 'unit')}
+                for o in self._select(docs, partitions, scope)]
+
+    def collections(self) -> List[Dict]:
+        """[{course, units: [{unit, documents, chunks}], documents, chunks}]; None is 'not filed'"""
+        courses: Dict[Optional[str], Dict] = {}
+        for d in self._snapshot()[0]:
+            course = courses.setdefault(d.get('course'), {'course': d.get('course'), 'units': {}, 'documents': 0, 'chunks': 0})
+            unit = course['units'].setdefault(d.get('unit'), {'unit': d.get('unit'), 'documents': 0, 'chunks': 0})
+            for counts in (course, unit):
+                counts['documents'] += 1
+                counts['chunks'] += d['chunks']
+        return [dict(c, units=list(c['units'].values())) for c in courses.values()]
+
+    def __len__(self) -> int:
+        return len(self._snapshot()[0])
+
+    def all_chunks(self) -> List[str]:
+        docs, segments = self._snapshot()
+        return [c for d in docs for c in segments[d['doc_id']].chunks()]
+
+    def document_chunks(self, doc_id: str) -> Optional[List[str]]:
+        docs, segments = self._snapshot()
+        seg = segments.get(doc_id)
+        return seg.chunks() if seg is not None else None
+
+    def search(self, query: str, top_k: int = 3, scope: Optional[Dict] = None) -> List[str]:
+        """
+        Rank chunks by how many distinct query terms they contain, like
+        main.search_chunks, but via the postings so only matching chunks are touched.
+        """
+        return [h['text'] for h in self.search_hits(query, top_k, scope)]
+
+    def search_hits(self, query: str, top_k: int = 3, scope: Optional[Dict] = None) -> List[Dict]:
+        """
+        search() with provenance: [{doc_id, filename, chunk, score, text}], plus
+        'also_in' [{doc_id, filename, chunk}] on chunks that have near-duplicates.
+        With a scope, only the segments of the documents in it are searched.
+        """
+        docs, segments, partitions, aliases = self._view()
+        selected = self._select(docs, partitions, scope)
+        in_scope = {docs[o]['doc_id'] for o in selected} if scope else None
+        self.stats['searches'] += 1
+        self.stats['scoped_searches'] += bool(scope)
+        self.stats['segments_scanned'] += len(selected)
+        terms = chunk_terms(query)
+        scores: Dict[Tuple[int, int], int] = {}
+        # Unindexed duplicates in scope whose canonical chunk is outside it:
+        # canonical doc_id -> {canonical chunk: (order, chunk) of the copy in scope}
+        borrowed: Dict[str, Dict[int, Tuple[int, int]]] = {}
+        for order in selected:
+            d = docs[order]
+            seg = segments[d['doc_id']]
+            for term in terms:
+                for i in seg.postings(term):
+                    key = (order, i)
+                    scores[key] = scores.get(key, 0) + 1
+            if in_scope is not None:
+                for i, (canon_doc, canon_chunk) in d.get('duplicates', {}).items():
+                    if canon_doc not in in_scope:
+                        borrowed.setdefault(canon_doc, {}).setdefault(canon_chunk, (order, int(i)))
+        for canon_doc, copies in borrowed.items():
+            seg = segments.get(canon_doc)
+            for term in (terms if seg is not None else ()):
+                for i in seg.postings(term):
+                    key = copies.get(i)
+                    if key is not None:
+                        scores[key] = scores.get(key, 0) + 1
+        canonical = {key: (canon_doc, canon_chunk) for canon_doc, copies in borrowed.items()
+                     for canon_chunk, key in copies.items()}
+        # Highest overlap first; ties keep corpus order (as the linear scan did)
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_k]
+        hits = []
+        for (order, i), score in ranked:
+            doc_id = docs[order]['doc_id']
+            hit = {
+                'doc_id': doc_id,
+                'filename': docs[order]['filename'],
+                'chunk': i,
+                'score': score,
+                'text': segments[doc_id].chunk(i),
+            }
+            also_in = aliases.get(canonical.get((order, i), (doc_id, i)), [])
+            if in_scope is not None:
+                also_in = [a for a in also_in if a['doc_id'] in in_scope and (a['doc_id'], a['chunk']) != (doc_id, i)]
+            if also_in:
+                hit['also_in'] = also_in
+                self.stats['duplicate_hits_folded'] += len(also_in)
+            hits.append(hit)
+        return hits
+
+    # -------------------------
+    # Outlines (JSON sidecars next to the segments)
+    # -------------------------
+    def _outline_path(self, segment: str) -> str:
+        return os.path.join(self.root, f"{segment}.outline.json")
+
+    def set_outline(self, segment: str, outline: Dict):
+        """Store the outline of one segment (i.e. one version of a document)"""
+        path = self._outline_path(segment)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(outline, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        with self._lock:
+            self._outlines[segment] = outline
+
+    def get_outline(self, doc_id: str) -> Optional[Dict]:
+        """The current version's outline, or None while it is still being built (or failed)"""
+        seg = self._snapshot()[1].get(doc_id)
+        if seg is None:
+            return None
+        outline = self._outlines.get(seg.name)
+        if outline is not None:
+            return outline
+        try:
+            with open(self._outline_path(seg.name), encoding="utf-8") as f:
+                outline = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._outlines[seg.name] = outline
+        return outline
+
+    def outline_entry(self, doc_id: str, chunk: int) -> Optional[Dict]:
+        outline = self.get_outline(doc_id)
+        if not outline or chunk >= len(outline['chunks']):
+            return None
+        return outline['chunks'][chunk]
+
+    def get_stats(self) -> Dict:
+        docs, segments = self._snapshot()
+        return dict(
+            self.stats,
+            root=self.root,
+            generation=self.generation,
+            documents=len(docs),
+            chunks=sum(d['chunks'] for d in docs),
+            courses=len({d.get('course') for d in docs if d.get('course')}),
+            mapped_bytes=sum(len(s._mm) for s in segments.values()),
+            tombstones=len(self._read_manifest().get('tombstones', [])),
+            dedup={
+                'threshold': self.dedup_threshold,
+                'duplicate_chunks': sum(len(d.get('duplicates', {})) for d in docs),
+                'index_bytes_saved': sum(d.get('index_bytes_saved', 0) for d in docs),
+            },
+        )
+
+
+_default_corpus: Optional[SharedCorpus] = None
+_default_lock = threading.Lock()
+
+
+def get_shared_corpus() -> SharedCorpus:
+    """Process-wide handle on the corpus in CORPUS_DIR"""
+    global _default_corpus
+    with _default_lock:
+        if _default_corpus is None:
+            _default_corpus = SharedCorpus(os.getenv("CORPUS_DIR") or None,
+                                           compact_grace_s=float(os.getenv("CORPUS_COMPACT_GRACE_S", "30")),
+                                           dedup_threshold=float(os.getenv("CORPUS_DEDUP_THRESHOLD", "0.8")))
+        return _default_corpus
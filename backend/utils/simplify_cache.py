@@ -0,0 +1,93 @@
+# backend/utils/simplify_cache.py
+"""
+Simplify Cache - simplified rewrites keyed by the hash of the original answer
+
+With speculation on, a rewrite is started in the background as soon as a
+normal answer is produced, so when the student says "simplify" the result is
+usually ready (or at least already in flight) and repeat requests for the
+same answer never pay for a second Gemini call.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+def answer_key(text: str) -> str:
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+class SimplifyCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._done: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            'hits': 0,
+            'joined_in_flight': 0,
+            'misses': 0,
+            'speculative_started': 0,
+            'speculative_skipped': 0,
+            'speculative_failed': 0,
+        }
+
+    def _store(self, key: str, simplified: str):
+        self._done[key] = simplified
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    def _launch(self, key: str, produce: Callable[[], Awaitable[Optional[str]]]) -> asyncio.Task:
+        async def run():
+            try:
+                simplified = await produce()
+                if simplified:
+                    self._store(key, simplified)
+                return simplified
+            finally:
+                self._pending.pop(key, None)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._pending[key] = task
+        return task
+
+    def speculate(self, original: str, produce: Callable[[], Awaitable[Optional[str]]]):
+        """Start a background rewrite of `original` unless one is cached or running"""
+        key = answer_key(original)
+        if key in self._done or key in self._pending:
+            return
+        self.stats['speculative_started'] += 1
+        task = self._launch(key, produce)
+
+        def log_failure(t: asyncio.Task):
+            if not t.cancelled() and t.exception() is not None:
+                self.stats['speculative_failed'] += 1
+                print(f"⚠️ Speculative simplify failed: {t.exception()}")
+
+        task.add_done_callback(log_failure)
+
+    async def get_or_create(self, original: str, produce: Callable[[], Awaitable[Optional[str]]]) -> Tuple[Optional[str], str]:
+        """
+        Return (simplified_text, source) where source is 'cache', 'in_flight' or 'fresh'.
+        `produce` returns None when it could not rewrite; that result is not cached.
+        """
+        key = answer_key(original)
+        if key in self._done:
+            self._done.move_to_end(key)
+            self.stats['hits'] += 1
+            return self._done[key], 'cache'
+        task = self._pending.get(key)
+        if task is not None:
+            self.stats['joined_in_flight'] += 1
+            try:
+                simplified = await asyncio.shield(task)
+                if simplified:
+                    return simplified, 'in_flight'
+            except Exception:
+                pass  # the speculative run failed or was skipped; do it ourselves below
+        self.stats['misses'] += 1
+        return await self._launch(key, produce), 'fresh'
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, cached=len(self._done), in_flight=len(self._pending))
@@ -0,0 +1,135 @@
+# backend/utils/speech_to_text.py
+"""
+Speech-to-Text - pluggable, incremental recognizers for streamed audio
+
+A Recognizer opens one RecognizerStream per utterance. Audio frames are fed
+to the stream as they arrive and it returns its current partial transcript,
+so callers can act on the question before the student stops speaking.
+
+Pick the recognizer with STT_PROVIDER:
+- stub (default): deterministic, no audio at all - every frame is UTF-8 text.
+  Used by tests and benchmarks, and by clients that already transcribe.
+- whisper: local openai-whisper on 16 kHz mono 16-bit PCM frames
+  (optional dependency; model from STT_WHISPER_MODEL, default "base").
+"""
+
+import codecs
+import os
+from typing import Optional
+
+SAMPLE_RATE = 16000
+
+
+class RecognizerStream:
+    """One utterance in progress"""
+
+    def accept(self, frame: bytes) -> Optional[str]:
+        """Consume an audio frame; return the partial transcript if it changed"""
+        raise NotImplementedError
+
+    def finish(self) -> str:
+        """End of speech; return the final transcript"""
+        raise NotImplementedError
+
+
+class Recognizer:
+    name = "base"
+
+    def start_stream(self) -> RecognizerStream:
+        raise NotImplementedError
+
+
+# -------------------------
+# Stub (deterministic)
+# -------------------------
+class _StubStream(RecognizerStream):
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._text = ""
+        self._last = ""
+
+    def _partial(self) -> str:
+        return " ".join(self._text.split())
+
+    def accept(self, frame: bytes) -> Optional[str]:
+        self._text += self._decoder.decode(frame)
+        partial = self._partial()
+        if partial == self._last:
+            return None
+        self._last = partial
+        return partial
+
+    def finish(self) -> str:
+        self._text += self._decoder.decode(b"", final=True)
+        return self._partial()
+
+
+class StubRecognizer(Recognizer):
+    """Treats each frame as the UTF-8 text of what was said"""
+    name = "stub"
+
+    def start_stream(self) -> RecognizerStream:
+        return _StubStream()
+
+
+# -------------------------
+# Whisper (optional)
+# -------------------------
+class _WhisperStream(RecognizerStream):
+    def __init__(self, recognizer: "WhisperRecognizer"):
+        self._rec = recognizer
+        self._audio = bytearray()
+        self._decoded_bytes = 0
+        self._last = ""
+
+    def _transcribe(self) -> str:
+        np = self._rec.np
+        audio = np.frombuffer(bytes(self._audio), dtype=np.int16).astype(np.float32) / 32768.0
+        result = self._rec.model.transcribe(audio, fp16=False, language=self._rec.language)
+        return " ".join(result.get("text", "").split())
+
+    def accept(self, frame: bytes) -> Optional[str]:
+        self._audio.extend(frame)
+        # Re-decode the utterance once enough new audio has arrived
+        if len(self._audio) - self._decoded_bytes < self._rec.partial_every_bytes:
+            return None
+        usable = len(self._audio) - len(self._audio) % 2
+        self._decoded_bytes = usable
+        partial = self._transcribe()
+        if partial == self._last:
+            return None
+        self._last = partial
+        return partial
+
+    def finish(self) -> str:
+        if len(self._audio) % 2:
+            del self._audio[-1]
+        return self._transcribe() if self._audio else ""
+
+
+class WhisperRecognizer(Recognizer):
+    name = "whisper"
+
+    def __init__(self, model_name: str = "base", language: Optional[str] = "en", partial_every_s: float = 1.0):
+        import numpy as np
+        import whisper
+
+        self.np = np
+        self.model = whisper.load_model(model_name)
+        self.language = language
+        self.partial_every_bytes = int(partial_every_s * SAMPLE_RATE) * 2
+
+
+def get_recognizer(kind: Optional[str] = None) -> Recognizer:
+    """Build the recognizer named by STT_PROVIDER (falls back to the stub)"""
+    kind = (kind or os.getenv("STT_PROVIDER", "stub")).lower()
+    if kind == "whisper":
+        try:
+            rec = WhisperRecognizer(model_name=os.getenv("STT_WHISPER_MODEL", "base"))
+            print(f"✅ Speech-to-text: whisper ({os.getenv('STT_WHISPER_MODEL', 'base')})")
+            return rec
+        except Exception as e:
+            print(f"⚠️ Whisper recognizer unavailable ({e}); using the stub recognizer")
+    elif kind != "stub":
+        print(f"⚠️ Unknown STT_PROVIDER '{kind}'; using the stub recognizer")
+    return StubRecognizer()
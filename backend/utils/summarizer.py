@@ -0,0 +1,158 @@
+# backend/utils/summarizer.py
+"""
+Summarizer - hierarchical (map-reduce) summaries with a per-chunk cache
+
+Map: every chunk is summarized on its own, at most `max_concurrency` Gemini
+calls at a time. Reduce: the partial summaries are merged `fan_in` at a time,
+round after round, until one summary is left. Every partial summary (map and
+reduce) is cached by the hash of its input, so re-summarizing a document, or a
+text that shares chunks with one seen before, only pays for what is new.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+SUMMARY_STYLES = {
+    'detailed': "a detailed study summary covering every main concept, definition and example",
+    'brief': "a brief summary of 3-5 sentences with only the most important ideas",
+    'bullet': "a bullet-point summary, one key idea per bullet",
+}
+
+
+def map_prompt(chunk: str, summary_type: str) -> str:
+    return f"""You are helping AI & DS students revise their syllabus.
+Write {SUMMARY_STYLES[summary_type]} of this part of the material.
+Keep technical terms, formulas and definitions exact. Do not add facts that are not in the text.
+
+TEXT:
+{chunk}
+
+SUMMARY:"""
+
+
+def reduce_prompt(parts: List[str], summary_type: str) -> str:
+    joined = "\n\n".join(f"[Part {i + 1}]\n{p}" for i, p in enumerate(parts))
+    return f"""You are helping AI & DS students revise their syllabus.
+Below are summaries of consecutive parts of the same material. Merge them into
+{SUMMARY_STYLES[summary_type]}. Remove repetition, keep the original order of topics.
+
+{joined}
+
+SUMMARY:"""
+
+
+def _key(stage: str, summary_type: str, text: str) -> str:
+    return hashlib.sha256(f"{stage}\0{summary_type}\0{text}".encode("utf-8")).hexdigest()
+
+
+class Summarizer:
+    def __init__(self, generate: Callable[[str], Awaitable[Optional[str]]], max_concurrency: int = 4,
+                 fan_in: int = 5, cache_size: int = 4096):
+        """`generate` returns the model's text, or None when it failed (never cached)"""
+        self.generate = generate
+        self.max_concurrency = max_concurrency
+        self.fan_in = max(2, fan_in)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.stats = {'cache_hits': 0, 'llm_calls': 0, 'failures': 0, 'requests': 0}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    def _store(self, key: str, summary: str):
+        self._cache[key] = summary
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _summarize_one(self, key: str, prompt: str, run: Dict) -> Optional[str]:
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            run['cache_hits'] += 1
+            return self._cache[key]
+        pending = self._pending.get(key)
+        if pending is not None:  # the same chunk is being summarized for someone else
+            run['cache_hits'] += 1
+            return await asyncio.shield(pending)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[key] = fut
+        summary = None
+        try:
+            async with self._semaphore():
+                self.stats['llm_calls'] += 1
+                run['llm_calls'] += 1
+                try:
+                    summary = await self.generate(prompt)
+                except Exception as e:
+                    print(f"⚠️ Summary call failed: {e}")
+            if summary:
+                self._store(key, summary.strip())
+                summary = summary.strip()
+            else:
+                self.stats['failures'] += 1
+        finally:
+            self._pending.pop(key, None)
+            fut.set_result(summary)
+        return summary
+
+    async def summarize_chunks(self, chunks: List[str], summary_type: str = 'detailed', run: Optional[Dict] = None,
+                               prompt_fn: Callable[[str, str], str] = map_prompt) -> List[Optional[str]]:
+        """
+        Map step only: one summary per chunk (None where the model failed).
+        A custom prompt_fn(chunk, summary_type) should come with its own summary_type,
+        which namespaces the cache.
+        """
+        run = run if run is not None else {'cache_hits': 0, 'llm_calls': 0}
+        return list(await asyncio.gather(*(
+            self._summarize_one(_key("map", summary_type, c), prompt_fn(c, summary_type), run) for c in chunks
+        )))
+
+    async def summarize(self, chunks: List[str], summary_type: str = 'detailed') -> Dict:
+        """
+        Summarize chunks in order. Returns {summary, chunks, rounds, llm_calls,
+        cache_hits, failed_chunks}; raises ValueError if nothing could be summarized.
+        """
+        if summary_type not in SUMMARY_STYLES:
+            raise ValueError(f"summary_type must be one of: {', '.join(SUMMARY_STYLES)}")
+        self.stats['requests'] += 1
+        run = {'cache_hits': 0, 'llm_calls': 0}
+
+        mapped = await self.summarize_chunks(chunks, summary_type, run)
+        parts = [p for p in mapped if p]
+        failed = len(mapped) - len(parts)
+        if not parts:
+            raise ValueError("Could not summarize any part of the text")
+
+        rounds = 0
+        while len(parts) > 1:
+            rounds += 1
+            groups = [parts[i:i + self.fan_in] for i in range(0, len(parts), self.fan_in)]
+            reduced = await asyncio.gather(*(
+                self._summarize_one(_key("reduce", summary_type, "\0".join(g)), reduce_prompt(g, summary_type), run)
+                if len(g) > 1 else asyncio.sleep(0, result=g[0])
+                for g in groups
+            ))
+            # A failed merge passes its inputs on unmerged rather than losing the section
+            parts = [r or "\n\n".join(g) for r, g in zip(reduced, groups)]
+
+        return {
+            'summary': parts[0],
+            'chunks': len(chunks),
+            'rounds': rounds,
+            'llm_calls': run['llm_calls'],
+            'cache_hits': run['cache_hits'],
+            'failed_chunks': failed,
+        }
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, cached=len(self._cache), in_flight=len(self._pending),
+                    max_concurrency=self.max_concurrency, fan_in=self.fan_in)
@@ -0,0 +1,126 @@
+# backend/utils/tracing.py
+"""
+Request Tracing - lightweight timing spans for each stage of a request
+
+The HTTP middleware starts a Trace per request and keeps the last `keep`
+finished traces in memory. Code anywhere below it (endpoints, agents running
+in the threadpool) wraps its stages in `with span("retrieval"):` - the trace
+is found through a ContextVar, so nothing has to be passed around, and a span
+outside any trace costs one ContextVar lookup. Each response gets a
+Server-Timing header with the total time per stage name, which browser
+devtools show next to the request.
+"""
+
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_depth: ContextVar[int] = ContextVar("trace_depth", default=0)
+
+MAX_SPANS = 500  # per trace; a runaway loop shouldn't grow a trace forever
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+
+    def elapsed_ms(self, t: Optional[float] = None) -> float:
+        return round(((t or time.perf_counter()) - self._t0) * 1000, 2)
+
+    def add(self, name: str, start: float, end: float, depth: int, meta: Dict):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append({'name': name, 'start_ms': self.elapsed_ms(start),
+                           'duration_ms': round((end - start) * 1000, 2), 'depth': depth, **meta})
+
+    def totals(self) -> Dict[str, float]:
+        """Total milliseconds per span name, in order of first appearance"""
+        out: Dict[str, float] = {}
+        for s in self.spans:
+            out[s['name']] = round(out.get(s['name'], 0.0) + s['duration_ms'], 2)
+        return out
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={ms}" for name, ms in self.totals().items()]
+        parts.append(f"total;dur={self.duration_ms if self.duration_ms is not None else self.elapsed_ms()}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict:
+        return {'id': self.id, 'name': self.name, 'started_at': self.started_at, 'status': self.status,
+                'duration_ms': self.duration_ms, 'totals_ms': self.totals(), 'spans': self.spans,
+                'dropped_spans': self.dropped}
+
+
+@contextmanager
+def span(name: str, **meta):
+    """Time a stage of the current request (no-op outside a trace). `name` must be a token (no spaces)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+        trace.add(name, t0, time.perf_counter(), depth, meta)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+class Tracer:
+    def __init__(self, keep: int = 50):
+        self.keep = keep
+        self._recent: deque = deque(maxlen=keep)
+        self.stats = {'traces': 0, 'spans': 0}
+
+    def start(self, name: str):
+        """Begin a trace for the current context; pass the result to finish()"""
+        trace = Trace(name)
+        return trace, _current.set(trace)
+
+    def finish(self, started, status: Optional[int] = None) -> Trace:
+        trace, token = started
+        trace.duration_ms = trace.elapsed_ms()
+        trace.status = status
+        _current.reset(token)
+        self._recent.append(trace)
+        self.stats['traces'] += 1
+        self.stats['spans'] += len(trace.spans)
+        return trace
+
+    def recent(self, limit: Optional[int] = None, min_ms: float = 0.0) -> List[Dict]:
+        """Newest first"""
+        traces = [t for t in reversed(self._recent) if (t.duration_ms or 0) >= min_ms]
+        return [t.to_dict() for t in traces[:limit]]
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, kept=len(self._recent), keep=self.keep)
@@ -0,0 +1,316 @@
+# backend/utils/transcript_index.py
+"""
+Transcript Segment Index - every YouTube transcript we have fetched, searchable locally
+
+Transcripts are cut into fixed-length segments (60 s by default) once, when
+they are first fetched. Token postings and BM25 statistics are kept up to
+date incrementally and persisted to TRANSCRIPT_INDEX_PATH, so a new doubt can
+be ranked against all known lecture videos in milliseconds without touching
+YouTube, and a video's segments never have to be rebuilt per request.
+
+Several workers may share the file: a save takes a file lock, first merges in
+the videos other workers saved since, and writes through a per-process
+temporary file, so no worker's videos are lost or half-written.
+"""
+
+import atexit
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from utils.shared_corpus import file_lock
+
+INDEX_VERSION = 1
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "transcript_index.json")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from how i in into is it its me my of on or "
+    "so that the their then there these this to was we what when where which who why will "
+    "with you your can explain please tell about".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def build_segments(transcript: List[Dict], segment_seconds: float = 60) -> List[Dict]:
+    """Group transcript entries into ~segment_seconds windows of {text, start, end}"""
+    segments = []
+    cur = {'text': '', 'start': 0, 'end': 0}
+    for entry in transcript:
+        start = entry.get('start', 0)
+        text = entry.get('text', '')
+        if start - cur['start'] >= segment_seconds and cur['text']:
+            segments.append(cur)
+            cur = {'text': '', 'start': start, 'end': start}
+        cur['text'] += " " + text
+        cur['end'] = start + entry.get('duration', 3)
+    if cur['text']:
+        segments.append(cur)
+    for seg in segments:
+        seg['text'] = seg['text'].strip()
+    return segments
+
+
+def rank_texts(query: str, texts: List[str], k1: float = 1.2, b: float = 0.75) -> List[Tuple[int, float]]:
+    """BM25-rank a small ad hoc list of texts against query; returns (index, score) for matches, best first"""
+    terms = set(tokenize(query))
+    if not terms or not texts:
+        return []
+    docs = [Counter(tokenize(t)) for t in texts]
+    n = len(docs)
+    avg_len = sum(sum(d.values()) for d in docs) / n or 1.0
+    df = Counter(term for d in docs for term in terms if term in d)
+    scored = []
+    for i, d in enumerate(docs):
+        length = sum(d.values())
+        score = 0.0
+        for term in terms:
+            tf = d.get(term)
+            if tf:
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        if score > 0:
+            scored.append((i, score))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored
+
+
+class TranscriptIndex:
+    def __init__(self, path: Optional[str] = DEFAULT_PATH, segment_seconds: float = 60,
+                 k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.segment_seconds = segment_seconds
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.videos: Dict[str, Dict] = {}        # video_id -> {meta, first_segment, segment_count, indexed_at}
+        self.segments: List[Dict] = []            # global segment id -> {video_id, start, end, text, length}
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {segment id: term frequency}
+        self.total_length = 0
+        self.stats = {'searches': 0, 'videos_added': 0, 'videos_merged': 0}
+        self._save_timer: Optional[threading.Timer] = None
+        if path and os.path.exists(path):
+            self._load()
+        if path:
+            atexit.register(self.flush)
+
+    # -------------------------
+    # Persistence
+    # -------------------------
+    def _read(self) -> Optional[Dict]:
+        """The saved index, or None when there is none (or it can't be used)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Could not read transcript index {self.path}: {e}")
+            return None
+        if data.get('version') != INDEX_VERSION or data.get('segment_seconds') != self.segment_seconds:
+            print(f"⚠️ Transcript index {self.path} has an incompatible format; starting empty")
+            return None
+        return data
+
+    def _load(self):
+        t0 = time.perf_counter()
+        data = self._read()
+        if data is None:
+            return
+        self.videos = data['videos']
+        self.segments = data['segments']
+        self.postings = {t: {int(sid): tf for sid, tf in p} for t, p in data['postings'].items()}
+        self.total_length = sum(s['length'] for s in self.segments)
+        print(f"📚 Transcript index: {len(self.videos)} videos, {len(self.segments)} segments "
+              f"loaded in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    def _schedule_save(self, delay_s: float = 2.0):
+        """Coalesce bursts of additions into one write"""
+        with self._lock:
+            if self.path and self._save_timer is None:
+                self._save_timer = threading.Timer(delay_s, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+                self.save()
+
+    def _merge(self, data: Dict) -> int:
+        """Index the saved videos this process doesn't have (added by other workers); returns how many"""
+        added = 0
+        for video_id, v in data['videos'].items():
+            mine = self.videos.get(video_id)
+            if mine is not None:
+                for k, value in v['meta'].items():
+                    mine['meta'].setdefault(k, value)
+                continue
+            first = v['first_segment']
+            self._index_segments(video_id, data['segments'][first:first + v['segment_count']])
+            self.videos[video_id].update(meta=v['meta'], indexed_at=v['indexed_at'])
+            added += 1
+        return added
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, file_lock(f"{self.path}.lock"):
+            data = self._read()
+            if data is not None:
+                self.stats['videos_merged'] += self._merge(data)
+            data = {
+                'version': INDEX_VERSION,
+                'segment_seconds': self.segment_seconds,
+                'videos': self.videos,
+                'segments': self.segments,
+                'postings': {t: list(p.items()) for t, p in self.postings.items()},
+            }
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    # -------------------------
+    # Indexing
+    # -------------------------
+    def has_video(self, video_id: str) -> bool:
+        return video_id in self.videos
+
+    def set_meta(self, video_id: str, meta: Dict):
+        """Remember title/channel/etc. so local hits can be shown without a YouTube search"""
+        keep = {k: meta.get(k) for k in ('title', 'channel', 'duration', 'views', 'url', 'thumbnail')}
+        with self._lock:
+            if video_id in self.videos:
+                self.videos[video_id]['meta'].update({k: v for k, v in keep.items() if v is not None})
+                self._schedule_save()
+
+    def add_video(self, video_id: str, transcript: List[Dict], meta: Optional[Dict] = None) -> int:
+        """Segment and index a transcript (no-op if already indexed); returns the segment count"""
+        with self._lock:
+            if video_id in self.videos:
+                return self.videos[video_id]['segment_count']
+            count = self._index_segments(video_id, build_segments(transcript, self.segment_seconds))
+            self.stats['videos_added'] += 1
+            if meta:
+                self.set_meta(video_id, meta)
+            self._schedule_save()
+            return count
+
+    def _index_segments(self, video_id: str, segments: List[Dict]) -> int:
+        """Append a video's {text, start, end} segments to the postings (caller holds the lock)"""
+        first = len(self.segments)
+        for seg in segments:
+            tokens = tokenize(seg['text'])
+            sid = len(self.segments)
+            self.segments.append({
+                'video_id': video_id,
+                'start': seg['start'],
+                'end': seg['end'],
+                'text': seg['text'],
+                'length': len(tokens),
+            })
+            self.total_length += len(tokens)
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, {})[sid] = tf
+        self.videos[video_id] = {
+            'meta': {'url': f"https://www.youtube.com/watch?v={video_id}"},
+            'first_segment': first,
+            'segment_count': len(self.segments) - first,
+            'indexed_at': time.time(),
+        }
+        return len(self.segments) - first
+
+    # -------------------------
+    # Search
+    # -------------------------
+    def search(self, query: str, top_k: int = 5, video_ids: Optional[List[str]] = None,
+               min_coverage: float = 0.0) -> List[Dict]:
+        """
+        BM25-rank segments against `query`, optionally restricted to some videos.
+        Each hit has video_id, start, end, text, score and coverage (share of the
+        distinct query terms that appear in the segment).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            self.stats['searches'] += 1
+            n = len(self.segments)
+            if not n:
+                return []
+            allowed = None
+            if video_ids is not None:
+                allowed = set()
+                for vid in video_ids:
+                    v = self.videos.get(vid)
+                    if v:
+                        allowed.update(range(v['first_segment'], v['first_segment'] + v['segment_count']))
+            avg_len = self.total_length / n or 1.0
+            scores: Dict[int, float] = {}
+            matched: Dict[int, int] = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for sid, tf in posting.items():
+                    if allowed is not None and sid not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.segments[sid]['length'] / avg_len)
+                    scores[sid] = scores.get(sid, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[sid] = matched.get(sid, 0) + 1
+
+            ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            hits = []
+            for sid, score in ranked:
+                coverage = matched[sid] / len(terms)
+                if coverage < min_coverage:
+                    continue
+                seg = self.segments[sid]
+                hits.append({
+                    'video_id': seg['video_id'],
+                    'start': seg['start'],
+                    'end': seg['end'],
+                    'text': seg['text'],
+                    'score': round(score, 4),
+                    'coverage': round(coverage, 4),
+                })
+                if len(hits) >= top_k:
+                    break
+            return hits
+
+    def video_meta(self, video_id: str) -> Dict:
+        with self._lock:
+            v = self.videos.get(video_id)
+            return dict(v['meta']) if v else {}
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, videos=len(self.videos), segments=len(self.segments), terms=len(self.postings))
+
+
+_default_index: Optional[TranscriptIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_transcript_index() -> TranscriptIndex:
+    """Process-wide index shared by both YouTube agents"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = TranscriptIndex(os.getenv("TRANSCRIPT_INDEX_PATH", DEFAULT_PATH))
+        return _default_index
@@ -199,6 +199,7 @@ const ChatComponent = () => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);  // server keeps the conversation memory
   const messagesEndRef = useRef(null);
 
   useEffect(() => {
@@ -217,10 +218,11 @@ const ChatComponent = () => {
       const response = await fetch('http://localhost:8000/api/chat', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: input, chat_history: [] }),
+        body: JSON.stringify({ message: input, session_id: sessionId }),
       });
 
       const data = await response.json();
+      if (data.session_id) setSessionId(data.session_id);
       setMessages(prev => [...prev, {
         role: 'assistant',
         content: data.response,
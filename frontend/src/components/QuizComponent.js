@@ -31,25 +31,59 @@ const QuizComponent = () => {
     try {
       console.log('Generating quiz...', { topic, difficulty, numQuestions });
 
-      const response = await axios.post(`${API_URL}/api/generate-quiz`, {
-        topic: topic.trim(),
-        difficulty: difficulty,
-        num_questions: parseInt(numQuestions)
+      // Streamed: each question is shown as soon as the server has finished it
+      const response = await fetch(`${API_URL}/api/generate-quiz/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          topic: topic.trim(),
+          difficulty: difficulty,
+          num_questions: parseInt(numQuestions)
+        })
       });
 
-      console.log('Quiz response:', response.data);
+      if (response.status === 429) {
+        // Overloaded: the one-shot endpoint would be turned away too
+        const body = await response.json().catch(() => ({}));
+        setError(`Error: ${body.detail || 'Server busy, please retry shortly.'}`);
+        return;
+      }
+
+      if (!response.ok || !response.body) {
+        // Streaming not available (older backend / proxy): fall back to the one-shot endpoint
+        await generateQuizAtOnce();
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let received = 0;
 
-      // Check if we got questions
-      if (response.data && response.data.questions && Array.isArray(response.data.questions)) {
-        if (response.data.questions.length > 0) {
-          setQuestions(response.data.questions);
-          setError('');
-        } else {
-          setError('No questions were generated. Please try again.');
+      const handleEvent = (event) => {
+        if (event.type === 'question' && event.question) {
+          received++;
+          setQuestions(prev => [...prev, event.question]);
+        } else if (event.type === 'error') {
+          setError(`Error: ${event.detail}`);
+        } else if (event.type === 'done') {
+          console.log('Quiz stream done:', event);
+          if (received === 0) {
+            setError('No questions were generated. Please try again.');
+          }
         }
-      } else {
-        setError('Invalid response format from server');
-        console.error('Invalid response:', response.data);
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+      }
+      if (buffer.trim()) {
+        handleEvent(JSON.parse(buffer));
       }
 
     } catch (err) {
@@ -70,6 +104,29 @@ const QuizComponent = () => {
     }
   };
 
+  const generateQuizAtOnce = async () => {
+    const response = await axios.post(`${API_URL}/api/generate-quiz`, {
+      topic: topic.trim(),
+      difficulty: difficulty,
+      num_questions: parseInt(numQuestions)
+    });
+
+    console.log('Quiz response:', response.data);
+
+    // Check if we got questions
+    if (response.data && response.data.questions && Array.isArray(response.data.questions)) {
+      if (response.data.questions.length > 0) {
+        setQuestions(response.data.questions);
+        setError('');
+      } else {
+        setError('No questions were generated. Please try again.');
+      }
+    } else {
+      setError('Invalid response format from server');
+      console.error('Invalid response:', response.data);
+    }
+  };
+
   const handleAnswerSelect = (questionIndex, answer) => {
     setSelectedAnswers({
       ...selectedAnswers,
@@ -181,7 +238,9 @@ const QuizComponent = () => {
             transition: 'all 0.3s'
           }}
         >
-          {loading ? '⏳ Generating Quiz...' : '📝 Generate Quiz'}
+          {loading
+            ? `⏳ Generating Quiz... (${questions.length}/${numQuestions})`
+            : '📝 Generate Quiz'}
         </button>
 
         {error && (
@@ -202,7 +261,7 @@ const QuizComponent = () => {
       {questions && questions.length > 0 && (
         <div>
           <h3 style={{ marginBottom: '15px' }}>
-            Quiz: {topic} ({questions.length} questions)
+            Quiz: {topic} ({questions.length} questions{loading ? ', more on the way...' : ''})
           </h3>
 
           {questions.map((question, qIndex) => {
@@ -301,17 +360,17 @@ const QuizComponent = () => {
           {!showResults ? (
             <button
               onClick={handleSubmitQuiz}
-              disabled={Object.keys(selectedAnswers).length !== questions.length}
+              disabled={loading || Object.keys(selectedAnswers).length !== questions.length}
               style={{
                 width: '100%',
                 padding: '12px',
-                background: Object.keys(selectedAnswers).length !== questions.length ? '#9ca3af' : '#10b981',
+                background: loading || Object.keys(selectedAnswers).length !== questions.length ? '#9ca3af' : '#10b981',
                 color: 'white',
                 border: 'none',
                 borderRadius: '8px',
                 fontSize: '16px',
                 fontWeight: '600',
-                cursor: Object.keys(selectedAnswers).length !== questions.length ? 'not-allowed' : 'pointer',
+                cursor: loading || Object.keys(selectedAnswers).length !== questions.length ? 'not-allowed' : 'pointer',
                 marginTop: '10px'
               }}
             >
@@ -10,10 +10,12 @@ const apiClient = axios.create({
   timeout: 60000,
 });
 
-export const sendChatMessage = async (message, chatHistory = []) => {
+// Pass the session_id from the previous response; the server remembers the conversation
+export const sendChatMessage = async (message, sessionId = null, chatHistory = []) => {
   try {
     const response = await apiClient.post('/chat', {
       message,
+      session_id: sessionId,
       chat_history: chatHistory,
     });
     return response.data;